@@ -0,0 +1,34 @@
+"""add_wallet_balance
+
+Revision ID: 3f1c2a9b7d10
+Revises: 97ad75f0f684
+Create Date: 2026-01-12 09:14:52.481203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a9b7d10'
+down_revision: Union[str, Sequence[str], None] = '97ad75f0f684'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('wallets', sa.Column('balance', sa.BigInteger(), server_default='0', nullable=False))
+    # Бэкфилл материализованного баланса из истории операций
+    op.execute(
+        'UPDATE wallets SET balance = s.total '
+        'FROM (SELECT "walletId", SUM(amount) AS total FROM wallet_operations GROUP BY "walletId") AS s '
+        'WHERE wallets.id = s."walletId"'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('wallets', 'balance')
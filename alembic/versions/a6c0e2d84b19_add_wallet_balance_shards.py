@@ -0,0 +1,45 @@
+"""add_wallet_balance_shards
+
+Revision ID: a6c0e2d84b19
+Revises: f41d7b8c2e05
+Create Date: 2026-03-19 15:12:04.527316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6c0e2d84b19'
+down_revision: Union[str, Sequence[str], None] = 'f41d7b8c2e05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('wallets', sa.Column('shards', sa.Integer(), server_default='1', nullable=False))
+    op.create_table('wallet_balance_shards',
+    sa.Column('walletId', sa.String(), nullable=False),
+    sa.Column('shard', sa.Integer(), nullable=False),
+    sa.Column('balance', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+    sa.CheckConstraint('balance >= 0', name='ck_wallet_balance_shards_balance_non_negative'),
+    sa.PrimaryKeyConstraint('walletId', 'shard')
+    )
+    op.add_column('wallet_outbox', sa.Column('shard', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Вернуть суббалансы в wallets.balance перед удалением таблицы
+    op.execute(
+        'UPDATE wallets SET balance = wallets.balance + s.total, version = wallets.version + 1 '
+        'FROM (SELECT "walletId", SUM(balance) AS total FROM wallet_balance_shards GROUP BY "walletId") s '
+        'WHERE wallets.id = s."walletId"'
+    )
+    op.drop_column('wallet_outbox', 'shard')
+    op.drop_table('wallet_balance_shards')
+    op.drop_column('wallets', 'shards')
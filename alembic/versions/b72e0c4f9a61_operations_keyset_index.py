@@ -0,0 +1,51 @@
+"""operations_keyset_index
+
+Revision ID: b72e0c4f9a61
+Revises: 8e4b6d21c5a3
+Create Date: 2026-02-03 15:41:09.228764
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b72e0c4f9a61'
+down_revision: Union[str, Sequence[str], None] = '8e4b6d21c5a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        'ALTER TABLE wallet_operations ALTER COLUMN "createdAt" TYPE TIMESTAMP WITH TIME ZONE '
+        'USING "createdAt"::timestamptz'
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_wallet_operations_walletId_createdAt_id',
+            'wallet_operations',
+            ['walletId', 'createdAt', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        # Префикс нового составного индекса, отдельный индекс по walletId больше не нужен
+        op.drop_index(
+            op.f('ix_wallet_operations_walletId'),
+            table_name='wallet_operations',
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_wallet_operations_walletId'), 'wallet_operations', ['walletId'], unique=False)
+    op.drop_index('ix_wallet_operations_walletId_createdAt_id', table_name='wallet_operations')
+    op.alter_column('wallet_operations', 'createdAt',
+               existing_type=sa.DateTime(timezone=True),
+               type_=sa.VARCHAR(),
+               postgresql_using='to_char("createdAt" AT TIME ZONE \'UTC\', \'YYYY-MM-DD"T"HH24:MI:SS.US"Z"\')',
+               existing_nullable=False)
@@ -0,0 +1,244 @@
+"""native_column_types_expand
+
+Revision ID: c9e4f1a7b3d2
+Revises: a6c0e2d84b19
+Create Date: 2026-03-24 11:08:52.904113
+
+Первая (онлайн) часть перехода на нативные типы: uuid для идентификаторов, bigint для amount.
+Приложение продолжает работать на старых столбцах, новые заполняются параллельно:
+- wallets, wallet_operation_keys: теневые столбцы *_uuid, триггер заполняет их при записи,
+  существующие строки — пачками по BATCH_SIZE, каждая пачка в своей транзакции;
+- wallet_operations (секционированная): новая таблица wallet_operations_v2 с теми же партициями,
+  новые строки копирует триггер, существующие — пачками по первичному ключу.
+Уникальные индексы строятся CONCURRENTLY, NOT NULL подготавливается проверенными CHECK.
+Переключение — в следующей ревизии (короткая блокировка).
+
+Перед изменениями схемы ревизия проверяет, что все переводимые в uuid значения (включая
+wallet_balance_shards и wallet_outbox, которые переключение приводит под блокировкой) — uuid,
+и отказывается продолжать, перечисляя число и примеры остальных. Значение, записанное после
+проверки, триггеры и пачки не приводят, а записывают NULL: такую строку отклонит CHECK
+(или NOT NULL в wallet_operations_v2) с именем столбца, а не ошибка приведения внутри триггера.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.partitions import LIST_PARTITIONS_SQL, create_partition_sql, partition_month
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9e4f1a7b3d2'
+down_revision: Union[str, Sequence[str], None] = 'a6c0e2d84b19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10000
+
+# Записи uuid, которые принимает проверка: 32 шестнадцатеричные цифры, дефисы между группами 8-4-4-4-12
+# необязательны, регистр любой (uuid_lib.uuid4().hex и каноническая запись)
+UUID_PATTERN = '^[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}$'
+
+# Столбцы, которые эта и следующая ревизии приводят к uuid
+UUID_COLUMNS = {
+    'wallets': ('id', 'userId'),
+    'wallet_operations': ('id', 'walletId'),
+    'wallet_operation_keys': ('operationId',),
+    'wallet_balance_shards': ('walletId',),
+    'wallet_outbox': ('walletId', 'userId', 'operationId'),
+}
+
+INVALID_SAMPLES = 5
+
+
+def _try_uuid(expression: str) -> str:
+    """
+    SQL-выражение: значение expression, приведённое к uuid, или NULL, если оно не uuid.
+    :param expression: SQL-выражение типа text
+    """
+    return f"CASE WHEN {expression} ~* '{UUID_PATTERN}' THEN ({expression})::uuid END"
+
+COPY_OPERATIONS_SQL = '''
+WITH batch AS (
+    SELECT id, "walletId", amount, type, reason, "externalOperationId", "traceId", "createdAt"
+    FROM wallet_operations
+    WHERE id > :last
+    ORDER BY id
+    LIMIT :batch
+), copied AS (
+    INSERT INTO wallet_operations_v2 (id, "walletId", amount, type, reason, "externalOperationId", "traceId", "createdAt")
+    SELECT {id}, {wallet_id}, amount, type, reason, "externalOperationId", "traceId", "createdAt"
+    FROM batch
+    ON CONFLICT DO NOTHING
+)
+SELECT max(id) FROM batch
+'''.format(id=_try_uuid('id'), wallet_id=_try_uuid('"walletId"'))
+
+BACKFILL_WALLETS_SQL = '''
+WITH batch AS (
+    SELECT id FROM wallets WHERE id > :last ORDER BY id LIMIT :batch
+), filled AS (
+    UPDATE wallets SET id_uuid = {id}, "userId_uuid" = {user_id}
+    FROM batch WHERE wallets.id = batch.id AND wallets.id_uuid IS NULL
+)
+SELECT max(id) FROM batch
+'''.format(id=_try_uuid('wallets.id'), user_id=_try_uuid('wallets."userId"'))
+
+BACKFILL_KEYS_SQL = '''
+WITH batch AS (
+    SELECT "externalOperationId" FROM wallet_operation_keys
+    WHERE "externalOperationId" > :last ORDER BY "externalOperationId" LIMIT :batch
+), filled AS (
+    UPDATE wallet_operation_keys SET "operationId_uuid" = {operation_id}
+    FROM batch
+    WHERE wallet_operation_keys."externalOperationId" = batch."externalOperationId"
+      AND wallet_operation_keys."operationId_uuid" IS NULL
+)
+SELECT max("externalOperationId") FROM batch
+'''.format(operation_id=_try_uuid('wallet_operation_keys."operationId"'))
+
+
+WALLETS_SYNC_FUNCTION_SQL = '''
+CREATE FUNCTION wallets_sync_uuid() RETURNS trigger AS $$ BEGIN
+    NEW.id_uuid := {id};
+    NEW."userId_uuid" := {user_id};
+    RETURN NEW;
+END $$ LANGUAGE plpgsql
+'''.format(id=_try_uuid('NEW.id'), user_id=_try_uuid('NEW."userId"'))
+
+KEYS_SYNC_FUNCTION_SQL = '''
+CREATE FUNCTION wallet_operation_keys_sync_uuid() RETURNS trigger AS $$ BEGIN
+    NEW."operationId_uuid" := {operation_id};
+    RETURN NEW;
+END $$ LANGUAGE plpgsql
+'''.format(operation_id=_try_uuid('NEW."operationId"'))
+
+COPY_OPERATION_FUNCTION_SQL = '''
+CREATE FUNCTION wallet_operations_copy_v2() RETURNS trigger AS $$ BEGIN
+    INSERT INTO wallet_operations_v2 (id, "walletId", amount, type, reason, "externalOperationId", "traceId", "createdAt")
+    VALUES ({id}, {wallet_id}, NEW.amount, NEW.type, NEW.reason, NEW."externalOperationId", NEW."traceId", NEW."createdAt")
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql
+'''.format(id=_try_uuid('NEW.id'), wallet_id=_try_uuid('NEW."walletId"'))
+
+def _in_batches(bind, statement: str):
+    """
+    Выполнять statement, пока он возвращает ключ последней строки пачки (keyset по первичному ключу).
+    Вызывается в autocommit_block: каждая пачка фиксируется сразу и держит блокировки строк недолго.
+    """
+    last = ''
+    while True:
+        last = bind.execute(sa.text(statement), {"last": last, "batch": BATCH_SIZE}).scalar()
+        if last is None:
+            return
+
+
+def _check_uuid_values(bind):
+    """
+    Отказаться от миграции, если в UUID_COLUMNS есть значения, которые не приводятся к uuid.
+    Один проход по каждой таблице; в ошибке — число таких значений по столбцам и примеры.
+    """
+    problems = []
+    for table, columns in UUID_COLUMNS.items():
+        counts = bind.execute(sa.text(
+            'SELECT ' + ', '.join(f'count(*) FILTER (WHERE "{column}" !~* :pattern)' for column in columns) + f' FROM {table}'
+        ), {"pattern": UUID_PATTERN}).one()
+        for column, count in zip(columns, counts):
+            if not count:
+                continue
+            samples = bind.execute(sa.text(
+                f'SELECT "{column}" FROM {table} WHERE "{column}" !~* :pattern LIMIT :limit'
+            ), {"pattern": UUID_PATTERN, "limit": INVALID_SAMPLES}).scalars().all()
+            problems.append(f'{table}."{column}": {count} (например, {", ".join(map(repr, samples))})')
+    if problems:
+        raise RuntimeError(
+            'Значения, которые не приводятся к uuid; исправьте или удалите их и повторите миграцию: '
+            + '; '.join(problems)
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    _check_uuid_values(bind)
+
+    op.add_column('wallets', sa.Column('id_uuid', sa.UUID(), nullable=True))
+    op.add_column('wallets', sa.Column('userId_uuid', sa.UUID(), nullable=True))
+    op.execute(WALLETS_SYNC_FUNCTION_SQL)
+    op.execute(
+        'CREATE TRIGGER wallets_sync_uuid BEFORE INSERT OR UPDATE OF id, "userId" ON wallets '
+        'FOR EACH ROW EXECUTE FUNCTION wallets_sync_uuid()'
+    )
+
+    op.add_column('wallet_operation_keys', sa.Column('operationId_uuid', sa.UUID(), nullable=True))
+    op.execute(KEYS_SYNC_FUNCTION_SQL)
+    op.execute(
+        'CREATE TRIGGER wallet_operation_keys_sync_uuid BEFORE INSERT OR UPDATE OF "operationId" '
+        'ON wallet_operation_keys FOR EACH ROW EXECUTE FUNCTION wallet_operation_keys_sync_uuid()'
+    )
+
+    op.execute(
+        'CREATE TABLE wallet_operations_v2 ('
+        ' id UUID NOT NULL,'
+        ' "walletId" UUID NOT NULL,'
+        ' amount BIGINT NOT NULL,'
+        ' type walletoperationtype NOT NULL,'
+        ' reason VARCHAR NOT NULL,'
+        ' "externalOperationId" VARCHAR NOT NULL,'
+        ' "traceId" VARCHAR NOT NULL,'
+        ' "createdAt" TIMESTAMP WITH TIME ZONE NOT NULL,'
+        ' CONSTRAINT wallet_operations_v2_pkey PRIMARY KEY (id, "createdAt")'
+        ') PARTITION BY RANGE ("createdAt")'
+    )
+    for name in bind.execute(sa.text(LIST_PARTITIONS_SQL)).scalars():
+        month = partition_month(name)
+        if month is None:
+            continue
+        op.execute(create_partition_sql(month, parent='wallet_operations_v2', suffix='_v2'))
+    # Индекс создаётся на пустой таблице и поддерживается при копировании: после переключения не строится
+    op.create_index(
+        'ix_wallet_operations_v2_walletId_createdAt_id', 'wallet_operations_v2', ['walletId', 'createdAt', 'id'], unique=False
+    )
+    # CREATE TRIGGER ждёт завершения идущих вставок: каждая строка либо уже видна копированию, либо пройдёт через триггер
+    op.execute(COPY_OPERATION_FUNCTION_SQL)
+    op.execute(
+        'CREATE TRIGGER wallet_operations_copy_v2 AFTER INSERT ON wallet_operations '
+        'FOR EACH ROW EXECUTE FUNCTION wallet_operations_copy_v2()'
+    )
+
+    with op.get_context().autocommit_block():
+        _in_batches(bind, BACKFILL_WALLETS_SQL)
+        _in_batches(bind, BACKFILL_KEYS_SQL)
+        _in_batches(bind, COPY_OPERATIONS_SQL)
+
+        op.create_index('wallets_id_uuid_key', 'wallets', ['id_uuid'], unique=True, postgresql_concurrently=True)
+        op.create_index('ix_wallets_userId_uuid', 'wallets', ['userId_uuid'], unique=True, postgresql_concurrently=True)
+        # Проверенный CHECK позволяет SET NOT NULL при переключении без сканирования таблицы
+        op.execute('ALTER TABLE wallets ADD CONSTRAINT ck_wallets_id_uuid_not_null CHECK (id_uuid IS NOT NULL) NOT VALID')
+        op.execute('ALTER TABLE wallets ADD CONSTRAINT "ck_wallets_userId_uuid_not_null" CHECK ("userId_uuid" IS NOT NULL) NOT VALID')
+        op.execute(
+            'ALTER TABLE wallet_operation_keys ADD CONSTRAINT "ck_wallet_operation_keys_operationId_uuid_not_null" '
+            'CHECK ("operationId_uuid" IS NOT NULL) NOT VALID'
+        )
+        op.execute('ALTER TABLE wallets VALIDATE CONSTRAINT ck_wallets_id_uuid_not_null')
+        op.execute('ALTER TABLE wallets VALIDATE CONSTRAINT "ck_wallets_userId_uuid_not_null"')
+        op.execute('ALTER TABLE wallet_operation_keys VALIDATE CONSTRAINT "ck_wallet_operation_keys_operationId_uuid_not_null"')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # IF EXISTS: после отката ревизии переключения теневых объектов уже нет
+    op.execute('DROP TRIGGER IF EXISTS wallet_operations_copy_v2 ON wallet_operations')
+    op.execute('DROP FUNCTION IF EXISTS wallet_operations_copy_v2()')
+    op.execute('DROP TABLE IF EXISTS wallet_operations_v2')
+
+    op.execute('DROP TRIGGER IF EXISTS wallet_operation_keys_sync_uuid ON wallet_operation_keys')
+    op.execute('DROP FUNCTION IF EXISTS wallet_operation_keys_sync_uuid()')
+    op.execute('ALTER TABLE wallet_operation_keys DROP COLUMN IF EXISTS "operationId_uuid"')
+
+    op.execute('DROP TRIGGER IF EXISTS wallets_sync_uuid ON wallets')
+    op.execute('DROP FUNCTION IF EXISTS wallets_sync_uuid()')
+    op.execute('DROP INDEX IF EXISTS "ix_wallets_userId_uuid"')
+    op.execute('DROP INDEX IF EXISTS wallets_id_uuid_key')
+    op.execute('ALTER TABLE wallets DROP COLUMN IF EXISTS "userId_uuid", DROP COLUMN IF EXISTS id_uuid')
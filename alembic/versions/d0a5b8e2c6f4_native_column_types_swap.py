@@ -0,0 +1,116 @@
+"""native_column_types_swap
+
+Revision ID: d0a5b8e2c6f4
+Revises: c9e4f1a7b3d2
+Create Date: 2026-03-24 11:31:17.250846
+
+Вторая часть перехода на нативные типы: переключение на столбцы и таблицу, заполненные
+ревизией c9e4f1a7b3d2, одной короткой транзакцией. Все изменения — переименования и
+удаление объектов; SET NOT NULL опирается на проверенные CHECK и не сканирует таблицы.
+Полностью переписываются только небольшие wallet_balance_shards и wallet_outbox.
+Удаляется избыточный индекс ix_wallets_id (дублировал первичный ключ).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.partitions import create_partition_sql, partition_month
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd0a5b8e2c6f4'
+down_revision: Union[str, Sequence[str], None] = 'c9e4f1a7b3d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LIST_CHILDREN_SQL = """
+SELECT child.relname
+FROM pg_inherits
+JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+WHERE parent.relname = :parent
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    # Не вставать в очередь за долгой транзакцией, блокируя всех за собой: лучше упасть и повторить
+    op.execute("SET LOCAL lock_timeout = '5s'")
+    op.execute(
+        'LOCK TABLE wallets, wallet_operations, wallet_operation_keys, wallet_balance_shards, wallet_outbox '
+        'IN ACCESS EXCLUSIVE MODE'
+    )
+
+    # Партиции, созданные maintain-partitions после первой части
+    old = set(bind.execute(sa.text(LIST_CHILDREN_SQL), {"parent": "wallet_operations"}).scalars())
+    new = set(bind.execute(sa.text(LIST_CHILDREN_SQL), {"parent": "wallet_operations_v2"}).scalars())
+    for name in sorted(old):
+        month = partition_month(name)
+        if month is not None and f"{name}_v2" not in new:
+            op.execute(create_partition_sql(month, parent='wallet_operations_v2', suffix='_v2'))
+            new.add(f"{name}_v2")
+
+    op.execute('DROP TRIGGER wallet_operations_copy_v2 ON wallet_operations')
+    op.execute('DROP FUNCTION wallet_operations_copy_v2()')
+    op.execute('DROP TABLE wallet_operations')
+    op.execute('ALTER TABLE wallet_operations_v2 RENAME TO wallet_operations')
+    op.execute('ALTER TABLE wallet_operations RENAME CONSTRAINT wallet_operations_v2_pkey TO wallet_operations_pkey')
+    op.execute('ALTER INDEX "ix_wallet_operations_v2_walletId_createdAt_id" RENAME TO "ix_wallet_operations_walletId_createdAt_id"')
+    for name in sorted(new):
+        if name.endswith("_v2"):
+            op.execute(f'ALTER TABLE {name} RENAME TO {name[:-len("_v2")]}')
+
+    op.execute('DROP TRIGGER wallets_sync_uuid ON wallets')
+    op.execute('DROP FUNCTION wallets_sync_uuid()')
+    op.execute('ALTER TABLE wallets DROP CONSTRAINT wallets_pkey')
+    op.drop_index('ix_wallets_id', table_name='wallets')
+    op.drop_index('ix_wallets_userId', table_name='wallets')
+    op.execute('ALTER TABLE wallets DROP COLUMN id, DROP COLUMN "userId"')
+    op.execute('ALTER TABLE wallets RENAME COLUMN id_uuid TO id')
+    op.execute('ALTER TABLE wallets RENAME COLUMN "userId_uuid" TO "userId"')
+    op.execute('ALTER TABLE wallets ALTER COLUMN id SET NOT NULL, ALTER COLUMN "userId" SET NOT NULL')
+    op.execute('ALTER TABLE wallets DROP CONSTRAINT ck_wallets_id_uuid_not_null, DROP CONSTRAINT "ck_wallets_userId_uuid_not_null"')
+    op.execute('ALTER TABLE wallets ADD CONSTRAINT wallets_pkey PRIMARY KEY USING INDEX wallets_id_uuid_key')
+    op.execute('ALTER INDEX "ix_wallets_userId_uuid" RENAME TO "ix_wallets_userId"')
+
+    op.execute('DROP TRIGGER wallet_operation_keys_sync_uuid ON wallet_operation_keys')
+    op.execute('DROP FUNCTION wallet_operation_keys_sync_uuid()')
+    op.execute('ALTER TABLE wallet_operation_keys DROP COLUMN "operationId"')
+    op.execute('ALTER TABLE wallet_operation_keys RENAME COLUMN "operationId_uuid" TO "operationId"')
+    op.execute('ALTER TABLE wallet_operation_keys ALTER COLUMN "operationId" SET NOT NULL')
+    op.execute('ALTER TABLE wallet_operation_keys DROP CONSTRAINT "ck_wallet_operation_keys_operationId_uuid_not_null"')
+
+    op.execute('ALTER TABLE wallet_balance_shards ALTER COLUMN "walletId" TYPE UUID USING "walletId"::uuid')
+    op.execute(
+        'ALTER TABLE wallet_outbox '
+        'ALTER COLUMN "walletId" TYPE UUID USING "walletId"::uuid, '
+        'ALTER COLUMN "userId" TYPE UUID USING "userId"::uuid, '
+        'ALTER COLUMN "operationId" TYPE UUID USING "operationId"::uuid'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Откат переписывает таблицы под блокировкой (не онлайн)
+    op.execute(
+        'ALTER TABLE wallet_outbox '
+        'ALTER COLUMN "walletId" TYPE VARCHAR USING "walletId"::text, '
+        'ALTER COLUMN "userId" TYPE VARCHAR USING "userId"::text, '
+        'ALTER COLUMN "operationId" TYPE VARCHAR USING "operationId"::text'
+    )
+    op.execute('ALTER TABLE wallet_balance_shards ALTER COLUMN "walletId" TYPE VARCHAR USING "walletId"::text')
+    op.execute('ALTER TABLE wallet_operation_keys ALTER COLUMN "operationId" TYPE VARCHAR USING "operationId"::text')
+    op.execute(
+        'ALTER TABLE wallet_operations '
+        'ALTER COLUMN id TYPE VARCHAR USING id::text, '
+        'ALTER COLUMN "walletId" TYPE VARCHAR USING "walletId"::text, '
+        'ALTER COLUMN amount TYPE INTEGER'
+    )
+    op.execute(
+        'ALTER TABLE wallets '
+        'ALTER COLUMN id TYPE VARCHAR USING id::text, '
+        'ALTER COLUMN "userId" TYPE VARCHAR USING "userId"::text'
+    )
+    op.create_index(op.f('ix_wallets_id'), 'wallets', ['id'], unique=False)
@@ -0,0 +1,99 @@
+"""partition_wallet_operations
+
+Revision ID: d5a9e3f07b2c
+Revises: b72e0c4f9a61
+Create Date: 2026-02-17 10:26:44.671385
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.db.partitions import add_months, create_partition_sql, month_start, months_between
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a9e3f07b2c'
+down_revision: Union[str, Sequence[str], None] = 'b72e0c4f9a61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+OPERATION_COLUMNS = '''id, "walletId", amount, type, reason, "externalOperationId", "traceId", "createdAt"'''
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    now = datetime.now(timezone.utc)
+    first = bind.execute(sa.text('SELECT min("createdAt") FROM wallet_operations')).scalar() or now
+    # timestamptz приходит в часовом поясе сессии, а границы партиций — по UTC
+    first = first.astimezone(timezone.utc)
+
+    op.execute(
+        'CREATE TABLE wallet_operations_partitioned ('
+        ' id VARCHAR NOT NULL,'
+        ' "walletId" VARCHAR NOT NULL,'
+        ' amount INTEGER NOT NULL,'
+        ' type walletoperationtype NOT NULL,'
+        ' reason VARCHAR NOT NULL,'
+        ' "externalOperationId" VARCHAR NOT NULL,'
+        ' "traceId" VARCHAR NOT NULL,'
+        ' "createdAt" TIMESTAMP WITH TIME ZONE NOT NULL,'
+        ' PRIMARY KEY (id, "createdAt")'
+        ') PARTITION BY RANGE ("createdAt")'
+    )
+    for month in months_between(month_start(first), add_months(month_start(now), MONTHS_AHEAD)):
+        op.execute(create_partition_sql(month, parent='wallet_operations_partitioned'))
+
+    op.create_table('wallet_operation_keys',
+    sa.Column('externalOperationId', sa.String(), nullable=False),
+    sa.Column('operationId', sa.String(), nullable=False),
+    sa.Column('createdAt', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('externalOperationId')
+    )
+
+    op.execute(
+        f'INSERT INTO wallet_operations_partitioned ({OPERATION_COLUMNS}) '
+        f'SELECT {OPERATION_COLUMNS} FROM wallet_operations'
+    )
+    op.execute(
+        'INSERT INTO wallet_operation_keys ("externalOperationId", "operationId", "createdAt") '
+        'SELECT "externalOperationId", id, "createdAt" FROM wallet_operations'
+    )
+    op.drop_table('wallet_operations')
+    op.execute('ALTER TABLE wallet_operations_partitioned RENAME TO wallet_operations')
+    op.execute('ALTER TABLE wallet_operations RENAME CONSTRAINT wallet_operations_partitioned_pkey TO wallet_operations_pkey')
+    # Партиции сохраняют имена вида wallet_operations_yYYYYmMM, меняется только имя родителя
+    op.create_index('ix_wallet_operations_walletId_createdAt_id', 'wallet_operations', ['walletId', 'createdAt', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('ALTER TABLE wallet_operations RENAME TO wallet_operations_partitioned')
+    # Имя первичного ключа освобождается для новой таблицы, как в upgrade
+    op.execute('ALTER TABLE wallet_operations_partitioned RENAME CONSTRAINT wallet_operations_pkey TO wallet_operations_partitioned_pkey')
+    op.drop_index('ix_wallet_operations_walletId_createdAt_id', table_name='wallet_operations_partitioned')
+    op.create_table('wallet_operations',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('walletId', sa.String(), nullable=False),
+    sa.Column('amount', sa.Integer(), nullable=False),
+    sa.Column('type', postgresql.ENUM('DEPOSIT', 'WITHDRAW', name='walletoperationtype', create_type=False), nullable=False),
+    sa.Column('reason', sa.String(), nullable=False),
+    sa.Column('externalOperationId', sa.String(), nullable=False),
+    sa.Column('traceId', sa.String(), nullable=False),
+    sa.Column('createdAt', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('externalOperationId')
+    )
+    op.execute(
+        f'INSERT INTO wallet_operations ({OPERATION_COLUMNS}) '
+        f'SELECT {OPERATION_COLUMNS} FROM wallet_operations_partitioned'
+    )
+    op.execute('DROP TABLE wallet_operations_partitioned')
+    op.drop_table('wallet_operation_keys')
+    op.create_index(op.f('ix_wallet_operations_id'), 'wallet_operations', ['id'], unique=False)
+    op.create_index('ix_wallet_operations_walletId_createdAt_id', 'wallet_operations', ['walletId', 'createdAt', 'id'], unique=False)
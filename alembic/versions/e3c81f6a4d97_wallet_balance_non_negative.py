@@ -0,0 +1,33 @@
+"""wallet_balance_non_negative
+
+Revision ID: e3c81f6a4d97
+Revises: d5a9e3f07b2c
+Create Date: 2026-03-02 13:55:18.340527
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3c81f6a4d97'
+down_revision: Union[str, Sequence[str], None] = 'd5a9e3f07b2c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # NOT VALID + VALIDATE: проверка существующих строк без долгой эксклюзивной блокировки.
+    # ADD берёт ACCESS EXCLUSIVE до конца транзакции, поэтому VALIDATE (SHARE UPDATE EXCLUSIVE,
+    # записи не блокирует) выполняется после фиксации, в autocommit_block
+    op.execute('ALTER TABLE wallets ADD CONSTRAINT ck_wallets_balance_non_negative CHECK (balance >= 0) NOT VALID')
+    with op.get_context().autocommit_block():
+        op.execute('ALTER TABLE wallets VALIDATE CONSTRAINT ck_wallets_balance_non_negative')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('ck_wallets_balance_non_negative', 'wallets', type_='check')
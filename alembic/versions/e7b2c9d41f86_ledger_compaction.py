@@ -0,0 +1,57 @@
+"""ledger_compaction
+
+Revision ID: e7b2c9d41f86
+Revises: d0a5b8e2c6f4
+Create Date: 2026-04-02 10:41:27.183650
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b2c9d41f86'
+down_revision: Union[str, Sequence[str], None] = 'd0a5b8e2c6f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('wallet_operations_archive',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('walletId', sa.UUID(), nullable=False),
+    sa.Column('amount', sa.BigInteger(), nullable=False),
+    sa.Column('type', postgresql.ENUM('DEPOSIT', 'WITHDRAW', name='walletoperationtype', create_type=False), nullable=False),
+    sa.Column('reason', sa.String(), nullable=False),
+    sa.Column('externalOperationId', sa.String(), nullable=False),
+    sa.Column('traceId', sa.String(), nullable=False),
+    sa.Column('createdAt', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id', 'createdAt')
+    )
+    op.create_index('ix_wallet_operations_archive_walletId_createdAt_id', 'wallet_operations_archive',
+                    ['walletId', 'createdAt', 'id'], unique=False)
+    op.create_table('wallet_balance_checkpoints',
+    sa.Column('walletId', sa.UUID(), nullable=False),
+    sa.Column('cutoff', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('balance', sa.BigInteger(), nullable=False),
+    sa.Column('createdAt', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('walletId', 'cutoff')
+    )
+    # wallet_operation_keys не секционирована и большая: строим индекс без блокировки записи
+    with op.get_context().autocommit_block():
+        op.create_index('ix_wallet_operation_keys_createdAt', 'wallet_operation_keys', ['createdAt'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_wallet_operation_keys_createdAt', table_name='wallet_operation_keys',
+                      postgresql_concurrently=True)
+    op.drop_table('wallet_balance_checkpoints')
+    op.drop_index('ix_wallet_operations_archive_walletId_createdAt_id', table_name='wallet_operations_archive')
+    op.drop_table('wallet_operations_archive')
@@ -0,0 +1,46 @@
+"""add_wallet_outbox
+
+Revision ID: f41d7b8c2e05
+Revises: e3c81f6a4d97
+Create Date: 2026-03-16 09:47:31.118420
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f41d7b8c2e05'
+down_revision: Union[str, Sequence[str], None] = 'e3c81f6a4d97'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('wallet_outbox',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('walletId', sa.String(), nullable=False),
+    sa.Column('userId', sa.String(), nullable=False),
+    sa.Column('operationId', sa.String(), nullable=False),
+    sa.Column('delta', sa.BigInteger(), nullable=False),
+    sa.Column('balance', sa.BigInteger(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('traceId', sa.String(), nullable=False),
+    sa.Column('createdAt', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('wallet_outbox_relay',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('lastId', sa.BigInteger(), nullable=False),
+    sa.Column('updatedAt', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('wallet_outbox_relay')
+    op.drop_table('wallet_outbox')
@@ -1,10 +1,7 @@
-from fastapi import APIRouter, Request, Depends
-from app.responses import success_response
+from fastapi import APIRouter, Request
+from app.responses import success_response, error_response
 from app.codes import Codes
-from app.db.session import get_db
-import httpx
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.config import settings
+from app.core.health import dependency_prober
 
 router = APIRouter(tags=["system"])
 
@@ -20,38 +17,38 @@ async def get_live(request: Request):
     )
 
 @router.get("/health")
-async def get_health(request: Request, db: AsyncSession = Depends(get_db)):
-    # TraceID теперь устанавливается через middleware
+async def get_health(request: Request):
+    # Отвечаем из снимка фоновой проверки зависимостей, без обращений к ним
     trace_id = getattr(request.state, 'trace_id', None)
-    database_status = "OK"
-    dependencies = {}
-    overall_status = "UP"
-    # Check database
-    import sqlalchemy.exc
-    try:
-        if db:
-            await db.execute("SELECT 1")
-        database_status = "OK"
-    except (sqlalchemy.exc.SQLAlchemyError, AttributeError):
-        database_status = "DOWN"
-        overall_status = "DOWN"
-    # Check svc-users dependency
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{settings.SVC_USERS_URL}/health", timeout=2.0)
-            dependencies["svc-users"] = "OK" if response.status_code == 200 else "DOWN"
-            if response.status_code != 200:
-                overall_status = "DOWN"
-    except (httpx.RequestError, httpx.TimeoutException):
-        dependencies["svc-users"] = "DOWN"
-        overall_status = "DOWN"
+    checks = dependency_prober.snapshot()
+    statuses = {name: checks.get(name, {}).get("status", "UNKNOWN") for name in ("database", "redis", "svc-users")}
+    overall_status = "UP" if checks and all(check.get("status") == "OK" for check in checks.values()) else "DOWN"
     return success_response(
         data={
             "status": overall_status,
-            "database": database_status,
-            "dependencies": dependencies
+            "database": statuses["database"],
+            "dependencies": {"redis": statuses["redis"], "svc-users": statuses["svc-users"]},
+            "checks": checks,
         },
         code=Codes.HEALTH_OK,
         message="Сервис работает" if overall_status == "UP" else "Сервис имеет проблемы",
         trace_id=trace_id
     )
+
+@router.get("/ready")
+async def get_ready(request: Request):
+    trace_id = getattr(request.state, 'trace_id', None)
+    if not dependency_prober.is_ready():
+        return error_response(
+            status_code=503,
+            message="svc-wallet не готов принимать трафик",
+            code=Codes.NOT_READY,
+            details={"checks": dependency_prober.snapshot()},
+            trace_id=trace_id
+        )
+    return success_response(
+        data={"ready": True},
+        code=Codes.READY_OK,
+        message="svc-wallet готов принимать трафик",
+        trace_id=trace_id
+    )
@@ -1,4 +1,6 @@
+from typing import List
 from pydantic import BaseModel
+from app.db.models import WalletOperationType
 
 class CreateWalletRequest(BaseModel):
     userId: str
@@ -12,3 +14,20 @@ class WithdrawRequest(BaseModel):
     amount: int
     externalOperationId: str
     reason: str
+
+class TransferRequest(BaseModel):
+    transferId: str
+    fromUserId: str
+    toUserId: str
+    amount: int
+    reason: str
+
+class BatchOperationItem(BaseModel):
+    userId: str
+    type: WalletOperationType
+    amount: int
+    externalOperationId: str
+    reason: str
+
+class BatchOperationsRequest(BaseModel):
+    operations: List[BatchOperationItem]
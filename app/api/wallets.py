@@ -1,16 +1,19 @@
-import logging
-from datetime import datetime
-from fastapi import APIRouter, Request, HTTPException, Depends
+from fastapi import APIRouter, Request, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 from typing import Optional
+from datetime import datetime
 from app.responses import success_response, error_response
 from app.codes import Codes
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.api.schemas import CreateWalletRequest, DepositRequest, WithdrawRequest
+from app.api.schemas import CreateWalletRequest, DepositRequest, WithdrawRequest, BatchOperationsRequest, TransferRequest
 from app.service.wallet_service import WalletService
+from app.service.ledger_export import EXPORT_FORMATS, export_operations
 from app.repository.wallet_repository import WalletRepository
+from app.core.users import users_client
 from app.core.config import settings
-import httpx
+from app.db.models import WalletOperationType
+from app.core.utils import is_uuid
 
 
 router = APIRouter(prefix="/wallets", tags=["wallets"])
@@ -20,17 +23,12 @@ async def verify_user_exists(user_id: str) -> bool:
     """
     Проверяет существование пользователя по user_id через внешний сервис пользователей.
     Возвращает True, если пользователь найден, иначе False.
-    Логирует ошибку при сбое запроса.
-    """
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{settings.SVC_USERS_URL}/users/{user_id}", timeout=5.0)
-            return response.status_code == 200
-    except (httpx.RequestError, httpx.TimeoutException, httpx.ConnectError) as exc:
-        logging.exception(
-            f"[{datetime.utcnow().isoformat()}] Error verifying user existence: user_id={user_id}, endpoint={endpoint}, trace_id={trace_id}, exc={str(exc)}"
-        )
+    Ответы кешируются, запросы идут через общий пул соединений (см. app.core.users).
+    Идентификатор не в канонической записи UUID (строчные буквы, с дефисами) отклоняется без запроса.
+    """
+    if not is_uuid(user_id):
         return False
+    return await users_client.user_exists(user_id)
 
 
 @router.post("")
@@ -51,8 +49,110 @@ async def create_wallet_endpoint(request: Request, payload: CreateWalletRequest,
     return error_response(status_code=500, message="Failed to create wallet", code=Codes.WALLET_INTERNAL_ERROR, trace_id=trace_id)
 
 
+@router.get("")
+async def get_wallets_endpoint(request: Request, userIds: str = Query(..., description="Comma-separated user ids"), db: AsyncSession = Depends(get_read_db)):
+    """
+    Получить кошельки и балансы многих пользователей одним запросом.
+    Результат по каждому userId содержит свой код (WALLET_FETCHED_OK, USER_NOT_FOUND, WALLET_NOT_FOUND).
+    """
+    trace_id = getattr(request.state, 'trace_id', None)
+    repository = WalletRepository(db)
+    service = WalletService(repository, verify_user_exists)
+    user_ids = [user_id.strip() for user_id in userIds.split(",") if user_id.strip()]
+    data, code = await service.get_wallets(user_ids)
+    if code == Codes.INVALID_REQUEST:
+        return error_response(status_code=400, message=f"userIds must contain from 1 to {settings.WALLET_BULK_READ_MAX_SIZE} ids", code=code, trace_id=trace_id)
+    return success_response(message="Wallets fetched successfully", code=code, data={"results": data}, trace_id=trace_id)
+
+
+@router.get("/balances")
+async def get_balances_at_endpoint(
+    request: Request,
+    userIds: str = Query(..., description="Comma-separated user ids"),
+    at: datetime = Query(..., description="Point in time (ISO 8601, UTC if no offset)"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Получить балансы многих пользователей на момент at (например, на конец месяца).
+    Результат по каждому userId содержит свой код (WALLET_FETCHED_OK, USER_NOT_FOUND, WALLET_NOT_FOUND).
+    """
+    trace_id = getattr(request.state, 'trace_id', None)
+    repository = WalletRepository(db)
+    service = WalletService(repository, verify_user_exists)
+    user_ids = [user_id.strip() for user_id in userIds.split(",") if user_id.strip()]
+    data, code = await service.get_balances_at(user_ids, at)
+    if code == Codes.INVALID_REQUEST:
+        return error_response(status_code=400, message=f"userIds must contain from 1 to {settings.WALLET_BALANCE_AT_MAX_SIZE} ids", code=code, trace_id=trace_id)
+    return success_response(message="Balances fetched successfully", code=code, data={"results": data}, trace_id=trace_id)
+
+
+@router.get("/operations:export")
+async def export_operations_endpoint(
+    request: Request,
+    format: str = Query("ndjson"),
+    walletId: Optional[str] = Query(None),
+    createdFrom: Optional[datetime] = Query(None, alias="from"),
+    createdTo: Optional[datetime] = Query(None, alias="to"),
+):
+    """
+    Потоковая выгрузка журнала операций (NDJSON или CSV) для сверок.
+    Строки читаются серверным курсором, память не зависит от размера таблицы.
+    """
+    trace_id = getattr(request.state, 'trace_id', None)
+    if format not in EXPORT_FORMATS:
+        return error_response(status_code=400, message=f"format must be one of: {', '.join(EXPORT_FORMATS)}", code=Codes.INVALID_REQUEST, trace_id=trace_id)
+    if walletId is not None and not is_uuid(walletId):
+        return error_response(status_code=400, message="walletId must be a lowercase hyphenated UUID", code=Codes.INVALID_REQUEST, trace_id=trace_id)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(export_operations(format, createdFrom, createdTo, walletId), media_type=media_type)
+
+
+@router.post("/operations:batch")
+async def batch_operations_endpoint(request: Request, payload: BatchOperationsRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Пакетно провести пополнения и списания по многим пользователям.
+    Возвращает результат по каждой операции с кодами из Codes.
+    """
+    trace_id = getattr(request.state, 'trace_id', None)
+    repository = WalletRepository(db)
+    service = WalletService(repository, verify_user_exists)
+    operations = [
+        (item.userId, item.type, item.amount, item.externalOperationId, item.reason)
+        for item in payload.operations
+    ]
+    data, code = await service.apply_batch(operations, trace_id)
+    if code == Codes.INVALID_REQUEST:
+        return error_response(status_code=400, message=f"Batch must contain from 1 to {settings.WALLET_BATCH_MAX_SIZE} operations", code=code, trace_id=trace_id)
+    return success_response(message="Batch processed", code=code, data={"results": data}, trace_id=trace_id)
+
+
+@router.post("/transfers")
+async def transfer_endpoint(request: Request, payload: TransferRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Перевести средства с кошелька одного пользователя на кошелёк другого одной транзакцией.
+    Повтор с тем же transferId не проводит перевод второй раз.
+    """
+    trace_id = getattr(request.state, 'trace_id', None)
+    repository = WalletRepository(db)
+    service = WalletService(repository, verify_user_exists)
+    data, code = await service.transfer(
+        payload.fromUserId, payload.toUserId, payload.amount, payload.transferId, payload.reason, trace_id
+    )
+    if code == Codes.INVALID_REQUEST:
+        return error_response(status_code=400, message="Amount must be greater than 0 and users must differ", code=code, trace_id=trace_id)
+    if code == Codes.USER_NOT_FOUND:
+        return error_response(status_code=404, message=f"User with id {data['userId']} not found", code=code, trace_id=trace_id)
+    if code == Codes.WALLET_NOT_FOUND:
+        return error_response(status_code=404, message=f"Wallet for user {data['userId']} not found", code=code, trace_id=trace_id)
+    if code == Codes.WALLET_OPERATION_DUPLICATE:
+        return error_response(status_code=409, message="Duplicate transfer", code=code, trace_id=trace_id)
+    if code == Codes.WALLET_INSUFFICIENT_FUNDS:
+        return error_response(status_code=400, message="Insufficient funds", code=code, trace_id=trace_id)
+    return success_response(message="Transfer successful", code=code, data=data, trace_id=trace_id)
+
+
 @router.get("/{userId}")
-async def get_wallet_endpoint(request: Request, userId: str, db: AsyncSession = Depends(get_db)):
+async def get_wallet_endpoint(request: Request, userId: str, db: AsyncSession = Depends(get_read_db)):
     """
     Получить информацию о кошельке пользователя по userId.
     Возвращает ошибку, если пользователь или кошелёк не найден.
@@ -68,6 +168,56 @@ async def get_wallet_endpoint(request: Request, userId: str, db: AsyncSession =
     return success_response(message="Wallet fetched successfully", code=code, data=data, trace_id=trace_id)
 
 
+@router.get("/{userId}/balance")
+async def get_balance_at_endpoint(
+    request: Request,
+    userId: str,
+    at: datetime = Query(..., description="Point in time (ISO 8601, UTC if no offset)"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Получить баланс кошелька пользователя на момент at по истории операций.
+    Возвращает ошибку, если пользователь или кошелёк не найден.
+    """
+    trace_id = getattr(request.state, 'trace_id', None)
+    repository = WalletRepository(db)
+    service = WalletService(repository, verify_user_exists)
+    data, code = await service.get_balance_at(userId, at)
+    if code == Codes.USER_NOT_FOUND:
+        return error_response(status_code=404, message=f"User with id {userId} not found", code=code, trace_id=trace_id)
+    if code == Codes.WALLET_NOT_FOUND:
+        return error_response(status_code=404, message=f"Wallet for user {userId} not found", code=code, trace_id=trace_id)
+    return success_response(message="Balance fetched successfully", code=code, data=data, trace_id=trace_id)
+
+
+@router.get("/{userId}/operations")
+async def get_operations_endpoint(
+    request: Request,
+    userId: str,
+    limit: int = Query(settings.OPERATIONS_PAGE_DEFAULT_SIZE),
+    cursor: Optional[str] = Query(None),
+    type: Optional[WalletOperationType] = Query(None),
+    createdFrom: Optional[datetime] = Query(None, alias="from"),
+    createdTo: Optional[datetime] = Query(None, alias="to"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Получить историю операций кошелька пользователя с курсорной пагинацией (от новых к старым).
+    Следующая страница запрашивается с cursor=nextCursor из ответа.
+    """
+    trace_id = getattr(request.state, 'trace_id', None)
+    repository = WalletRepository(db)
+    service = WalletService(repository, verify_user_exists)
+    data, code = await service.get_operations(userId, limit, cursor, type, createdFrom, createdTo)
+    if code == Codes.INVALID_REQUEST:
+        return error_response(status_code=400, message=f"Invalid cursor or limit (must be from 1 to {settings.OPERATIONS_PAGE_MAX_SIZE})", code=code, trace_id=trace_id)
+    if code == Codes.USER_NOT_FOUND:
+        return error_response(status_code=404, message=f"User with id {userId} not found", code=code, trace_id=trace_id)
+    if code == Codes.WALLET_NOT_FOUND:
+        return error_response(status_code=404, message=f"Wallet for user {userId} not found", code=code, trace_id=trace_id)
+    return success_response(message="Operations fetched successfully", code=code, data=data, trace_id=trace_id)
+
+
 @router.post("/{userId}/deposit")
 async def deposit_endpoint(request: Request, userId: str, payload: DepositRequest, db: AsyncSession = Depends(get_db)):
     """
@@ -79,9 +229,11 @@ async def deposit_endpoint(request: Request, userId: str, payload: DepositReques
     service = WalletService(repository, verify_user_exists)
     data, code = await service.deposit(userId, payload.amount, payload.externalOperationId, payload.reason, trace_id)
     if code == Codes.INVALID_REQUEST:
-        return error_response(status_code=400, message="Amount must be greater than 0", code=code, trace_id=trace_id)
+        return error_response(status_code=400, message="Amount must be greater than 0 and externalOperationId must not start with 'transfer:'", code=code, trace_id=trace_id)
     if code == Codes.USER_NOT_FOUND:
         return error_response(status_code=404, message=f"User with id {userId} not found", code=code, trace_id=trace_id)
+    if code == Codes.WALLET_NOT_FOUND:
+        return error_response(status_code=404, message=f"Wallet for user {userId} not found", code=code, trace_id=trace_id)
     if code == Codes.WALLET_OPERATION_DUPLICATE:
         return error_response(status_code=409, message="Duplicate operation", code=code, trace_id=trace_id)
     return success_response(message="Deposit successful", code=code, data=data, trace_id=trace_id)
@@ -98,7 +250,7 @@ async def withdraw_endpoint(request: Request, userId: str, payload: WithdrawRequ
     service = WalletService(repository, verify_user_exists)
     data, code = await service.withdraw(userId, payload.amount, payload.externalOperationId, payload.reason, trace_id)
     if code == Codes.INVALID_REQUEST:
-        return error_response(status_code=400, message="Amount must be greater than 0", code=code, trace_id=trace_id)
+        return error_response(status_code=400, message="Amount must be greater than 0 and externalOperationId must not start with 'transfer:'", code=code, trace_id=trace_id)
     if code == Codes.USER_NOT_FOUND:
         return error_response(status_code=404, message=f"User with id {userId} not found", code=code, trace_id=trace_id)
     if code == Codes.WALLET_NOT_FOUND:
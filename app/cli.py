@@ -0,0 +1,200 @@
+"""
+Служебные команды svc-wallet.
+
+Запуск: ``python -m app.cli <команда>``.
+"""
+import argparse
+import asyncio
+import sys
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.utils import is_uuid, utc_now
+from app.db import partitions
+from app.db.session import SessionLocal, engine
+from app.repository.wallet_repository import WalletRepository
+from app.service.ledger_export import EXPORT_FORMATS, ExportStats, export_operations
+from app.service.ledger_compaction import compact_ledger, write_checkpoints
+from app.service.wallet_service import WalletService
+
+
+async def verify_balances(fix: bool) -> int:
+    """
+    Пересчитать балансы по истории операций и сообщить о расхождениях
+    с материализованным балансом кошельков.
+    :param fix: перезаписать сохранённый баланс значением из истории
+    :return: код выхода (0 — расхождений нет или они исправлены)
+    """
+    async with SessionLocal() as session:
+        repository = WalletRepository(session)
+        # Сверка — один запрос по всему журналу, DB_STATEMENT_TIMEOUT рассчитан на запросы записи
+        await session.execute(text("SET LOCAL statement_timeout = 0"))
+        drift = await repository.get_balance_drift()
+        for wallet_id, stored, actual in drift:
+            print(f"wallet_id={wallet_id} stored={stored} actual={actual} diff={stored - actual}")
+            if fix:
+                await repository.recompute_balance(wallet_id)
+        print(f"drift_found={len(drift)} fixed={len(drift) if fix else 0}")
+        return 0 if not drift or fix else 1
+
+
+async def export_ledger(export_format: str, created_from, created_to, wallet_id, output) -> int:
+    """
+    Выгрузить журнал операций в файл или stdout; скорость выгрузки пишется в stderr.
+    """
+    stats = ExportStats()
+    async for chunk in export_operations(export_format, created_from, created_to, wallet_id, stats):
+        output.write(chunk)
+    output.flush()
+    print(
+        f"rows={stats.rows} seconds={stats.elapsed:.2f} rows_per_second={stats.rows_per_second:.0f}",
+        file=sys.stderr,
+    )
+    return 0
+
+
+async def maintain_partitions(months_ahead: int, retain_months, dry_run: bool) -> int:
+    """
+    Создать партиции wallet_operations на months_ahead месяцев вперёд и отсоединить
+    партиции старше окна хранения (retain_months полных месяцев; None — не отсоединять).
+    Отсоединяются только партиции, которые compact-ledger уже покрыл контрольной точкой
+    и перенёс в wallet_operations_archive: иначе сверка балансов по истории недосчиталась бы
+    их операций, а verify-balances --fix перезаписал бы верные балансы.
+    Отсоединённые таблицы остаются в БД; ключи идемпотентности сохраняются.
+    Месяцы отсчитываются по дате UTC, как и границы партиций.
+    """
+    today = utc_now().date()
+    months = partitions.months_between(
+        partitions.month_start(today), partitions.add_months(partitions.month_start(today), months_ahead)
+    )
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        existing = list((await conn.execute(text(partitions.LIST_PARTITIONS_SQL))).scalars())
+        for month in months:
+            name = partitions.partition_name(month)
+            if name in existing:
+                continue
+            print(f"create {name}")
+            if not dry_run:
+                await conn.execute(text(partitions.create_partition_sql(month)))
+        if retain_months is not None:
+            covered = (await conn.execute(text(partitions.LATEST_CHECKPOINT_SQL))).scalar_one_or_none()
+            for name in partitions.partitions_to_detach(existing, today, retain_months):
+                end = partitions.add_months(partitions.partition_month(name), 1)
+                if covered is None or datetime(end.year, end.month, end.day, tzinfo=timezone.utc) > covered:
+                    print(f"skip {name}: no balance checkpoint covers it, run compact-ledger first", file=sys.stderr)
+                    continue
+                if (await conn.execute(text(partitions.partition_has_rows_sql(name)))).scalar_one():
+                    print(f"skip {name}: operations are not archived yet, run compact-ledger first", file=sys.stderr)
+                    continue
+                print(f"detach {name}")
+                if not dry_run:
+                    # DETACH ... CONCURRENTLY не работает внутри транзакции, поэтому AUTOCOMMIT
+                    await conn.execute(text(partitions.detach_partition_sql(name)))
+    return 0
+
+
+async def checkpoint_balances(cutoff: date, chunk_size: int) -> int:
+    """
+    Контрольные точки балансов на cutoff (по умолчанию — начало текущего месяца).
+    """
+    cutoff = datetime(cutoff.year, cutoff.month, cutoff.day, tzinfo=timezone.utc)
+    try:
+        # Операции до слишком свежего cutoff ещё могут фиксироваться и не попали бы в контрольную точку
+        await write_checkpoints(cutoff, chunk_size)
+    except ValueError as exc:
+        print(f"error={exc}", file=sys.stderr)
+        return 1
+    print(f"cutoff={cutoff.isoformat()}")
+    return 0
+
+
+async def compact(retain_months: int, chunk_size: int, purge_keys: bool) -> int:
+    """
+    Контрольные точки балансов на начало окна хранения и перенос более старых операций в архив.
+    """
+    cutoff = partitions.add_months(partitions.month_start(utc_now()), -retain_months)
+    cutoff = datetime(cutoff.year, cutoff.month, cutoff.day, tzinfo=timezone.utc)
+    try:
+        stats = await compact_ledger(cutoff, chunk_size, purge_keys)
+    except ValueError as exc:
+        print(f"error={exc}", file=sys.stderr)
+        return 1
+    print(f"cutoff={cutoff.isoformat()} archived={stats.archived} purged_keys={stats.purged_keys}")
+    return 0
+
+
+async def shard_wallet(user_id: str, shards: int) -> int:
+    """
+    Разделить баланс кошелька на shards суббалансов (1 — выключить шардирование).
+    """
+    # Та же проверка, что в API: иначе запрос к uuid-столбцу падает с DataError
+    if not is_uuid(user_id):
+        print(f"error=user_id must be a canonical uuid (lowercase, with dashes), got {user_id!r}", file=sys.stderr)
+        return 1
+    async with SessionLocal() as session:
+        data, code = await WalletService(WalletRepository(session), verify_user_exists=None).set_wallet_shards(
+            user_id, shards
+        )
+    if data is None:
+        print(f"error={code.value}", file=sys.stderr)
+        return 1
+    print(f"wallet_id={data['id']} shards={data['shards']} balance={data['balance']}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="svc-wallet maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    verify = commands.add_parser("verify-balances", help="compare stored balances with SUM over wallet_operations")
+    verify.add_argument("--fix", action="store_true", help="overwrite drifted balances with the recomputed value")
+
+    export = commands.add_parser("export-operations", help="stream wallet_operations as NDJSON or CSV")
+    export.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    export.add_argument("--from", dest="created_from", type=datetime.fromisoformat, help="createdAt lower bound (inclusive), UTC if no offset")
+    export.add_argument("--to", dest="created_to", type=datetime.fromisoformat, help="createdAt upper bound (exclusive), UTC if no offset")
+    export.add_argument("--wallet-id", help="export a single wallet")
+    export.add_argument("--output", help="output file (default: stdout)")
+
+    maintain = commands.add_parser("maintain-partitions", help="pre-create future wallet_operations partitions and detach old ones")
+    maintain.add_argument("--months-ahead", type=int, default=3, help="months to pre-create after the current one")
+    maintain.add_argument("--retain-months", type=int, help="detach partitions older than this many full months once compact-ledger has archived them")
+    maintain.add_argument("--dry-run", action="store_true")
+
+    checkpoint = commands.add_parser("checkpoint-balances", help="write per-wallet balance checkpoints used by point-in-time balance queries")
+    checkpoint.add_argument("--cutoff", type=date.fromisoformat, default=partitions.month_start(utc_now()), help="YYYY-MM-DD (UTC midnight), default: first day of the current UTC month")
+    checkpoint.add_argument("--chunk-size", type=int, default=settings.LEDGER_COMPACTION_CHUNK_SIZE)
+
+    compaction = commands.add_parser("compact-ledger", help="checkpoint balances and archive operations older than the retention window")
+    compaction.add_argument("--retain-months", type=int, default=settings.LEDGER_RETENTION_MONTHS, help="full months to keep in wallet_operations")
+    compaction.add_argument("--chunk-size", type=int, default=settings.LEDGER_COMPACTION_CHUNK_SIZE)
+    compaction.add_argument("--purge-keys", action="store_true", help="also drop idempotency keys older than the retention window")
+
+    shard = commands.add_parser("shard-wallet", help="split a hot wallet balance across independent sub-balances")
+    shard.add_argument("user_id")
+    shard.add_argument("--shards", type=int, required=True, help="number of sub-balances (1 turns sharding off)")
+
+    args = parser.parse_args(argv)
+    if args.command == "verify-balances":
+        return asyncio.run(verify_balances(args.fix))
+    if args.command == "maintain-partitions":
+        return asyncio.run(maintain_partitions(args.months_ahead, args.retain_months, args.dry_run))
+    if args.command == "checkpoint-balances":
+        return asyncio.run(checkpoint_balances(args.cutoff, args.chunk_size))
+    if args.command == "compact-ledger":
+        return asyncio.run(compact(args.retain_months, args.chunk_size, args.purge_keys))
+    if args.command == "shard-wallet":
+        return asyncio.run(shard_wallet(args.user_id, args.shards))
+    if args.command == "export-operations":
+        if args.output:
+            with open(args.output, "w", encoding="utf-8", newline="") as output:
+                return asyncio.run(export_ledger(args.format, args.created_from, args.created_to, args.wallet_id, output))
+        return asyncio.run(export_ledger(args.format, args.created_from, args.created_to, args.wallet_id, sys.stdout))
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
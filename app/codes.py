@@ -4,11 +4,16 @@ class Codes(str, Enum):
     LIVE_OK = "LIVE_OK"
     HEALTH_OK = "HEALTH_OK"
     READY_OK = "READY_OK"
+    NOT_READY = "NOT_READY"
+    USERS_SERVICE_UNAVAILABLE = "USERS_SERVICE_UNAVAILABLE"
     WALLET_CREATED = "WALLET_CREATED"
     WALLET_FETCHED_OK = "WALLET_FETCHED_OK"
+    WALLET_OPERATIONS_FETCHED_OK = "WALLET_OPERATIONS_FETCHED_OK"
     WALLET_DEPOSIT_OK = "WALLET_DEPOSIT_OK"
     WALLET_WITHDRAW_OK = "WALLET_WITHDRAW_OK"
     WALLET_DELETED = "WALLET_DELETED"
+    WALLET_BATCH_PROCESSED = "WALLET_BATCH_PROCESSED"
+    WALLET_TRANSFER_OK = "WALLET_TRANSFER_OK"
     USER_NOT_FOUND = "USER_NOT_FOUND"
     WALLET_NOT_FOUND = "WALLET_NOT_FOUND"
     WALLET_ALREADY_EXISTS = "WALLET_ALREADY_EXISTS"
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+
+from app.core.metrics import CIRCUIT_BREAKER_REJECTED, CIRCUIT_BREAKER_STATE
+
+CLOSED = "CLOSED"
+OPEN = "OPEN"
+HALF_OPEN = "HALF_OPEN"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """
+    Вызов отклонён без обращения к зависимости: breaker открыт
+    или исчерпан лимит одновременных вызовов.
+    """
+    def __init__(self, name: str, reason: str):
+        super().__init__(f"{name}: {reason}")
+        self.name = name
+        self.reason = reason
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker вызовов внешней зависимости в пределах процесса.
+    CLOSED: вызовы идут, не более max_concurrency одновременно (лишние отклоняются сразу,
+    а не ждут в очереди); вызов дольше latency_budget отменяется и считается сбоем.
+    failure_threshold сбоев подряд переводят в OPEN: вызовы отклоняются reset_timeout секунд,
+    затем HALF_OPEN пропускает до half_open_calls пробных вызовов; успех закрывает breaker,
+    сбой снова открывает.
+    """
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        reset_timeout: float,
+        latency_budget: float,
+        max_concurrency: int,
+        half_open_calls: int = 1,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.latency_budget = latency_budget
+        self.max_concurrency = max_concurrency
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._in_flight = 0
+        self._probes = 0
+        CIRCUIT_BREAKER_STATE.labels(name).set(_STATE_VALUES[CLOSED])
+
+    def _set_state(self, state: str):
+        self.state = state
+        CIRCUIT_BREAKER_STATE.labels(self.name).set(_STATE_VALUES[state])
+
+    def _reject(self, reason: str):
+        CIRCUIT_BREAKER_REJECTED.labels(self.name, reason).inc()
+        raise CircuitOpenError(self.name, reason)
+
+    def _acquire(self) -> bool:
+        """
+        Допустить вызов или отклонить его (CircuitOpenError).
+        :return: True, если вызов пробный (HALF_OPEN)
+        """
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                self._reject("open")
+            self._set_state(HALF_OPEN)
+            self._probes = 0
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_calls:
+                self._reject("open")
+            self._probes += 1
+            return True
+        if self._in_flight >= self.max_concurrency:
+            self._reject("concurrency")
+        return False
+
+    def _record_success(self):
+        self._failures = 0
+        if self.state != CLOSED:
+            self._set_state(CLOSED)
+
+    def _record_failure(self, probe: bool):
+        self._failures += 1
+        if probe or (self.state == CLOSED and self._failures >= self.failure_threshold):
+            self._opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    async def call(self, func: Callable[[], Awaitable], is_failure: Callable[[object], bool] = lambda result: False):
+        """
+        Выполнить func через breaker.
+        :param is_failure: признак сбоя по результату (например, ответ 5xx)
+        :return: результат func
+        :raises CircuitOpenError: вызов отклонён без обращения к зависимости
+        """
+        probe = self._acquire()
+        self._in_flight += 1
+        try:
+            result = await asyncio.wait_for(func(), self.latency_budget)
+        except asyncio.CancelledError:
+            if probe:
+                self._probes -= 1
+            raise
+        except Exception:
+            self._record_failure(probe)
+            raise
+        finally:
+            self._in_flight -= 1
+        if is_failure(result):
+            self._record_failure(probe)
+        else:
+            self._record_success()
+        return result
+
+    def snapshot(self) -> dict:
+        retry_in: Optional[float] = None
+        if self.state == OPEN:
+            retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)), 2)
+        return {
+            "state": self.state,
+            "consecutiveFailures": self._failures,
+            "inFlight": self._in_flight,
+            "retryInSeconds": retry_in,
+        }
@@ -1,14 +1,78 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "postgresql+psycopg://svc_wallet:svc_wallet@db:5432/svc_wallet"
+    DATABASE_REPLICA_URL: str = ""  # read-only queries go here when set
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800  # seconds
+    DB_POOL_PRE_PING: bool = True
+    DB_QUERY_CACHE_SIZE: int = 500  # SQLAlchemy compiled statement cache
+    DB_PREPARE_THRESHOLD: Optional[int] = 5  # psycopg server-side prepare; None disables (e.g. PgBouncer)
+    DB_STATEMENT_TIMEOUT: float = 30.0  # seconds, statement_timeout on primary connections (bounds how late a write commits); 0 disables
     SVC_USERS_URL: str = "http://host.docker.internal:9002"
     REDIS_HOST: str = "redis"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
     REDIS_PASSWORD: str = ""
     REDIS_BALANCE_TTL: int = 43200  # 12 hours in seconds
+    REDIS_BALANCE_EARLY_REFRESH: float = 60.0  # seconds; probabilistic refresh window before expiry, 0 disables
+    BALANCE_WARMUP_ENABLED: bool = True  # pre-fill balances of recently active wallets on startup
+    BALANCE_WARMUP_WINDOW_HOURS: int = 24
+    BALANCE_WARMUP_MAX_WALLETS: int = 100000
+    BALANCE_WARMUP_BATCH_SIZE: int = 1000  # balances per Redis pipeline
+    BALANCE_RECONCILER_ENABLED: bool = True  # sample cached balances and repair drift from the DB
+    BALANCE_RECONCILER_BATCH_SIZE: int = 200  # keys checked per iteration
+    BALANCE_RECONCILER_INTERVAL: float = 1.0  # seconds between iterations
+    WALLET_READ_SINGLE_FLIGHT: bool = True  # coalesce concurrent get_wallet loads of one user in-process
+    LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = True
+    HEALTH_PROBE_INTERVAL: float = 5.0  # seconds between background dependency checks
+    HEALTH_PROBE_TIMEOUT: float = 2.0
+    HEALTH_WARM_DB_CONNECTIONS: int = 5  # connections opened per DB pool before /ready
+    SVC_USERS_TIMEOUT: float = 5.0
+    SVC_USERS_HTTP2: bool = True
+    SVC_USERS_MAX_CONNECTIONS: int = 100
+    SVC_USERS_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    SVC_USERS_KEEPALIVE_EXPIRY: float = 30.0
+    SVC_USERS_BREAKER_ENABLED: bool = True
+    SVC_USERS_LATENCY_BUDGET: float = 0.5  # seconds; slower calls are cancelled and count as failures
+    SVC_USERS_MAX_CONCURRENCY: int = 50  # in-flight calls per worker, excess fails fast
+    SVC_USERS_BREAKER_FAILURE_THRESHOLD: int = 5  # consecutive failures that open the breaker
+    SVC_USERS_BREAKER_RESET_TIMEOUT: float = 10.0  # seconds open before half-open probing
+    SVC_USERS_BREAKER_HALF_OPEN_CALLS: int = 1
+    SVC_USERS_DEGRADED_MODE: bool = False  # while svc-users is unavailable, reads and deposits pass for users with a wallet
+    USER_CACHE_MAX_SIZE: int = 10000
+    USER_CACHE_TTL: int = 300  # 5 minutes in seconds
+    USER_CACHE_NEGATIVE_TTL: int = 15
+    USER_CACHE_REDIS_ENABLED: bool = False
+    IDEMPOTENCY_STORE_ENABLED: bool = True
+    IDEMPOTENCY_TTL: int = 86400  # 24 hours in seconds
+    IDEMPOTENCY_REPLAY_ORIGINAL: bool = False  # retries get the original success payload instead of a 409
+    LEDGER_RETENTION_MONTHS: int = 12  # full months kept in wallet_operations by compact-ledger
+    LEDGER_COMPACTION_CHUNK_SIZE: int = 5000  # rows per transaction
+    LEDGER_CHECKPOINT_SAFETY_MARGIN: float = 600.0  # seconds; checkpoint cutoff must be this old, must exceed DB_STATEMENT_TIMEOUT
+    OUTBOX_RELAY_ENABLED: bool = True
+    OUTBOX_STREAM: str = "wallet_balance_events"
+    OUTBOX_STREAM_MAXLEN: int = 1000000  # approximate trim
+    OUTBOX_BATCH_SIZE: int = 500
+    OUTBOX_POLL_INTERVAL: float = 0.2  # seconds
+    WALLET_MAX_SHARDS: int = 64  # upper bound for sub-balances of a hot wallet
+    WALLET_LOCAL_LOCKS_ENABLED: bool = False  # queue same-wallet writes in-process before hitting the DB
+    GROUP_COMMIT_ENABLED: bool = False  # coalesce concurrent deposits/withdrawals into one transaction
+    GROUP_COMMIT_WINDOW_MS: float = 2.0
+    GROUP_COMMIT_MAX_BATCH: int = 200
+    WALLET_BATCH_MAX_SIZE: int = 5000
+    WALLET_BATCH_CHUNK_SIZE: int = 500  # operations per transaction
+    WALLET_BULK_READ_MAX_SIZE: int = 500
+    WALLET_BALANCE_AT_MAX_SIZE: int = 1000  # users per point-in-time balance request
+    OPERATIONS_PAGE_DEFAULT_SIZE: int = 50
+    OPERATIONS_PAGE_MAX_SIZE: int = 200
+    LEDGER_EXPORT_BATCH_SIZE: int = 5000  # rows fetched per server-side cursor round trip
 
     class Config:
         env_file = ".env"
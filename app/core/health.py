@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.metrics import DEPENDENCY_PROBE_SECONDS, DEPENDENCY_UP
+from app.core.redis import redis_client
+from app.core.users import users_client
+from app.core.utils import utc_now
+from app.db.session import engine, replica_engine
+
+logger = logging.getLogger(__name__)
+
+
+class DependencyProber:
+    """
+    Фоновая проверка зависимостей (БД, реплика, Redis, svc-users) с интервалом.
+    Результаты (статус, задержка, время проверки) хранятся в памяти: /health и /ready
+    отвечают из снимка и не нагружают зависимости на каждый probe Kubernetes.
+    Готовность наступает после прогрева пулов и успешной проверки обязательных зависимостей;
+    svc-users в готовность не входит, чтобы его сбой не выводил из балансировки все поды.
+    """
+    REQUIRED = ("database", "database-replica", "redis")
+
+    def __init__(self, interval: float, timeout: float, warm_connections: int):
+        self.interval = interval
+        self.timeout = timeout
+        self.warm_connections = warm_connections
+        self._snapshot: Dict[str, dict] = {}
+        self._warmed = False
+        self._task: Optional[asyncio.Task] = None
+
+    def _checks(self) -> Dict[str, Callable[[], Awaitable]]:
+        checks = {"database": lambda: self._check_db(engine)}
+        if replica_engine is not engine:
+            checks["database-replica"] = lambda: self._check_db(replica_engine)
+        checks["redis"] = self._check_redis
+        checks["svc-users"] = self._check_users
+        return checks
+
+    @staticmethod
+    async def _check_db(db_engine):
+        async with db_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    @staticmethod
+    async def _check_redis():
+        redis = await redis_client.get_redis()
+        await redis.ping()
+
+    async def _check_users(self):
+        client = await users_client.get_client()
+        response = await client.get("/health", timeout=self.timeout)
+        if response.status_code != 200:
+            raise RuntimeError(f"status_code={response.status_code}")
+
+    async def _probe(self, name: str, check: Callable[[], Awaitable]) -> dict:
+        started = time.perf_counter()
+        error = None
+        try:
+            await asyncio.wait_for(check(), self.timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            error = repr(exc)
+        elapsed = time.perf_counter() - started
+        DEPENDENCY_PROBE_SECONDS.labels(name).observe(elapsed)
+        DEPENDENCY_UP.labels(name).set(0 if error else 1)
+        result = {"status": "DOWN" if error else "OK", "latencyMs": round(elapsed * 1000, 2), "checkedAt": utc_now().isoformat()}
+        if error:
+            result["error"] = error
+        return result
+
+    async def probe_once(self) -> Dict[str, dict]:
+        checks = self._checks()
+        results = await asyncio.gather(*(self._probe(name, check) for name, check in checks.items()))
+        self._snapshot = dict(zip(checks, results))
+        return self._snapshot
+
+    async def warm_up(self):
+        """
+        Открыть warm_connections соединений в пулах БД одновременно: первые запросы
+        после старта не платят за установку соединений.
+        """
+        engines = {id(engine): engine, id(replica_engine): replica_engine}.values()
+        await asyncio.gather(*(
+            self._check_db(db_engine) for db_engine in engines for _ in range(self.warm_connections)
+        ))
+        self._warmed = True
+
+    def snapshot(self) -> Dict[str, dict]:
+        """
+        Снимок последней проверки; для svc-users — с текущим состоянием circuit breaker.
+        """
+        if users_client.breaker is None:
+            return self._snapshot
+        snapshot = dict(self._snapshot)
+        snapshot["svc-users"] = {**snapshot.get("svc-users", {}), "breaker": users_client.breaker.snapshot()}
+        return snapshot
+
+    def is_ready(self) -> bool:
+        return self._warmed and all(
+            self._snapshot.get(name, {}).get("status") == "OK"
+            for name in self.REQUIRED
+            if name in self._checks()
+        )
+
+    async def _run(self):
+        while True:
+            try:
+                if not self._warmed:
+                    await self.warm_up()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Connection pool warm-up failed")
+            try:
+                await self.probe_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Dependency probe failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # При остановке под сразу перестаёт быть готовым
+        self._warmed = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+dependency_prober = DependencyProber(
+    interval=settings.HEALTH_PROBE_INTERVAL,
+    timeout=settings.HEALTH_PROBE_TIMEOUT,
+    warm_connections=settings.HEALTH_WARM_DB_CONNECTIONS,
+)
@@ -0,0 +1,77 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict
+
+from app.core.metrics import SINGLE_FLIGHT_CALLS
+
+
+class KeyedLocks:
+    """
+    Карта asyncio.Lock по ключу в пределах процесса. Запись удаляется,
+    когда у ключа не остаётся владельцев и ожидающих, поэтому карта не растёт.
+    """
+    def __init__(self):
+        self._locks = {}
+
+    @asynccontextmanager
+    async def hold(self, key: str):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+class SingleFlight:
+    """
+    Объединение одновременных загрузок по ключу в пределах процесса: первый вызов
+    выполняет загрузку, остальные ждут его результат (или исключение).
+    Если первый вызов отменён, ожидающие выполняют загрузку сами.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, load: Callable[[], Awaitable]):
+        future = self._calls.get(key)
+        if future is not None:
+            SINGLE_FLIGHT_CALLS.labels(self.name, "shared").inc()
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                return await load()
+        SINGLE_FLIGHT_CALLS.labels(self.name, "leader").inc()
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        # Исключение без ожидающих не должно попадать в лог как «never retrieved»
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        try:
+            result = await load()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+wallet_locks = KeyedLocks()
+wallet_loads = SingleFlight("wallet_load")
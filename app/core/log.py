@@ -0,0 +1,84 @@
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.core.config import settings
+
+# Trace ID текущего запроса; выставляется TraceIDMiddleware
+current_trace_id: ContextVar[Optional[str]] = ContextVar("current_trace_id", default=None)
+
+# Атрибуты LogRecord, которые не попадают в JSON как пользовательские поля extra
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "trace_id"}
+
+
+class TraceIdFilter(logging.Filter):
+    """
+    Фиксирует trace_id в записи в момент логирования (в потоке event loop),
+    до передачи записи в очередь.
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_trace_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "traceId": getattr(record, "trace_id", None),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS:
+                payload[key] = value
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exception"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Форматирование откладывается до потока QueueListener; здесь только
+        # фиксируем сообщение и трейсбек, чтобы запись можно было передать между потоками
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(stream=None) -> logging.handlers.QueueListener:
+    """
+    Настроить корневой логгер: запись в очередь без блокировки event loop,
+    вывод (JSON или текст) — в отдельном потоке QueueListener.
+    :param stream: куда писать логи (по умолчанию stdout)
+    :return: запущенный QueueListener (остановить при завершении приложения)
+    """
+    log_queue = queue.SimpleQueue()
+    output = logging.StreamHandler(stream or sys.stdout)
+    if settings.LOG_JSON:
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] trace_id=%(trace_id)s %(message)s"))
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(TraceIdFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(settings.LOG_LEVEL)
+
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    return listener
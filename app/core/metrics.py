@@ -0,0 +1,203 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 32, 64)
+
+BALANCE_CACHE_REQUESTS = Counter(
+    "wallet_balance_cache_requests_total",
+    "Balance cache lookups by result",
+    ["result"],
+)
+BALANCE_CACHE_ROUND_TRIPS = Counter(
+    "wallet_balance_cache_round_trips_total",
+    "Redis round trips made by the balance cache, by operation",
+    ["operation"],
+)
+SINGLE_FLIGHT_CALLS = Counter(
+    "wallet_single_flight_calls_total",
+    "In-process coalesced loads: leader ran the load, shared waited for it",
+    ["name", "role"],
+)
+BALANCE_CACHE_WARMED = Counter(
+    "wallet_balance_cache_warmed_total",
+    "Balances written to the cache by the startup warm-up",
+)
+BALANCE_CACHE_RECONCILED = Counter(
+    "wallet_balance_cache_reconciled_total",
+    "Cached balances compared with the database by the reconciler",
+)
+BALANCE_CACHE_DRIFT = Counter(
+    "wallet_balance_cache_drift_total",
+    "Cached balances repaired by the reconciler, by kind (stale, mismatch, orphan)",
+    ["kind"],
+)
+DEPENDENCY_UP = Gauge(
+    "wallet_dependency_up",
+    "Last background probe result per dependency (1 up, 0 down)",
+    ["dependency"],
+)
+DEPENDENCY_PROBE_SECONDS = Histogram(
+    "wallet_dependency_probe_duration_seconds",
+    "Background dependency probe latency",
+    ["dependency"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "wallet_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_RESPONSES = Counter(
+    "wallet_http_responses_total",
+    "HTTP responses by route template and status",
+    ["method", "route", "status"],
+)
+RESPONSE_CODES = Counter(
+    "wallet_response_codes_total",
+    "Responses by application code (Codes)",
+    ["code"],
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    "wallet_request_sql_statements",
+    "SQL statements executed per request",
+    ["route"],
+    buckets=COUNT_BUCKETS,
+)
+REQUEST_SQL_SECONDS = Histogram(
+    "wallet_request_sql_seconds",
+    "Time spent in SQL statements per request",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_REDIS_COMMANDS = Histogram(
+    "wallet_request_redis_commands",
+    "Redis round trips (commands or pipelines) per request",
+    ["route"],
+    buckets=COUNT_BUCKETS,
+)
+REQUEST_REDIS_SECONDS = Histogram(
+    "wallet_request_redis_seconds",
+    "Time spent in Redis round trips per request",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+REDIS_COMMANDS = Counter(
+    "wallet_redis_commands_total",
+    "Redis round trips by command",
+    ["command"],
+)
+GROUP_COMMIT_BATCH_SIZE = Histogram(
+    "wallet_group_commit_batch_size",
+    "Operations per group commit",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+)
+GROUP_COMMIT_WAIT_SECONDS = Histogram(
+    "wallet_group_commit_wait_seconds",
+    "Latency added by waiting for the group commit flush",
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+SHARDED_LOCKED_PATH = Counter(
+    "wallet_sharded_locked_path_total",
+    "Sharded wallet operations that locked all sub-balances (no free shard could cover them)",
+)
+OUTBOX_PUBLISHED = Counter(
+    "wallet_outbox_published_total",
+    "Balance events published from the outbox to the Redis Stream",
+)
+OUTBOX_PENDING = Gauge(
+    "wallet_outbox_pending",
+    "Outbox events not yet published (estimated from the outbox id range)",
+)
+OUTBOX_LAG_SECONDS = Gauge(
+    "wallet_outbox_lag_seconds",
+    "Age of the oldest unpublished outbox event",
+)
+DB_SESSIONS = Counter(
+    "wallet_db_sessions_total",
+    "Database sessions opened by role (primary/replica)",
+    ["role"],
+)
+SVC_USERS_SECONDS = Histogram(
+    "wallet_svc_users_request_duration_seconds",
+    "svc-users call latency by outcome",
+    ["outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+CIRCUIT_BREAKER_STATE = Gauge(
+    "wallet_circuit_breaker_state",
+    "Circuit breaker state per dependency (0 closed, 1 half-open, 2 open)",
+    ["dependency"],
+)
+CIRCUIT_BREAKER_REJECTED = Counter(
+    "wallet_circuit_breaker_rejected_total",
+    "Calls rejected without reaching the dependency, by reason (open, concurrency)",
+    ["dependency", "reason"],
+)
+SVC_USERS_DEGRADED_CHECKS = Counter(
+    "wallet_svc_users_degraded_checks_total",
+    "User checks answered from an existing wallet while svc-users was unavailable",
+)
+
+
+class RequestStats:
+    """
+    Счётчики обращений к БД и Redis в рамках одного HTTP-запроса.
+    """
+    __slots__ = ("sql_count", "sql_seconds", "redis_count", "redis_seconds")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.redis_count = 0
+        self.redis_seconds = 0.0
+
+
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def observe_request(stats: RequestStats, route: str):
+    REQUEST_SQL_STATEMENTS.labels(route).observe(stats.sql_count)
+    REQUEST_SQL_SECONDS.labels(route).observe(stats.sql_seconds)
+    REQUEST_REDIS_COMMANDS.labels(route).observe(stats.redis_count)
+    REQUEST_REDIS_SECONDS.labels(route).observe(stats.redis_seconds)
+
+
+def record_redis(command: str, seconds: float):
+    REDIS_COMMANDS.labels(command).inc()
+    stats = request_stats.get()
+    if stats is not None:
+        stats.redis_count += 1
+        stats.redis_seconds += seconds
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start"].pop()
+    stats = request_stats.get()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_seconds += time.perf_counter() - started
+
+
+def _handle_error(context):
+    if context.connection is not None and context.connection.info.get("query_start"):
+        context.connection.info["query_start"].pop()
+
+
+def instrument_engine(engine):
+    """
+    Подписаться на события движка SQLAlchemy и учитывать каждый statement в RequestStats.
+    :param engine: синхронный Engine (для AsyncEngine — engine.sync_engine)
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
@@ -1,18 +1,84 @@
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
 from app.core.utils import generate_trace_id
+from app.core.log import current_trace_id
+from app.core.metrics import HTTP_REQUEST_SECONDS, HTTP_RESPONSES, RequestStats, observe_request, request_stats
 import logging
-from datetime import datetime
+import time
 
-class TraceIDMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        trace_id = request.headers.get("X-Trace-Id")
+logger = logging.getLogger(__name__)
+
+TRACE_HEADER = b"x-trace-id"
+
+
+class TraceIDMiddleware:
+    """
+    Чистый ASGI-middleware трассировки: берёт X-Trace-Id из запроса (или генерирует),
+    кладёт его в request.state, contextvar для логов и заголовок ответа.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace_id = None
+        for name, value in scope["headers"]:
+            if name == TRACE_HEADER:
+                trace_id = value.decode("latin-1")
+                break
         if not trace_id:
             trace_id = generate_trace_id()
-        request.state.trace_id = trace_id
-        # Логирование trace_id, endpoint (path), и дата
-        log_date = datetime.utcnow().isoformat()
-        endpoint = request.url.path
-        logging.info(f"[{log_date}] endpoint={endpoint} trace_id={trace_id} method={request.method}")
-        response = await call_next(request)
-        return response
+        # request.state читает scope["state"]
+        scope.setdefault("state", {})["trace_id"] = trace_id
+        token = current_trace_id.set(trace_id)
+        logger.info("request", extra={"endpoint": scope["path"], "method": scope["method"]})
+        encoded = trace_id.encode("latin-1")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = [(name, value) for name, value in message.get("headers", []) if name != TRACE_HEADER]
+                headers.append((TRACE_HEADER, encoded))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_trace_id.reset(token)
+
+
+class MetricsMiddleware:
+    """
+    Чистый ASGI-middleware метрик: латентность и статусы по шаблону маршрута,
+    число и время SQL-запросов и обращений к Redis на запрос.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            request_stats.reset(token)
+            route = scope.get("route")
+            # Шаблон маршрута вместо сырого пути — ограниченная кардинальность меток
+            route = route.path if route is not None else "<unmatched>"
+            method = scope["method"]
+            HTTP_REQUEST_SECONDS.labels(method, route).observe(elapsed)
+            HTTP_RESPONSES.labels(method, route, str(status)).inc()
+            observe_request(stats, route)
@@ -1,13 +1,44 @@
+import time
+
 import redis.asyncio as redis
 from app.core.config import settings
+from app.core.metrics import record_redis
+
+
+class InstrumentedRedis(redis.Redis):
+    """
+    Клиент Redis, учитывающий каждый round trip (команду или pipeline) в метриках запроса.
+    """
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            record_redis(str(args[0]).upper(), time.perf_counter() - started)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None):
+        pipe = super().pipeline(transaction, shard_hint)
+        execute = pipe.execute
+
+        async def timed_execute(raise_on_error: bool = True):
+            started = time.perf_counter()
+            try:
+                return await execute(raise_on_error)
+            finally:
+                record_redis("PIPELINE", time.perf_counter() - started)
+
+        pipe.execute = timed_execute
+        return pipe
+
 
 class RedisClient:
     def __init__(self):
         self._redis = None
+        self._scripts = {}
 
     async def get_redis(self):
         if not self._redis:
-            self._redis = await redis.from_url(
+            self._redis = await InstrumentedRedis.from_url(
                 f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}",
                 password=settings.REDIS_PASSWORD or None,
                 encoding="utf-8",
@@ -15,4 +46,16 @@ class RedisClient:
             )
         return self._redis
 
+    async def get_script(self, source: str):
+        """
+        Зарегистрировать Lua-скрипт один раз на процесс.
+        Вызовы идут через EVALSHA; при NOSCRIPT (рестарт Redis) скрипт перезагружается автоматически.
+        """
+        script = self._scripts.get(source)
+        if script is None:
+            conn = await self.get_redis()
+            script = conn.register_script(source)
+            self._scripts[source] = script
+        return script
+
 redis_client = RedisClient()
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
+import redis.asyncio as redis
+
+from app.core.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.core.config import settings
+from app.core.redis import redis_client
+from app.core.metrics import SVC_USERS_SECONDS
+
+
+class UsersUnavailableError(Exception):
+    """
+    svc-users не дал однозначного ответа: сбой запроса, 5xx, превышение бюджета
+    задержки или отказ circuit breaker. Факт существования пользователя неизвестен.
+    """
+
+
+class UserExistenceCache:
+    """
+    Кеш факта существования пользователя: LRU в памяти процесса
+    и опционально общий слой в Redis.
+    Положительные ответы живут USER_CACHE_TTL, отрицательные — USER_CACHE_NEGATIVE_TTL.
+    """
+    def __init__(self, max_size: int, ttl: int, negative_ttl: int, use_redis: bool):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.use_redis = use_redis
+        self._entries: "OrderedDict[str, tuple[bool, float]]" = OrderedDict()
+
+    @staticmethod
+    def _redis_key(user_id: str) -> str:
+        return f"user_exists:{user_id}"
+
+    def _get_local(self, user_id: str) -> Optional[bool]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        exists, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return exists
+
+    def _set_local(self, user_id: str, exists: bool, ttl: int):
+        self._entries[user_id] = (exists, time.monotonic() + ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get(self, user_id: str) -> Optional[bool]:
+        """
+        :return: True/False из кеша или None, если записи нет
+        """
+        exists = self._get_local(user_id)
+        if exists is not None or not self.use_redis:
+            return exists
+        try:
+            conn = await redis_client.get_redis()
+            value = await conn.get(self._redis_key(user_id))
+        except redis.RedisError:
+            return None
+        if value is None:
+            return None
+        exists = value == "1"
+        self._set_local(user_id, exists, self.ttl if exists else self.negative_ttl)
+        return exists
+
+    async def set(self, user_id: str, exists: bool):
+        ttl = self.ttl if exists else self.negative_ttl
+        self._set_local(user_id, exists, ttl)
+        if not self.use_redis:
+            return
+        try:
+            conn = await redis_client.get_redis()
+            await conn.set(self._redis_key(user_id), "1" if exists else "0", ex=ttl)
+        except redis.RedisError:
+            pass
+
+
+class UsersClient:
+    """
+    Долгоживущий клиент svc-users: пул соединений с keep-alive и HTTP/2
+    за кешем существования пользователей и circuit breaker (SVC_USERS_BREAKER_ENABLED).
+    Открывается и закрывается в lifespan приложения.
+    """
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.breaker: Optional[CircuitBreaker] = None
+        if settings.SVC_USERS_BREAKER_ENABLED:
+            self.breaker = CircuitBreaker(
+                "svc-users",
+                failure_threshold=settings.SVC_USERS_BREAKER_FAILURE_THRESHOLD,
+                reset_timeout=settings.SVC_USERS_BREAKER_RESET_TIMEOUT,
+                latency_budget=settings.SVC_USERS_LATENCY_BUDGET,
+                max_concurrency=settings.SVC_USERS_MAX_CONCURRENCY,
+                half_open_calls=settings.SVC_USERS_BREAKER_HALF_OPEN_CALLS,
+            )
+        self.cache = UserExistenceCache(
+            max_size=settings.USER_CACHE_MAX_SIZE,
+            ttl=settings.USER_CACHE_TTL,
+            negative_ttl=settings.USER_CACHE_NEGATIVE_TTL,
+            use_redis=settings.USER_CACHE_REDIS_ENABLED,
+        )
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=settings.SVC_USERS_URL,
+                http2=settings.SVC_USERS_HTTP2,
+                timeout=settings.SVC_USERS_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=settings.SVC_USERS_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.SVC_USERS_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=settings.SVC_USERS_KEEPALIVE_EXPIRY,
+                ),
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            await self.start()
+        return self._client
+
+    async def user_exists(self, user_id: str) -> bool:
+        """
+        Проверить существование пользователя: сначала кеш, затем svc-users через breaker.
+        Кешируются только однозначные ответы (200 и 404); сбои запроса не кешируются.
+        :raises UsersUnavailableError: svc-users недоступен, отвечает 5xx или медленнее бюджета
+        """
+        cached = await self.cache.get(user_id)
+        if cached is not None:
+            return cached
+        client = await self.get_client()
+        started = time.perf_counter()
+        try:
+            if self.breaker is None:
+                response = await client.get(f"/users/{user_id}")
+            else:
+                response = await self.breaker.call(
+                    lambda: client.get(f"/users/{user_id}"), is_failure=lambda result: result.status_code >= 500
+                )
+        except CircuitOpenError as exc:
+            raise UsersUnavailableError(str(exc)) from exc
+        except (httpx.HTTPError, asyncio.TimeoutError) as exc:
+            SVC_USERS_SECONDS.labels("error").observe(time.perf_counter() - started)
+            logging.warning(f"Error verifying user existence: user_id={user_id}, exc={exc!r}")
+            raise UsersUnavailableError(repr(exc)) from exc
+        SVC_USERS_SECONDS.labels(str(response.status_code)).observe(time.perf_counter() - started)
+        if response.status_code == 200:
+            await self.cache.set(user_id, True)
+            return True
+        if response.status_code == 404:
+            await self.cache.set(user_id, False)
+        if response.status_code >= 500:
+            raise UsersUnavailableError(f"status_code={response.status_code}")
+        return False
+
+
+users_client = UsersClient()
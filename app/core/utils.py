@@ -1,8 +1,31 @@
 import uuid as uuid_lib
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import Optional
 
 def generate_trace_id() -> str:
     return uuid_lib.uuid4().hex
 
 def get_timestamp() -> str:
     return datetime.utcnow().isoformat() + "Z"
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Время без часового пояса из запроса считается UTC, а не локальным временем сервера или сессии БД.
+    """
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def is_uuid(value: str) -> bool:
+    """
+    Только каноническая запись (str(UUID(value)) == value): строчные буквы с дефисами,
+    без urn:, фигурных скобок и слитной формы. Иначе один пользователь получил бы
+    несколько ключей в кешах Redis и svc-users, хотя в БД это один uuid.
+    """
+    try:
+        return str(uuid_lib.UUID(value)) == value
+    except (ValueError, TypeError, AttributeError):
+        return False
@@ -1,5 +1,6 @@
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, String, Integer, Enum as SqlEnum
+from sqlalchemy import Column, String, Integer, BigInteger, DateTime, Index, CheckConstraint, Enum as SqlEnum
+from sqlalchemy.dialects.postgresql import UUID
 from enum import Enum
 
 Base = declarative_base()
@@ -10,16 +11,124 @@ class WalletOperationType(str, Enum):
 
 class Wallet(Base):
     __tablename__ = "wallets"
-    id = Column(String, primary_key=True, index=True)
-    userId = Column(String, unique=True, nullable=False, index=True)
+    # Идентификаторы — нативный uuid; в Python остаются строками (as_uuid=False)
+    id = Column(UUID(as_uuid=False), primary_key=True)
+    userId = Column(UUID(as_uuid=False), unique=True, nullable=False, index=True)
+    # Материализованный баланс: обновляется в той же транзакции, что и вставка операции
+    balance = Column(BigInteger, nullable=False, default=0, server_default="0")
+    # Версия баланса: увеличивается при каждом изменении, защищает кеш от устаревших записей
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
+    # Число суббалансов (wallet_balance_shards) для «горячих» кошельков; 1 — обычный кошелёк.
+    # Полный баланс всегда равен balance + сумма суббалансов.
+    shards = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __table_args__ = (
+        CheckConstraint("balance >= 0", name="ck_wallets_balance_non_negative"),
+    )
+
+class WalletBalanceShard(Base):
+    """
+    Суббаланс шардированного кошелька: записи распределяются по строкам,
+    поэтому конкурентные операции по одному кошельку не ждут одну блокировку.
+    """
+    __tablename__ = "wallet_balance_shards"
+    walletId = Column(UUID(as_uuid=False), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    balance = Column(BigInteger, nullable=False, default=0, server_default="0")
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        CheckConstraint("balance >= 0", name="ck_wallet_balance_shards_balance_non_negative"),
+    )
 
 class WalletOperation(Base):
     __tablename__ = "wallet_operations"
-    id = Column(String, primary_key=True, index=True)
-    walletId = Column(String, nullable=False, index=True)
-    amount = Column(Integer, nullable=False)
+    # Таблица секционирована помесячно по createdAt, поэтому он входит в первичный ключ
+    id = Column(UUID(as_uuid=False), primary_key=True)
+    walletId = Column(UUID(as_uuid=False), nullable=False)
+    amount = Column(BigInteger, nullable=False)
+    type = Column(SqlEnum(WalletOperationType), nullable=False)
+    reason = Column(String, nullable=False)
+    # Глобальная уникальность обеспечивается таблицей wallet_operation_keys
+    externalOperationId = Column(String, nullable=False)
+    traceId = Column(String, nullable=False)
+    createdAt = Column(DateTime(timezone=True), primary_key=True)
+
+    __table_args__ = (
+        # Keyset-пагинация истории кошелька: WHERE walletId = ? AND (createdAt, id) < (?, ?)
+        Index("ix_wallet_operations_walletId_createdAt_id", "walletId", "createdAt", "id"),
+        {"postgresql_partition_by": 'RANGE ("createdAt")'},
+    )
+
+class WalletOperationArchive(Base):
+    """
+    Операции старше окна хранения, перенесённые из wallet_operations задачей compact-ledger.
+    """
+    __tablename__ = "wallet_operations_archive"
+    id = Column(UUID(as_uuid=False), primary_key=True)
+    walletId = Column(UUID(as_uuid=False), nullable=False)
+    amount = Column(BigInteger, nullable=False)
     type = Column(SqlEnum(WalletOperationType), nullable=False)
     reason = Column(String, nullable=False)
-    externalOperationId = Column(String, unique=True, nullable=False)
+    externalOperationId = Column(String, nullable=False)
     traceId = Column(String, nullable=False)
-    createdAt = Column(String, nullable=False)
+    createdAt = Column(DateTime(timezone=True), primary_key=True)
+
+    __table_args__ = (
+        Index("ix_wallet_operations_archive_walletId_createdAt_id", "walletId", "createdAt", "id"),
+    )
+
+class WalletBalanceCheckpoint(Base):
+    """
+    Баланс кошелька по истории операций на момент cutoff (не включительно).
+    Баланс по истории = последняя контрольная точка + сумма операций с createdAt >= её cutoff.
+    """
+    __tablename__ = "wallet_balance_checkpoints"
+    walletId = Column(UUID(as_uuid=False), primary_key=True)
+    cutoff = Column(DateTime(timezone=True), primary_key=True)
+    balance = Column(BigInteger, nullable=False)
+    createdAt = Column(DateTime(timezone=True), nullable=False)
+
+class WalletOperationKey(Base):
+    """
+    Ключи идемпотентности: externalOperationId -> операция.
+    Уникальный индекс на секционированной таблице обязан включать ключ секционирования,
+    поэтому глобальная проверка дублей вынесена в эту небольшую таблицу.
+    """
+    __tablename__ = "wallet_operation_keys"
+    externalOperationId = Column(String, primary_key=True)
+    operationId = Column(UUID(as_uuid=False), nullable=False)
+    createdAt = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        # Удаление ключей старше окна хранения пачками (compact-ledger --purge-keys)
+        Index("ix_wallet_operation_keys_createdAt", "createdAt"),
+    )
+
+class WalletOutbox(Base):
+    """
+    Транзакционный outbox событий изменения баланса: строка пишется в той же
+    транзакции, что и операция, и удаляется relay после публикации в Redis Stream.
+    """
+    __tablename__ = "wallet_outbox"
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    walletId = Column(UUID(as_uuid=False), nullable=False)
+    userId = Column(UUID(as_uuid=False), nullable=False)
+    operationId = Column(UUID(as_uuid=False), nullable=False)
+    delta = Column(BigInteger, nullable=False)
+    balance = Column(BigInteger, nullable=False)
+    version = Column(BigInteger, nullable=False)
+    traceId = Column(String, nullable=False)
+    createdAt = Column(DateTime(timezone=True), nullable=False)
+    # Номер суббаланса для шардированного кошелька: balance/version относятся к этой строке;
+    # None — к строке wallets
+    shard = Column(Integer, nullable=True)
+
+class WalletOutboxRelay(Base):
+    """
+    Контрольная точка relay: последний опубликованный id outbox и время публикации.
+    """
+    __tablename__ = "wallet_outbox_relay"
+    name = Column(String, primary_key=True)
+    lastId = Column(BigInteger, nullable=False)
+    updatedAt = Column(DateTime(timezone=True), nullable=False)
@@ -0,0 +1,91 @@
+"""
+Помесячные партиции wallet_operations (RANGE по "createdAt").
+
+Функции возвращают SQL и не зависят от способа выполнения: их используют
+и миграция Alembic, и команда обслуживания ``python -m app.cli maintain-partitions``.
+"""
+import re
+from datetime import date, datetime
+from typing import List, Optional
+
+PARENT_TABLE = "wallet_operations"
+PARTITION_NAME_RE = re.compile(r"^wallet_operations_y(\d{4})m(\d{2})$")
+
+LIST_PARTITIONS_SQL = """
+SELECT child.relname
+FROM pg_inherits
+JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+WHERE parent.relname = 'wallet_operations'
+ORDER BY child.relname
+"""
+
+# Самая поздняя контрольная точка балансов (compact-ledger пишет их для всех кошельков
+# до переноса операций в архив)
+LATEST_CHECKPOINT_SQL = 'SELECT max(cutoff) FROM wallet_balance_checkpoints'
+
+
+def month_start(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    match = PARTITION_NAME_RE.match(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def months_between(first: date, last: date) -> List[date]:
+    """
+    :return: начала месяцев от first до last включительно
+    """
+    months = []
+    current = first
+    while current <= last:
+        months.append(current)
+        current = add_months(current, 1)
+    return months
+
+
+def create_partition_sql(month: date, parent: str = PARENT_TABLE, suffix: str = "") -> str:
+    """
+    Границы партиции — полночь UTC: без явного смещения литерал timestamptz
+    трактовался бы в часовом поясе сессии.
+    :param suffix: добавляется к имени партиции (партиции теневой таблицы при миграции)
+    """
+    name = partition_name(month) + suffix
+    return (
+        f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {parent} '
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+    )
+
+
+def partition_has_rows_sql(name: str) -> str:
+    return f"SELECT EXISTS (SELECT 1 FROM {name})"
+
+
+def detach_partition_sql(name: str, concurrently: bool = True) -> str:
+    return f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}{' CONCURRENTLY' if concurrently else ''}"
+
+
+def partitions_to_detach(existing: List[str], today: date, retain_months: int) -> List[str]:
+    """
+    :return: партиции, целиком лежащие раньше окна хранения (retain_months полных месяцев до текущего)
+    """
+    cutoff = add_months(month_start(today), -retain_months)
+    names = []
+    for name in existing:
+        month = partition_month(name)
+        if month is not None and add_months(month, 1) <= cutoff:
+            names.append(name)
+    return names
@@ -1,13 +1,61 @@
-import os
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.metrics import instrument_engine, DB_SESSIONS
 
 DATABASE_URL = settings.DATABASE_URL
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True, future=True)
-SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+PRIMARY = "primary"
+REPLICA = "replica"
+
+
+def _create_engine(url: str, statement_timeout: float = 0):
+    connect_args = {"prepare_threshold": settings.DB_PREPARE_THRESHOLD}
+    if statement_timeout > 0:
+        connect_args["options"] = f"-c statement_timeout={int(statement_timeout * 1000)}"
+    engine = create_async_engine(
+        url,
+        echo=settings.DB_ECHO,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        query_cache_size=settings.DB_QUERY_CACHE_SIZE,
+        connect_args=connect_args,
+    )
+    instrument_engine(engine.sync_engine)
+    return engine
+
+
+# statement_timeout на primary ограничивает, насколько позже своего createdAt фиксируется операция
+# (время берётся до ожидания блокировки кошелька): на этом держится запас LEDGER_CHECKPOINT_SAFETY_MARGIN
+engine = _create_engine(settings.DATABASE_URL, settings.DB_STATEMENT_TIMEOUT)
+SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, info={"db_role": PRIMARY})
+
+# Без DATABASE_REPLICA_URL чтения идут в primary, сессия помечается соответственно
+replica_engine = _create_engine(settings.DATABASE_REPLICA_URL) if settings.DATABASE_REPLICA_URL else engine
+ReadSessionLocal = sessionmaker(
+    replica_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    info={"db_role": REPLICA if settings.DATABASE_REPLICA_URL else PRIMARY},
+)
+
 
 async def get_db():
+    """
+    Сессия primary: движения средств и всё, что пишет.
+    """
     async with SessionLocal() as session:
+        DB_SESSIONS.labels(session.info["db_role"]).inc()
+        yield session
+
+
+async def get_read_db():
+    """
+    Сессия для запросов только на чтение (реплика, если настроена).
+    """
+    async with ReadSessionLocal() as session:
+        DB_SESSIONS.labels(session.info["db_role"]).inc()
         yield session
@@ -1,11 +1,57 @@
 
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from prometheus_client import make_asgi_app
 from app.api.wallets import router as wallets_router
 from app.api.health import router as health_router
-from app.core.middleware import TraceIDMiddleware
+from app.core.middleware import TraceIDMiddleware, MetricsMiddleware
+from app.core.users import UsersUnavailableError, users_client
+from app.core.health import dependency_prober
+from app.core.log import setup_logging
+from app.core.config import settings
+from app.codes import Codes
+from app.responses import error_response
+from app.service.outbox_relay import outbox_relay
+from app.service.balance_reconciler import balance_reconciler
 
-app = FastAPI(title="svc-wallet", version="1.0.0")
+log_listener = setup_logging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await users_client.start()
+    dependency_prober.start()
+    if settings.OUTBOX_RELAY_ENABLED:
+        outbox_relay.start()
+    if settings.BALANCE_WARMUP_ENABLED or settings.BALANCE_RECONCILER_ENABLED:
+        balance_reconciler.start()
+    try:
+        yield
+    finally:
+        await balance_reconciler.stop()
+        await outbox_relay.stop()
+        await dependency_prober.stop()
+        await users_client.close()
+        log_listener.stop()
+
+
+app = FastAPI(title="svc-wallet", version="1.0.0", lifespan=lifespan)
 app.add_middleware(TraceIDMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(UsersUnavailableError)
+async def users_unavailable_handler(request: Request, exc: UsersUnavailableError):
+    # Пользователь не проверен и degraded-режим запрос не пропустил: быстрый 503 вместо ожидания svc-users
+    trace_id = getattr(request.state, 'trace_id', None)
+    return error_response(
+        status_code=503,
+        message="svc-users is unavailable, try again later",
+        code=Codes.USERS_SERVICE_UNAVAILABLE,
+        trace_id=trace_id,
+    )
+
 
 app.include_router(wallets_router)
 app.include_router(health_router)
+app.mount("/metrics", make_asgi_app())
@@ -0,0 +1,120 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import func, text
+from app.db.models import WalletBalanceCheckpoint
+from datetime import datetime
+from typing import Optional
+
+FIRST_WALLET_ID = "00000000-0000-0000-0000-000000000000"
+
+# Контрольные точки для пачки кошельков (keyset по id): предыдущая точка + операции
+# между ней и cutoff (в основной и архивной таблицах). Операции раньше предыдущей точки не читаются.
+CHECKPOINT_CHUNK_SQL = text("""
+WITH batch AS (
+    SELECT id FROM wallets WHERE id > :after ORDER BY id LIMIT :limit
+), previous AS (
+    SELECT DISTINCT ON ("walletId") "walletId", cutoff, balance
+    FROM wallet_balance_checkpoints
+    WHERE "walletId" IN (SELECT id FROM batch) AND cutoff < :cutoff
+    ORDER BY "walletId", cutoff DESC
+), inserted AS (
+    INSERT INTO wallet_balance_checkpoints ("walletId", cutoff, balance, "createdAt")
+    SELECT batch.id, :cutoff,
+           COALESCE(previous.balance, 0) + COALESCE((
+               SELECT SUM(operation.amount) FROM wallet_operations operation
+               WHERE operation."walletId" = batch.id
+                 AND operation."createdAt" >= COALESCE(previous.cutoff, '-infinity')
+                 AND operation."createdAt" < :cutoff
+           ), 0)
+           + COALESCE((
+               SELECT SUM(archived.amount) FROM wallet_operations_archive archived
+               WHERE archived."walletId" = batch.id
+                 AND archived."createdAt" >= COALESCE(previous.cutoff, '-infinity')
+                 AND archived."createdAt" < :cutoff
+           ), 0),
+           :created_at
+    FROM batch LEFT JOIN previous ON previous."walletId" = batch.id
+    ON CONFLICT DO NOTHING
+)
+SELECT CAST(max(id) AS text) FROM batch
+""")
+
+# Перенос пачки операций старше cutoff в архив одним statement: удаление и вставка атомарны
+ARCHIVE_CHUNK_SQL = text("""
+WITH batch AS (
+    SELECT id, "createdAt" FROM wallet_operations WHERE "createdAt" < :cutoff LIMIT :limit
+), moved AS (
+    DELETE FROM wallet_operations operation
+    USING batch
+    WHERE operation.id = batch.id AND operation."createdAt" = batch."createdAt"
+    RETURNING operation.id, operation."walletId", operation.amount, operation.type, operation.reason,
+              operation."externalOperationId", operation."traceId", operation."createdAt"
+), archived AS (
+    INSERT INTO wallet_operations_archive
+        (id, "walletId", amount, type, reason, "externalOperationId", "traceId", "createdAt")
+    SELECT * FROM moved
+)
+SELECT count(*) FROM moved
+""")
+
+PURGE_KEYS_CHUNK_SQL = text("""
+WITH batch AS (
+    SELECT "externalOperationId" FROM wallet_operation_keys WHERE "createdAt" < :cutoff LIMIT :limit
+)
+DELETE FROM wallet_operation_keys key
+USING batch
+WHERE key."externalOperationId" = batch."externalOperationId"
+""")
+
+
+class LedgerRepository:
+    """
+    Репозиторий обслуживания журнала операций: контрольные точки балансов,
+    архивирование старых операций и ключей идемпотентности. Каждый метод
+    обрабатывает одну пачку в своей транзакции, поэтому задачу можно прервать и продолжить.
+    """
+    def __init__(self, db: AsyncSession):
+        """
+        :param db: асинхронная сессия SQLAlchemy
+        """
+        self.db = db
+
+    async def get_checkpoint_resume_point(self, cutoff: datetime) -> str:
+        """
+        :return: id кошелька, после которого продолжать построение контрольных точек на cutoff
+        """
+        result = await self.db.execute(
+            select(func.max(WalletBalanceCheckpoint.walletId)).where(WalletBalanceCheckpoint.cutoff == cutoff)
+        )
+        return result.scalar_one_or_none() or FIRST_WALLET_ID
+
+    async def checkpoint_chunk(self, cutoff: datetime, after: str, limit: int, created_at: datetime) -> Optional[str]:
+        """
+        Записать контрольные точки на cutoff для следующих limit кошельков после after.
+        :return: id последнего обработанного кошелька или None, если кошельки кончились
+        """
+        result = await self.db.execute(
+            CHECKPOINT_CHUNK_SQL, {"cutoff": cutoff, "after": after, "limit": limit, "created_at": created_at}
+        )
+        last = result.scalar_one_or_none()
+        await self.db.commit()
+        return last
+
+    async def archive_chunk(self, cutoff: datetime, limit: int) -> int:
+        """
+        Перенести до limit операций с createdAt < cutoff в wallet_operations_archive.
+        :return: число перенесённых операций
+        """
+        result = await self.db.execute(ARCHIVE_CHUNK_SQL, {"cutoff": cutoff, "limit": limit})
+        moved = result.scalar_one()
+        await self.db.commit()
+        return moved
+
+    async def purge_keys_chunk(self, cutoff: datetime, limit: int) -> int:
+        """
+        Удалить до limit ключей идемпотентности с createdAt < cutoff.
+        :return: число удалённых ключей
+        """
+        result = await self.db.execute(PURGE_KEYS_CHUNK_SQL, {"cutoff": cutoff, "limit": limit})
+        await self.db.commit()
+        return result.rowcount
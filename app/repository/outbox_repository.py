@@ -0,0 +1,62 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.db.models import WalletOutbox, WalletOutboxRelay
+from app.core.utils import utc_now
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+
+class OutboxRepository:
+    """
+    Репозиторий outbox событий изменения баланса.
+    """
+    def __init__(self, db: AsyncSession):
+        """
+        :param db: асинхронная сессия SQLAlchemy
+        """
+        self.db = db
+
+    async def fetch_batch(self, limit: int) -> List[WalletOutbox]:
+        """
+        Взять пачку неопубликованных событий по возрастанию id и заблокировать их
+        до конца транзакции (SKIP LOCKED: несколько relay не мешают друг другу).
+        :return: список WalletOutbox
+        """
+        result = await self.db.execute(
+            select(WalletOutbox).order_by(WalletOutbox.id).limit(limit).with_for_update(skip_locked=True)
+        )
+        return list(result.scalars().all())
+
+    async def acknowledge(self, relay_name: str, ids: List[int]):
+        """
+        Удалить опубликованные события и сдвинуть контрольную точку relay; фиксирует транзакцию.
+        """
+        await self.db.execute(delete(WalletOutbox).where(WalletOutbox.id.in_(ids)))
+        statement = pg_insert(WalletOutboxRelay).values(name=relay_name, lastId=max(ids), updatedAt=utc_now())
+        await self.db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[WalletOutboxRelay.name],
+                set_={
+                    "lastId": func.greatest(WalletOutboxRelay.lastId, statement.excluded.lastId),
+                    "updatedAt": statement.excluded.updatedAt,
+                },
+            )
+        )
+        await self.db.commit()
+
+    async def get_lag(self) -> Tuple[int, Optional[datetime]]:
+        """
+        Отставание по краям первичного ключа: два чтения индекса вместо прохода по всему outbox,
+        который растёт именно тогда, когда relay отстаёт. Число событий — оценка по диапазону id
+        (сверху: id откаченных транзакций не занимают строк); createdAt у событий растёт вместе с id.
+        :return: (оценка числа неопубликованных событий, время создания самого старого из них)
+        """
+        oldest = (
+            await self.db.execute(select(WalletOutbox.id, WalletOutbox.createdAt).order_by(WalletOutbox.id).limit(1))
+        ).one_or_none()
+        if oldest is None:
+            return 0, None
+        newest = (await self.db.execute(select(func.max(WalletOutbox.id)))).scalar_one()
+        return newest - oldest.id + 1, oldest.createdAt
@@ -1,9 +1,277 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+import random
+from sqlalchemy import delete, func, insert, or_, update, text, tuple_
 from sqlalchemy.exc import IntegrityError
-from app.db.models import Wallet, WalletOperation
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.db.models import (
+    Wallet, WalletBalanceCheckpoint, WalletBalanceShard, WalletOperation, WalletOperationKey, WalletOperationType,
+    WalletOutbox,
+)
+from app.core.metrics import SHARDED_LOCKED_PATH
+from app.core.utils import utc_now
 from uuid import uuid4
-from typing import Optional
+from datetime import datetime
+from typing import AsyncIterator, List, NamedTuple, Optional, Sequence, Tuple
+
+# Один statement на движение средств: проверка идемпотентности, защита от ухода
+# в минус, изменение баланса, вставка операции и возврат нового баланса.
+# UPDATE берёт блокировку строки кошелька, поэтому условие balance + amount >= 0
+# перепроверяется после ожидания конкурентной записи. Идемпотентность проверяется
+# по wallet_operation_keys; параллельный дубль, не видимый в снимке NOT EXISTS,
+# ловит первичный ключ этой таблицы: statement целиком откатывается, баланс не меняется.
+# Событие для outbox пишется тем же statement, то есть в той же транзакции.
+# Параметры в списках INSERT ... SELECT приводятся к uuid явно: там их тип не выводится из столбца.
+# Шардированные кошельки (shards > 1) этот statement не трогает: их проводит
+# APPLY_SHARDED_OPERATION_SQL.
+APPLY_OPERATION_SQL = text("""
+WITH target AS (
+    SELECT id, shards FROM wallets WHERE "userId" = :user_id
+), moved AS (
+    UPDATE wallets SET balance = wallets.balance + :amount, version = wallets.version + 1
+    WHERE wallets."userId" = :user_id
+      AND wallets.shards = 1
+      AND wallets.balance + :amount >= 0
+      AND NOT EXISTS (
+          SELECT 1 FROM wallet_operation_keys WHERE "externalOperationId" = :external_id
+      )
+    RETURNING wallets.id, wallets.balance, wallets.version
+), claimed AS (
+    INSERT INTO wallet_operation_keys ("externalOperationId", "operationId", "createdAt")
+    SELECT :external_id, CAST(:operation_id AS uuid), :created_at FROM moved
+), inserted AS (
+    INSERT INTO wallet_operations
+        (id, "walletId", amount, type, reason, "externalOperationId", "traceId", "createdAt")
+    SELECT CAST(:operation_id AS uuid), moved.id, :amount, CAST(:type AS walletoperationtype),
+           :reason, :external_id, :trace_id, :created_at
+    FROM moved
+    RETURNING "walletId"
+), outboxed AS (
+    INSERT INTO wallet_outbox
+        ("walletId", "userId", "operationId", delta, balance, version, "traceId", "createdAt")
+    SELECT moved.id, CAST(:user_id AS uuid), CAST(:operation_id AS uuid), :amount, moved.balance, moved.version,
+           :trace_id, :created_at
+    FROM moved
+)
+SELECT
+    CAST((SELECT id FROM target) AS text) AS wallet_id,
+    (SELECT balance FROM moved) AS balance,
+    EXISTS (SELECT 1 FROM inserted) AS applied,
+    EXISTS (
+        SELECT 1 FROM wallet_operation_keys WHERE "externalOperationId" = :external_id
+    ) AS duplicate,
+    (SELECT version FROM moved) AS version,
+    (SELECT shards FROM target) AS shards
+""")
+
+# Операция по шардированному кошельку: берётся первый незаблокированный суббаланс,
+# начиная со случайного (:start), который покрывает сумму; занятые строки пропускаются
+# (SKIP LOCKED), поэтому конкурентные записи расходятся по разным строкам.
+# Строка wallets не блокируется. Если подходящего свободного суббаланса нет,
+# ничего не пишется — операцию проводит _apply_across_shards.
+APPLY_SHARDED_OPERATION_SQL = text("""
+WITH target AS (
+    SELECT id, balance FROM wallets WHERE "userId" = :user_id
+), picked AS (
+    SELECT "walletId", shard FROM wallet_balance_shards
+    WHERE "walletId" = (SELECT id FROM target)
+      AND balance + :amount >= 0
+      AND NOT EXISTS (
+          SELECT 1 FROM wallet_operation_keys WHERE "externalOperationId" = :external_id
+      )
+    ORDER BY (shard + :shards - :start) % :shards
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+), moved AS (
+    UPDATE wallet_balance_shards
+    SET balance = wallet_balance_shards.balance + :amount, version = wallet_balance_shards.version + 1
+    FROM picked
+    WHERE wallet_balance_shards."walletId" = picked."walletId"
+      AND wallet_balance_shards.shard = picked.shard
+      AND wallet_balance_shards.balance + :amount >= 0
+    RETURNING wallet_balance_shards."walletId" AS id, wallet_balance_shards.shard,
+              wallet_balance_shards.balance, wallet_balance_shards.version
+), claimed AS (
+    INSERT INTO wallet_operation_keys ("externalOperationId", "operationId", "createdAt")
+    SELECT :external_id, CAST(:operation_id AS uuid), :created_at FROM moved
+), inserted AS (
+    INSERT INTO wallet_operations
+        (id, "walletId", amount, type, reason, "externalOperationId", "traceId", "createdAt")
+    SELECT CAST(:operation_id AS uuid), moved.id, :amount, CAST(:type AS walletoperationtype),
+           :reason, :external_id, :trace_id, :created_at
+    FROM moved
+    RETURNING "walletId"
+), outboxed AS (
+    INSERT INTO wallet_outbox
+        ("walletId", "userId", "operationId", delta, balance, version, "traceId", "createdAt", shard)
+    SELECT moved.id, CAST(:user_id AS uuid), CAST(:operation_id AS uuid), :amount, moved.balance, moved.version,
+           :trace_id, :created_at, moved.shard
+    FROM moved
+)
+SELECT
+    CAST((SELECT id FROM target) AS text) AS wallet_id,
+    (SELECT balance FROM moved) + (SELECT balance FROM target) + (
+        SELECT COALESCE(SUM(balance), 0) FROM wallet_balance_shards
+        WHERE "walletId" = (SELECT id FROM target) AND shard <> (SELECT shard FROM moved)
+    ) AS balance,
+    EXISTS (SELECT 1 FROM inserted) AS applied,
+    EXISTS (
+        SELECT 1 FROM wallet_operation_keys WHERE "externalOperationId" = :external_id
+    ) AS duplicate
+""")
+
+
+# Баланс кошельков на момент :at (включительно): последняя контрольная точка с cutoff <= :at
+# плюс операции из [cutoff, :at] в основной и архивной таблицах. Обе читаются по индексу
+# (walletId, createdAt, id), поэтому объём чтения ограничен интервалом между контрольными
+# точками, а не возрастом кошелька.
+BALANCES_AT_SQL = text("""
+SELECT
+    CAST(wallet.id AS text) AS wallet_id,
+    COALESCE(checkpoint.balance, 0)
+    + COALESCE((
+        SELECT SUM(operation.amount) FROM wallet_operations operation
+        WHERE operation."walletId" = wallet.id
+          AND operation."createdAt" >= COALESCE(checkpoint.cutoff, '-infinity')
+          AND operation."createdAt" <= :at
+    ), 0)
+    + COALESCE((
+        SELECT SUM(archived.amount) FROM wallet_operations_archive archived
+        WHERE archived."walletId" = wallet.id
+          AND archived."createdAt" >= COALESCE(checkpoint.cutoff, '-infinity')
+          AND archived."createdAt" <= :at
+    ), 0) AS balance
+FROM wallets wallet
+LEFT JOIN LATERAL (
+    SELECT cutoff, balance FROM wallet_balance_checkpoints
+    WHERE "walletId" = wallet.id AND cutoff <= :at
+    ORDER BY cutoff DESC
+    LIMIT 1
+) checkpoint ON true
+WHERE wallet.id = ANY(CAST(:wallet_ids AS uuid[]))
+""")
+
+
+def _is_unique_violation(exc: IntegrityError) -> bool:
+    # 23505 — unique_violation; прочие нарушения (например, нет партиции под createdAt) не дубли
+    return getattr(exc.orig, "sqlstate", None) == "23505"
+
+
+def _shards_total(wallet_id_column):
+    """
+    Сумма суббалансов кошелька (0 для обычного кошелька); полный баланс — Wallet.balance + это значение.
+    """
+    return (
+        select(func.coalesce(func.sum(WalletBalanceShard.balance), 0))
+        .where(WalletBalanceShard.walletId == wallet_id_column)
+        .scalar_subquery()
+    )
+
+
+def _latest_checkpoints():
+    """
+    Последняя контрольная точка каждого кошелька: (walletId, cutoff, balance).
+    """
+    return (
+        select(WalletBalanceCheckpoint.walletId, WalletBalanceCheckpoint.cutoff, WalletBalanceCheckpoint.balance)
+        .distinct(WalletBalanceCheckpoint.walletId)
+        .order_by(WalletBalanceCheckpoint.walletId, WalletBalanceCheckpoint.cutoff.desc())
+        .subquery()
+    )
+
+
+def _split_amount(wallet: Wallet, shards: List[WalletBalanceShard], amount: int, start: int) -> list:
+    """
+    Разложить знаковую сумму по строкам баланса кошелька (строки заблокированы вызывающим).
+    Обычный кошелёк — вся сумма в wallets.balance. Шардированный: пополнение ложится
+    в суббаланс start, списание собирается из wallets.balance и суббалансов начиная с start
+    (достаточность средств проверяет вызывающий).
+    :return: список (строка Wallet или WalletBalanceShard, delta)
+    """
+    if not shards:
+        return [(wallet, amount)]
+    start = start % len(shards)
+    rotated = shards[start:] + shards[:start]
+    if amount > 0:
+        return [(rotated[0], amount)]
+    pieces, remaining = [], -amount
+    for source in [wallet] + rotated:
+        take = min(source.balance, remaining)
+        if take:
+            pieces.append((source, -take))
+            remaining -= take
+        if not remaining:
+            break
+    return pieces
+
+
+# Префикс ключей переводов в общем пространстве externalOperationId (wallet_operation_keys,
+# хранилище идемпотентности); в идентификаторах клиентских операций не допускается
+TRANSFER_KEY_PREFIX = "transfer:"
+
+
+def transfer_external_ids(transfer_id: str) -> Tuple[str, str]:
+    """
+    externalOperationId операций списания и зачисления перевода. Префикс отделяет их
+    от идентификаторов обычных пополнений и списаний в общей таблице wallet_operation_keys.
+    """
+    return f"{TRANSFER_KEY_PREFIX}{transfer_id}:debit", f"{TRANSFER_KEY_PREFIX}{transfer_id}:credit"
+
+
+class OperationOutcome(NamedTuple):
+    """
+    Результат apply_operation.
+    applied — операция записана, balance — новый баланс, version — его версия;
+    duplicate — externalOperationId уже использован;
+    wallet_id is None — кошелька нет; иначе — недостаточно средств.
+    sharded — кошелёк шардированный: balance собран из суббалансов без общей
+    блокировки, версии нет, в кеш баланса такой результат не пишется.
+    """
+    wallet_id: Optional[str]
+    balance: Optional[int]
+    applied: bool
+    duplicate: bool
+    version: Optional[int] = None
+    sharded: bool = False
+
+
+class PendingOperation(NamedTuple):
+    """
+    Операция пакетной записи: знаковая сумма (отрицательная для списания).
+    trace_id — собственный trace операции (иначе берётся trace пачки).
+    """
+    user_id: str
+    amount: int
+    operation_type: WalletOperationType
+    external_id: str
+    reason: str
+    trace_id: Optional[str] = None
+
+
+class TransferOutcome(NamedTuple):
+    """
+    Результат transfer: по OperationOutcome на списание и зачисление (семантика полей та же;
+    при отказе applied=False у обоих, duplicate — transferId уже использован).
+    """
+    debit: OperationOutcome
+    credit: OperationOutcome
+
+
+class WalletSnapshot(NamedTuple):
+    """
+    Неизменяемая копия строки кошелька, не связанная с сессией: её можно отдать
+    нескольким запросам (экземпляр Wallet истекает при rollback своей сессии).
+    """
+    id: str
+    userId: str
+    balance: int
+    version: int
+    shards: int
+
+    @classmethod
+    def of(cls, wallet: Wallet) -> "WalletSnapshot":
+        return cls(wallet.id, wallet.userId, wallet.balance, wallet.version, wallet.shards)
+
 
 class WalletRepository:
     """
@@ -23,6 +291,30 @@ class WalletRepository:
         result = await self.db.execute(select(Wallet).where(Wallet.userId == user_id))
         return result.scalar_one_or_none()
 
+    async def get_wallets_by_user_ids(self, user_ids: List[str]) -> List[Wallet]:
+        """
+        Получить кошельки нескольких пользователей одним запросом WHERE userId IN (...).
+        :return: список найденных Wallet (без отсутствующих)
+        """
+        if not user_ids:
+            return []
+        result = await self.db.execute(select(Wallet).where(Wallet.userId.in_(user_ids)))
+        return list(result.scalars().all())
+
+    async def get_recently_active_wallets(self, since: datetime, limit: int) -> List[Tuple[str, int, int]]:
+        """
+        Обычные (не шардированные) кошельки с операциями после since — кандидаты для прогрева кеша.
+        Условие по createdAt отсекает старые партиции wallet_operations.
+        :return: список (user_id, баланс, версия), не больше limit
+        """
+        active = select(WalletOperation.walletId).where(WalletOperation.createdAt >= since).distinct()
+        result = await self.db.execute(
+            select(Wallet.userId, Wallet.balance, Wallet.version)
+            .where(Wallet.id.in_(active), Wallet.shards == 1)
+            .limit(limit)
+        )
+        return [(row[0], row[1], row[2]) for row in result.all()]
+
     async def create_wallet(self, user_id: str) -> Wallet:
         """
         Создать новый кошелёк для пользователя.
@@ -35,35 +327,638 @@ class WalletRepository:
         await self.db.refresh(wallet)
         return wallet
 
+    async def ensure_wallet(self, user_id: str):
+        """
+        Создать кошелёк для пользователя, если его ещё нет (безопасно при гонке создания).
+        """
+        await self.db.execute(
+            pg_insert(Wallet)
+            .values(id=str(uuid4()), userId=user_id, balance=0)
+            .on_conflict_do_nothing(index_elements=[Wallet.userId])
+        )
+        await self.db.commit()
+
     async def delete_wallet(self, wallet: Wallet):
         """
         Удалить кошелёк из базы данных.
         """
+        await self.db.execute(delete(WalletBalanceShard).where(WalletBalanceShard.walletId == wallet.id))
         await self.db.delete(wallet)
         await self.db.commit()
 
     async def get_balance(self, wallet_id: str) -> int:
         """
-        Получить текущий баланс кошелька по wallet_id.
+        Получить текущий баланс кошелька по wallet_id (чтение материализованного баланса по первичному ключу;
+        для шардированного кошелька — плюс сумма суббалансов).
         :return: сумма баланса (int)
         """
-        from sqlalchemy import func
-        op_result = await self.db.execute(
-            select(func.coalesce(func.sum(WalletOperation.amount), 0)).where(WalletOperation.walletId == wallet_id)
+        result = await self.db.execute(
+            select(Wallet.balance + _shards_total(Wallet.id)).where(Wallet.id == wallet_id)
         )
-        return op_result.scalar_one()
+        return result.scalar_one_or_none() or 0
 
-    async def add_operation(self, operation: WalletOperation):
+    async def get_balances(self, wallet_ids: List[str]) -> dict:
+        """
+        Получить полные балансы нескольких кошельков одним запросом.
+        :return: словарь wallet_id -> баланс
         """
-        Добавить операцию (пополнение/списание) в базу данных.
+        if not wallet_ids:
+            return {}
+        result = await self.db.execute(
+            select(Wallet.id, Wallet.balance + _shards_total(Wallet.id)).where(Wallet.id.in_(wallet_ids))
+        )
+        return {row[0]: row[1] for row in result.all()}
+
+    async def get_balances_at(self, wallet_ids: List[str], at: datetime) -> dict:
+        """
+        Получить балансы кошельков по истории операций на момент at (операции с createdAt <= at),
+        от ближайшей контрольной точки, включая архивные операции.
+        :return: словарь wallet_id -> баланс
+        """
+        if not wallet_ids:
+            return {}
+        result = await self.db.execute(BALANCES_AT_SQL, {"wallet_ids": list(wallet_ids), "at": at})
+        return {row.wallet_id: row.balance for row in result.all()}
+
+    async def set_wallet_shards(self, user_id: str, shards: int) -> Optional[int]:
         """
-        self.db.add(operation)
+        Включить (shards > 1) или выключить (shards = 1) шардирование кошелька.
+        Полный баланс переносится поровну по новым суббалансам (или обратно в wallets.balance).
+        Версии всех строк продолжаются после максимальной из старых, изменения строк
+        пишутся в outbox с общим operationId перераспределения (без записи в wallet_operations).
+        :return: полный баланс кошелька или None, если кошелька нет
+        """
+        result = await self.db.execute(
+            select(Wallet.id, Wallet.balance, Wallet.version).where(Wallet.userId == user_id).with_for_update()
+        )
+        wallet = result.one_or_none()
+        if wallet is None:
+            await self.db.rollback()
+            return None
+        result = await self.db.execute(
+            select(WalletBalanceShard.shard, WalletBalanceShard.balance, WalletBalanceShard.version)
+            .where(WalletBalanceShard.walletId == wallet.id)
+            .order_by(WalletBalanceShard.shard)
+            .with_for_update()
+        )
+        rows = result.all()
+        old = {row.shard: row.balance for row in rows}
+        version = max([wallet.version] + [row.version for row in rows]) + 1
+        total = wallet.balance + sum(old.values())
+
+        new = {}
+        if shards > 1:
+            share, rest = divmod(total, shards)
+            new = {shard: share + (rest if shard == 0 else 0) for shard in range(shards)}
+        base = total - sum(new.values())
+        await self.db.execute(delete(WalletBalanceShard).where(WalletBalanceShard.walletId == wallet.id))
+        if new:
+            await self.db.execute(
+                insert(WalletBalanceShard),
+                [{"walletId": wallet.id, "shard": shard, "balance": balance, "version": version} for shard, balance in new.items()],
+            )
+        await self.db.execute(
+            update(Wallet).where(Wallet.id == wallet.id).values(balance=base, version=version, shards=shards)
+        )
+
+        operation_id, created_at = str(uuid4()), utc_now()
+        states = [(None, wallet.balance, base)] + [
+            (shard, old.get(shard, 0), new.get(shard, 0)) for shard in sorted(set(old) | set(new))
+        ]
+        await self.db.execute(
+            insert(WalletOutbox),
+            [
+                {
+                    "walletId": wallet.id,
+                    "userId": user_id,
+                    "operationId": operation_id,
+                    "delta": after - before,
+                    "balance": after,
+                    "version": version,
+                    "traceId": "",
+                    "createdAt": created_at,
+                    "shard": shard,
+                }
+                for shard, before, after in states
+            ],
+        )
         await self.db.commit()
+        return total
 
-    async def get_operation_by_external_id(self, external_id: str) -> Optional[WalletOperation]:
+    async def apply_operation(
+        self,
+        user_id: str,
+        amount: int,
+        operation_type: WalletOperationType,
+        external_id: str,
+        reason: str,
+        trace_id: str,
+    ) -> OperationOutcome:
         """
-        Получить операцию по внешнему идентификатору (для защиты от дублей).
-        :return: WalletOperation или None
+        Атомарно провести операцию по кошельку пользователя за один запрос к БД.
+        :param amount: знаковая сумма (отрицательная для списания)
+        :return: OperationOutcome
         """
-        result = await self.db.execute(select(WalletOperation).where(WalletOperation.externalOperationId == external_id))
-        return result.scalar_one_or_none()
+        params = {
+            "user_id": user_id,
+            "amount": amount,
+            "type": operation_type.value,
+            "operation_id": str(uuid4()),
+            "external_id": external_id,
+            "reason": reason,
+            "trace_id": trace_id or "",
+            "created_at": utc_now(),
+        }
+        try:
+            result = await self.db.execute(APPLY_OPERATION_SQL, params)
+            row = result.one()
+            await self.db.commit()
+        except IntegrityError as exc:
+            # Конкурентный дубль по externalOperationId: statement откатился целиком
+            await self.db.rollback()
+            if not _is_unique_violation(exc):
+                raise
+            return OperationOutcome(wallet_id=None, balance=None, applied=False, duplicate=True)
+        wallet_id, balance, applied, duplicate, version, shards = row
+        if shards is not None and shards > 1 and not duplicate:
+            return await self._apply_sharded_operation(params, shards)
+        return OperationOutcome(wallet_id, balance, applied, duplicate, version)
+
+    async def _apply_sharded_operation(self, params: dict, shards: int) -> OperationOutcome:
+        """
+        Провести операцию по одному свободному суббалансу шардированного кошелька;
+        если такого нет — через _apply_across_shards.
+        :return: OperationOutcome
+        """
+        params = {**params, "shards": shards, "start": random.randrange(shards)}
+        try:
+            result = await self.db.execute(APPLY_SHARDED_OPERATION_SQL, params)
+            wallet_id, balance, applied, duplicate = result.one()
+            await self.db.commit()
+        except IntegrityError as exc:
+            await self.db.rollback()
+            if not _is_unique_violation(exc):
+                raise
+            return OperationOutcome(wallet_id=None, balance=None, applied=False, duplicate=True, sharded=True)
+        if applied or duplicate or wallet_id is None:
+            return OperationOutcome(wallet_id, balance, applied, duplicate, sharded=True)
+        return await self._apply_across_shards(params)
+
+    async def _apply_across_shards(self, params: dict) -> OperationOutcome:
+        """
+        Медленный путь шардированного кошелька: все суббалансы заняты или ни один
+        не покрывает списание. Блокируются строка кошелька и все суббалансы (в порядке
+        номера, как и в set_wallet_shards); списание собирается из wallets.balance
+        и суббалансов начиная с :start, пополнение ложится в суббаланс :start.
+        :return: OperationOutcome
+        """
+        SHARDED_LOCKED_PATH.inc()
+        try:
+            # populate_existing: объекты могли быть загружены в сессию раньше, нужны значения под блокировкой
+            result = await self.db.execute(
+                select(Wallet)
+                .where(Wallet.userId == params["user_id"])
+                .with_for_update()
+                .execution_options(populate_existing=True)
+            )
+            wallet = result.scalar_one_or_none()
+            if wallet is None:
+                await self.db.rollback()
+                return OperationOutcome(wallet_id=None, balance=None, applied=False, duplicate=False)
+            if wallet.shards <= 1:
+                # Шардирование выключили между запросами
+                await self.db.rollback()
+                return await self.apply_operation(
+                    params["user_id"],
+                    params["amount"],
+                    WalletOperationType(params["type"]),
+                    params["external_id"],
+                    params["reason"],
+                    params["trace_id"],
+                )
+            wallet_id = wallet.id
+            result = await self.db.execute(
+                select(WalletOperationKey.externalOperationId)
+                .where(WalletOperationKey.externalOperationId == params["external_id"])
+            )
+            if result.first() is not None:
+                await self.db.rollback()
+                return OperationOutcome(wallet_id, None, False, True, sharded=True)
+            result = await self.db.execute(
+                select(WalletBalanceShard)
+                .where(WalletBalanceShard.walletId == wallet_id)
+                .order_by(WalletBalanceShard.shard)
+                .with_for_update()
+                .execution_options(populate_existing=True)
+            )
+            shards = list(result.scalars().all())
+            amount = params["amount"]
+            total = wallet.balance + sum(shard.balance for shard in shards)
+            if not shards or total + amount < 0:
+                await self.db.rollback()
+                return OperationOutcome(wallet_id, None, False, False, sharded=True)
+            self._record_operation(
+                wallet,
+                _split_amount(wallet, shards, amount, params["start"]),
+                params["operation_id"],
+                amount,
+                WalletOperationType(params["type"]),
+                params["reason"],
+                params["external_id"],
+                params["trace_id"],
+                params["created_at"],
+            )
+            await self.db.commit()
+        except IntegrityError as exc:
+            await self.db.rollback()
+            if not _is_unique_violation(exc):
+                raise
+            return OperationOutcome(wallet_id=None, balance=None, applied=False, duplicate=True, sharded=True)
+        return OperationOutcome(wallet_id, total + amount, True, False, sharded=True)
+
+    def _record_operation(
+        self,
+        wallet: Wallet,
+        pieces: list,
+        operation_id: str,
+        amount: int,
+        operation_type: WalletOperationType,
+        reason: str,
+        external_id: str,
+        trace_id: str,
+        created_at: datetime,
+    ):
+        """
+        Применить к заблокированным строкам баланса части суммы (см. _split_amount)
+        и добавить в сессию операцию, её ключ идемпотентности и события outbox по каждой части.
+        """
+        for source, delta in pieces:
+            source.balance += delta
+            source.version += 1
+        self.db.add(WalletOperation(
+            id=operation_id,
+            walletId=wallet.id,
+            amount=amount,
+            type=operation_type,
+            reason=reason,
+            externalOperationId=external_id,
+            traceId=trace_id,
+            createdAt=created_at,
+        ))
+        self.db.add(WalletOperationKey(
+            externalOperationId=external_id,
+            operationId=operation_id,
+            createdAt=created_at,
+        ))
+        for source, delta in pieces:
+            self.db.add(WalletOutbox(
+                walletId=wallet.id,
+                userId=wallet.userId,
+                operationId=operation_id,
+                delta=delta,
+                balance=source.balance,
+                version=source.version,
+                traceId=trace_id,
+                createdAt=created_at,
+                shard=source.shard if isinstance(source, WalletBalanceShard) else None,
+            ))
+
+    async def transfer(
+        self,
+        from_user_id: str,
+        to_user_id: str,
+        amount: int,
+        transfer_id: str,
+        reason: str,
+        trace_id: str,
+    ) -> TransferOutcome:
+        """
+        Перевести amount между кошельками в одной транзакции: списание и зачисление
+        записываются двумя операциями (WITHDRAW и DEPOSIT) с общим reason и trace.
+        Строки кошельков блокируются в порядке id, затем суббалансы шардированных
+        кошельков в порядке (walletId, shard) — как в apply_operations_batch и
+        _apply_across_shards, поэтому встречные переводы A→B и B→A не взаимоблокируются.
+        Идемпотентность — по transferId (см. transfer_external_ids).
+        :param amount: положительная сумма перевода
+        :return: TransferOutcome
+        """
+        debit_id, credit_id = transfer_external_ids(transfer_id)
+        created_at = utc_now()
+        trace_id = trace_id or ""
+        try:
+            result = await self.db.execute(
+                select(Wallet)
+                .where(Wallet.userId.in_([from_user_id, to_user_id]))
+                .order_by(Wallet.id)
+                .with_for_update()
+                .execution_options(populate_existing=True)
+            )
+            wallets = {wallet.userId: wallet for wallet in result.scalars().all()}
+            source, target = wallets.get(from_user_id), wallets.get(to_user_id)
+            result = await self.db.execute(
+                select(WalletOperationKey.externalOperationId)
+                .where(WalletOperationKey.externalOperationId == debit_id)
+            )
+            duplicate = result.first() is not None
+            if duplicate or source is None or target is None:
+                await self.db.rollback()
+                return TransferOutcome(
+                    OperationOutcome(source.id if source else None, None, False, duplicate),
+                    OperationOutcome(target.id if target else None, None, False, duplicate),
+                )
+            shards = {}
+            sharded_ids = sorted(wallet.id for wallet in (source, target) if wallet.shards > 1)
+            if sharded_ids:
+                SHARDED_LOCKED_PATH.inc()
+                result = await self.db.execute(
+                    select(WalletBalanceShard)
+                    .where(WalletBalanceShard.walletId.in_(sharded_ids))
+                    .order_by(WalletBalanceShard.walletId, WalletBalanceShard.shard)
+                    .with_for_update()
+                    .execution_options(populate_existing=True)
+                )
+                for shard in result.scalars().all():
+                    shards.setdefault(shard.walletId, []).append(shard)
+            source_shards, target_shards = shards.get(source.id, []), shards.get(target.id, [])
+            source_total = source.balance + sum(shard.balance for shard in source_shards)
+            target_total = target.balance + sum(shard.balance for shard in target_shards)
+            if source_total < amount:
+                await self.db.rollback()
+                return TransferOutcome(
+                    OperationOutcome(source.id, None, False, False, sharded=bool(source_shards)),
+                    OperationOutcome(target.id, None, False, False, sharded=bool(target_shards)),
+                )
+            self._record_operation(
+                source, _split_amount(source, source_shards, -amount, random.randrange(len(source_shards) or 1)),
+                str(uuid4()), -amount, WalletOperationType.WITHDRAW, reason, debit_id, trace_id, created_at,
+            )
+            self._record_operation(
+                target, _split_amount(target, target_shards, amount, random.randrange(len(target_shards) or 1)),
+                str(uuid4()), amount,
+                WalletOperationType.DEPOSIT, reason, credit_id, trace_id, created_at,
+            )
+            await self.db.commit()
+        except IntegrityError as exc:
+            # Конкурентный повтор того же transferId
+            await self.db.rollback()
+            if not _is_unique_violation(exc):
+                raise
+            return TransferOutcome(
+                OperationOutcome(None, None, False, True), OperationOutcome(None, None, False, True)
+            )
+        return TransferOutcome(
+            OperationOutcome(
+                source.id, source_total - amount, True, False,
+                None if source_shards else source.version, bool(source_shards),
+            ),
+            OperationOutcome(
+                target.id, target_total + amount, True, False,
+                None if target_shards else target.version, bool(target_shards),
+            ),
+        )
+
+    async def apply_operations_batch(self, operations: List[PendingOperation], trace_id: Optional[str] = None) -> List[OperationOutcome]:
+        """
+        Провести пачку операций по многим кошелькам в одной транзакции:
+        строки кошельков блокируются в порядке id (без взаимных блокировок),
+        операции вставляются одним multi-row INSERT, балансы — одним bulk UPDATE.
+        Операции применяются в порядке списка; каждая получает свой результат.
+        События outbox пишутся в той же транзакции.
+        Операции шардированных кошельков проводятся после фиксации пачки через apply_operation.
+        При конкурентном дубле externalOperationId пачка откатывается и
+        проводится поштучно через apply_operation.
+        :return: список OperationOutcome в порядке operations
+        """
+        user_ids = sorted({op.user_id for op in operations})
+        deposit_user_ids = sorted({op.user_id for op in operations if op.amount > 0})
+        try:
+            if deposit_user_ids:
+                await self.db.execute(
+                    pg_insert(Wallet).on_conflict_do_nothing(index_elements=[Wallet.userId]),
+                    [{"id": str(uuid4()), "userId": user_id, "balance": 0} for user_id in deposit_user_ids],
+                )
+            result = await self.db.execute(
+                select(Wallet.userId, Wallet.id, Wallet.balance, Wallet.version, Wallet.shards)
+                .where(Wallet.userId.in_(user_ids))
+                .order_by(Wallet.id)
+                .with_for_update()
+            )
+            wallets = {row.userId: [row.id, row.balance, row.version, row.shards] for row in result.all()}
+            result = await self.db.execute(
+                select(WalletOperationKey.externalOperationId)
+                .where(WalletOperationKey.externalOperationId.in_([op.external_id for op in operations]))
+            )
+            used_external_ids = set(result.scalars().all())
+
+            created_at = utc_now()
+            outcomes, rows, events, touched, deferred = [], [], [], {}, []
+            for op in operations:
+                wallet = wallets.get(op.user_id)
+                wallet_id = wallet[0] if wallet else None
+                if op.external_id in used_external_ids:
+                    outcomes.append(OperationOutcome(wallet_id, None, False, True))
+                    continue
+                if wallet is not None and wallet[3] > 1:
+                    deferred.append((len(outcomes), op))
+                    outcomes.append(None)
+                    continue
+                if wallet is None or wallet[1] + op.amount < 0:
+                    outcomes.append(OperationOutcome(wallet_id, None, False, False))
+                    continue
+                used_external_ids.add(op.external_id)
+                wallet[1] += op.amount
+                wallet[2] += 1
+                touched[wallet_id] = wallet[:3]
+                rows.append({
+                    "id": str(uuid4()),
+                    "walletId": wallet_id,
+                    "amount": op.amount,
+                    "type": op.operation_type.value,
+                    "reason": op.reason,
+                    "externalOperationId": op.external_id,
+                    "traceId": op.trace_id or trace_id or "",
+                    "createdAt": created_at,
+                })
+                events.append({
+                    "walletId": wallet_id,
+                    "userId": op.user_id,
+                    "operationId": rows[-1]["id"],
+                    "delta": op.amount,
+                    "balance": wallet[1],
+                    "version": wallet[2],
+                    "traceId": rows[-1]["traceId"],
+                    "createdAt": created_at,
+                })
+                outcomes.append(OperationOutcome(wallet_id, wallet[1], True, False, wallet[2]))
+            if rows:
+                await self.db.execute(
+                    insert(WalletOperationKey),
+                    [
+                        {"externalOperationId": row["externalOperationId"], "operationId": row["id"], "createdAt": row["createdAt"]}
+                        for row in rows
+                    ],
+                )
+                await self.db.execute(insert(WalletOperation), rows)
+                await self.db.execute(insert(WalletOutbox), events)
+                await self.db.execute(
+                    update(Wallet),
+                    [
+                        {"id": wallet_id, "balance": balance, "version": version}
+                        for wallet_id, balance, version in touched.values()
+                    ],
+                )
+            await self.db.commit()
+        except IntegrityError as exc:
+            await self.db.rollback()
+            if not _is_unique_violation(exc):
+                raise
+        else:
+            for index, op in deferred:
+                outcomes[index] = await self.apply_operation(
+                    op.user_id, op.amount, op.operation_type, op.external_id, op.reason, op.trace_id or trace_id
+                )
+            return outcomes
+        for user_id in deposit_user_ids:
+            await self.ensure_wallet(user_id)
+        outcomes = []
+        for op in operations:
+            outcomes.append(await self.apply_operation(
+                op.user_id, op.amount, op.operation_type, op.external_id, op.reason, op.trace_id or trace_id
+            ))
+        return outcomes
+
+    async def list_operations(
+        self,
+        wallet_id: str,
+        limit: int,
+        after: Optional[Tuple[datetime, str]] = None,
+        operation_type: Optional[WalletOperationType] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> List[WalletOperation]:
+        """
+        Получить страницу операций кошелька, от новых к старым (keyset-пагинация
+        по индексу (walletId, createdAt, id): стоимость не зависит от номера страницы).
+        :param after: (createdAt, id) последней операции предыдущей страницы
+        :param created_from: нижняя граница createdAt (включительно)
+        :param created_to: верхняя граница createdAt (не включительно)
+        :return: список WalletOperation
+        """
+        query = select(WalletOperation).where(WalletOperation.walletId == wallet_id)
+        if after is not None:
+            query = query.where(tuple_(WalletOperation.createdAt, WalletOperation.id) < tuple_(*after))
+        if operation_type is not None:
+            query = query.where(WalletOperation.type == operation_type)
+        if created_from is not None:
+            query = query.where(WalletOperation.createdAt >= created_from)
+        if created_to is not None:
+            query = query.where(WalletOperation.createdAt < created_to)
+        query = query.order_by(WalletOperation.createdAt.desc(), WalletOperation.id.desc()).limit(limit)
+        result = await self.db.execute(query)
+        return list(result.scalars().all())
+
+    async def stream_operations(
+        self,
+        batch_size: int,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        wallet_id: Optional[str] = None,
+    ) -> AsyncIterator[Sequence]:
+        """
+        Потоково прочитать операции через серверный курсор, пачками по batch_size строк.
+        Память не зависит от размера таблицы. Строки упорядочены по (createdAt, id).
+        """
+        query = select(
+            WalletOperation.id,
+            WalletOperation.walletId,
+            WalletOperation.amount,
+            WalletOperation.type,
+            WalletOperation.reason,
+            WalletOperation.externalOperationId,
+            WalletOperation.traceId,
+            WalletOperation.createdAt,
+        )
+        if wallet_id is not None:
+            query = query.where(WalletOperation.walletId == wallet_id)
+        if created_from is not None:
+            query = query.where(WalletOperation.createdAt >= created_from)
+        if created_to is not None:
+            query = query.where(WalletOperation.createdAt < created_to)
+        query = query.order_by(WalletOperation.createdAt, WalletOperation.id).execution_options(yield_per=batch_size)
+        result = await self.db.stream(query)
+        async for rows in result.partitions():
+            yield rows
+
+    async def get_balance_drift(self) -> List[Tuple[str, int, int]]:
+        """
+        Пересчитать балансы по истории (последняя контрольная точка + SUM операций после неё)
+        и сравнить с материализованными (для шардированных кошельков — с суммой wallets.balance
+        и суббалансов). Операции до контрольной точки не читаются, в том числе архивные.
+        :return: список (wallet_id, сохранённый баланс, баланс по истории) для расхождений
+        """
+        latest = _latest_checkpoints()
+        totals = (
+            select(WalletOperation.walletId.label("walletId"), func.sum(WalletOperation.amount).label("total"))
+            .outerjoin(latest, latest.c.walletId == WalletOperation.walletId)
+            .where(or_(latest.c.cutoff.is_(None), WalletOperation.createdAt >= latest.c.cutoff))
+            .group_by(WalletOperation.walletId)
+            .subquery()
+        )
+        checkpoints = _latest_checkpoints()
+        actual = func.coalesce(checkpoints.c.balance, 0) + func.coalesce(totals.c.total, 0)
+        stored = Wallet.balance + _shards_total(Wallet.id)
+        result = await self.db.execute(
+            select(Wallet.id, stored, actual)
+            .outerjoin(checkpoints, checkpoints.c.walletId == Wallet.id)
+            .outerjoin(totals, totals.c.walletId == Wallet.id)
+            .where(stored != actual)
+        )
+        return [(row[0], row[1], row[2]) for row in result.all()]
+
+    async def recompute_balance(self, wallet_id: str) -> int:
+        """
+        Перезаписать материализованный баланс кошелька балансом по истории операций
+        (последняя контрольная точка + операции после неё).
+        Суббалансы шардированного кошелька обнуляются, весь баланс переносится в wallets.balance.
+        Сначала блокируются строка кошелька и все суббалансы (в порядке номера, как и в
+        _apply_across_shards), и только затем отдельным запросом считается сумма: в READ COMMITTED
+        UPDATE с подзапросом после ожидания блокировки перепроверяет строку, но не пересчитывает
+        подзапрос, и операция, зафиксированная во время ожидания, потерялась бы.
+        :return: пересчитанный баланс (int)
+        """
+        result = await self.db.execute(select(Wallet.id).where(Wallet.id == wallet_id).with_for_update())
+        if result.scalar_one_or_none() is None:
+            await self.db.rollback()
+            return 0
+        await self.db.execute(
+            select(WalletBalanceShard.shard)
+            .where(WalletBalanceShard.walletId == wallet_id)
+            .order_by(WalletBalanceShard.shard)
+            .with_for_update()
+        )
+        result = await self.db.execute(
+            select(WalletBalanceCheckpoint.cutoff, WalletBalanceCheckpoint.balance)
+            .where(WalletBalanceCheckpoint.walletId == wallet_id)
+            .order_by(WalletBalanceCheckpoint.cutoff.desc())
+            .limit(1)
+        )
+        checkpoint = result.one_or_none()
+        total = select(func.coalesce(func.sum(WalletOperation.amount), 0)).where(WalletOperation.walletId == wallet_id)
+        if checkpoint is not None:
+            total = total.where(WalletOperation.createdAt >= checkpoint.cutoff)
+        result = await self.db.execute(total)
+        total = result.scalar_one() + (checkpoint.balance if checkpoint is not None else 0)
+        result = await self.db.execute(
+            update(Wallet)
+            .where(Wallet.id == wallet_id)
+            .values(balance=total, version=Wallet.version + 1)
+            .returning(Wallet.balance)
+        )
+        balance = result.scalar_one()
+        await self.db.execute(
+            update(WalletBalanceShard)
+            .where(WalletBalanceShard.walletId == wallet_id)
+            .values(balance=0, version=WalletBalanceShard.version + 1)
+        )
+        await self.db.commit()
+        return balance
@@ -2,8 +2,10 @@ from fastapi.responses import JSONResponse
 from datetime import datetime
 from app.core.utils import get_timestamp
 from app.codes import Codes
+from app.core.metrics import RESPONSE_CODES
 
 def success_response(message: str, code: Codes, data=None, status_code: int = 200, trace_id: str = None):
+    RESPONSE_CODES.labels(code.value).inc()
     return JSONResponse(
         status_code=status_code,
         content={
@@ -18,6 +20,7 @@ def success_response(message: str, code: Codes, data=None, status_code: int = 20
     )
 
 def error_response(status_code: int, message: str, code: Codes, details=None, trace_id: str = None):
+    RESPONSE_CODES.labels(code.value).inc()
     response_content = {
         "error": {
             "message": message,
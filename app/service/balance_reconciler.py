@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Optional
+from uuid import uuid4
+
+from app.core.config import settings
+from app.core.redis import redis_client
+from app.core.utils import utc_now
+from app.db.session import ReadSessionLocal
+from app.repository.wallet_repository import WalletRepository
+from app.service.wallet_service import WalletService
+
+logger = logging.getLogger(__name__)
+
+BALANCE_KEY_PREFIX = "wallet_balance:"
+WARMUP_LOCK_KEY = "balance_cache_warmup:lock"
+RECONCILER_LOCK_KEY = "balance_cache_reconciler:lock"
+# Позиция SCAN общая для всех процессов: шаг делает тот, кто взял блокировку, и продолжает с места предыдущего
+RECONCILER_CURSOR_KEY = "balance_cache_reconciler:cursor"
+
+
+class BalanceReconciler:
+    """
+    Фоновое обслуживание кеша балансов.
+    При старте прогревает кеш балансами недавно активных кошельков; затем
+    непрерывно проходит ключи wallet_balance:* через SCAN пачками и сверяет их с БД.
+    Каждый шаг выполняет только один процесс — тот, кто взял короткую блокировку в Redis;
+    курсор SCAN хранится рядом с ней, поэтому проход не начинается заново при смене процесса.
+    Темп ограничен размером пачки и интервалом между шагами.
+    Чтения идут через реплику: исправления защищены версией и не откатывают кеш назад.
+    """
+    def __init__(self, batch_size: int, interval: float):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._owner = str(uuid4())
+        self._task: Optional[asyncio.Task] = None
+
+    async def _acquire(self, key: str, ttl_ms: int) -> bool:
+        redis = await redis_client.get_redis()
+        return bool(await redis.set(key, self._owner, nx=True, px=ttl_ms))
+
+    async def warm_up(self) -> int:
+        """
+        Прогреть кеш (один процесс на кластер).
+        :return: число записанных балансов
+        """
+        if not await self._acquire(WARMUP_LOCK_KEY, 300000):
+            return 0
+        since = utc_now() - timedelta(hours=settings.BALANCE_WARMUP_WINDOW_HOURS)
+        async with ReadSessionLocal() as session:
+            service = WalletService(WalletRepository(session), verify_user_exists=None)
+            warmed = await service.warm_balance_cache(
+                since, settings.BALANCE_WARMUP_MAX_WALLETS, settings.BALANCE_WARMUP_BATCH_SIZE
+            )
+        logger.info("Balance cache warm-up finished", extra={"warmed": warmed})
+        return warmed
+
+    async def run_once(self) -> dict:
+        """
+        Сверить следующую пачку закешированных балансов.
+        :return: число исправлений по видам
+        """
+        if not await self._acquire(RECONCILER_LOCK_KEY, max(int(self.interval * 1000), 1)):
+            return {}
+        redis = await redis_client.get_redis()
+        cursor = int(await redis.get(RECONCILER_CURSOR_KEY) or 0)
+        cursor, keys = await redis.scan(cursor, match=f"{BALANCE_KEY_PREFIX}*", count=self.batch_size)
+        # Курсор сохраняется до сверки: следующий шаг не повторит пачку, даже если этот упадёт на БД
+        await redis.set(RECONCILER_CURSOR_KEY, cursor)
+        user_ids = list(dict.fromkeys(key[len(BALANCE_KEY_PREFIX):] for key in keys))
+        async with ReadSessionLocal() as session:
+            service = WalletService(WalletRepository(session), verify_user_exists=None)
+            found = await service.reconcile_balance_cache(user_ids)
+        if any(found.values()):
+            logger.warning("Balance cache drift repaired", extra=found)
+        return found
+
+    async def _run(self):
+        if settings.BALANCE_WARMUP_ENABLED:
+            try:
+                await self.warm_up()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Balance cache warm-up failed")
+        if not settings.BALANCE_RECONCILER_ENABLED:
+            return
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Balance cache reconciliation failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+balance_reconciler = BalanceReconciler(
+    batch_size=settings.BALANCE_RECONCILER_BATCH_SIZE,
+    interval=settings.BALANCE_RECONCILER_INTERVAL,
+)
@@ -0,0 +1,63 @@
+import asyncio
+import time
+from typing import List, Tuple
+
+from app.core.config import settings
+from app.core.metrics import GROUP_COMMIT_BATCH_SIZE, GROUP_COMMIT_WAIT_SECONDS
+from app.db.session import SessionLocal
+from app.repository.wallet_repository import OperationOutcome, PendingOperation, WalletRepository
+
+
+class GroupCommitter:
+    """
+    Групповая фиксация движений средств: операции, пришедшие в пределах окна
+    (или до набора max_batch), записываются одним multi-row INSERT и одним COMMIT
+    через WalletRepository.apply_operations_batch. Каждый вызывающий получает
+    собственный OperationOutcome (дубль, нехватка средств, новый баланс).
+    """
+    def __init__(self, window_ms: float, max_batch: int):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending: List[Tuple[PendingOperation, asyncio.Future, float]] = []
+        self._timer = None
+        self._tasks = set()
+
+    async def submit(self, operation: PendingOperation) -> OperationOutcome:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((operation, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush_now)
+        return await future
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._flush(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, batch: List[Tuple[PendingOperation, asyncio.Future, float]]):
+        started = time.perf_counter()
+        GROUP_COMMIT_BATCH_SIZE.observe(len(batch))
+        for _, _, enqueued in batch:
+            GROUP_COMMIT_WAIT_SECONDS.observe(started - enqueued)
+        try:
+            async with SessionLocal() as session:
+                outcomes = await WalletRepository(session).apply_operations_batch([op for op, _, _ in batch])
+        except Exception as exc:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future, _), outcome in zip(batch, outcomes):
+            if not future.done():
+                future.set_result(outcome)
+
+
+group_committer = GroupCommitter(settings.GROUP_COMMIT_WINDOW_MS, settings.GROUP_COMMIT_MAX_BATCH)
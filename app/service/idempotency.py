@@ -0,0 +1,39 @@
+import json
+import logging
+from typing import Optional
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.core.redis import redis_client
+
+
+class IdempotencyStore:
+    """
+    Результаты завершённых операций по externalOperationId в Redis.
+    Позволяет ответить на повтор до обращения к svc-users и БД.
+    Источник истины — уникальность ключа в БД: при промахе или недоступности
+    Redis операция идёт обычным путём.
+    """
+    @staticmethod
+    def _key(external_id: str) -> str:
+        return f"wallet_op_result:{external_id}"
+
+    async def get(self, external_id: str) -> Optional[dict]:
+        try:
+            conn = await redis_client.get_redis()
+            value = await conn.get(self._key(external_id))
+        except redis.RedisError as exc:
+            logging.warning(f"Idempotency store read failed: external_id={external_id}, exc={exc!r}")
+            return None
+        return json.loads(value) if value is not None else None
+
+    async def put(self, external_id: str, record: dict):
+        try:
+            conn = await redis_client.get_redis()
+            await conn.set(self._key(external_id), json.dumps(record), ex=settings.IDEMPOTENCY_TTL)
+        except redis.RedisError as exc:
+            logging.warning(f"Idempotency store write failed: external_id={external_id}, exc={exc!r}")
+
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,80 @@
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.core.utils import utc_now
+from app.db.session import SessionLocal
+from app.repository.ledger_repository import LedgerRepository
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CompactionStats:
+    checkpoints_chunks: int = 0
+    archived: int = 0
+    purged_keys: int = 0
+
+
+def latest_safe_cutoff() -> datetime:
+    """
+    Самый поздний допустимый cutoff контрольной точки. Операция получает createdAt до записи
+    и может зафиксироваться позже на время выполнения запроса (не дольше DB_STATEMENT_TIMEOUT);
+    контрольная точка на более поздний момент пропустила бы такие операции навсегда.
+    :raises ValueError: запас не превышает statement_timeout или statement_timeout выключен
+    """
+    if not 0 < settings.DB_STATEMENT_TIMEOUT < settings.LEDGER_CHECKPOINT_SAFETY_MARGIN:
+        raise ValueError("LEDGER_CHECKPOINT_SAFETY_MARGIN must exceed a non-zero DB_STATEMENT_TIMEOUT")
+    return utc_now() - timedelta(seconds=settings.LEDGER_CHECKPOINT_SAFETY_MARGIN)
+
+
+async def write_checkpoints(cutoff: datetime, chunk_size: int) -> int:
+    """
+    Записать контрольные точки балансов всех кошельков на cutoff. Запускается по расписанию
+    (например, на начало каждого месяца): запросы баланса на момент времени читают
+    операции только от ближайшей контрольной точки. Прерванный запуск продолжается
+    с места остановки, повторный ничего не меняет.
+    :return: число обработанных пачек
+    :raises ValueError: cutoff позже latest_safe_cutoff()
+    """
+    if cutoff > latest_safe_cutoff():
+        raise ValueError(f"cutoff must be at least {settings.LEDGER_CHECKPOINT_SAFETY_MARGIN:g}s in the past")
+    chunks = 0
+    async with SessionLocal() as session:
+        repository = LedgerRepository(session)
+        after = await repository.get_checkpoint_resume_point(cutoff)
+        created_at = utc_now()
+        while after is not None:
+            after = await repository.checkpoint_chunk(cutoff, after, chunk_size, created_at)
+            chunks += 1
+    logger.info("Ledger checkpoints written", extra={"cutoff": cutoff.isoformat()})
+    return chunks
+
+
+async def compact_ledger(cutoff: datetime, chunk_size: int, purge_keys: bool) -> CompactionStats:
+    """
+    Сжать журнал до cutoff: записать контрольные точки балансов всех кошельков на cutoff,
+    затем перенести операции старше cutoff в архив и (purge_keys) удалить ключи
+    идемпотентности старше cutoff. Повторная проверка дублей externalOperationId
+    после этого гарантирована только в пределах окна хранения.
+    Архивирование начинается только после контрольных точек для всех кошельков;
+    прерванный запуск продолжается с места остановки.
+    """
+    stats = CompactionStats()
+    stats.checkpoints_chunks = await write_checkpoints(cutoff, chunk_size)
+    async with SessionLocal() as session:
+        repository = LedgerRepository(session)
+        while True:
+            moved = await repository.archive_chunk(cutoff, chunk_size)
+            stats.archived += moved
+            if moved < chunk_size:
+                break
+
+        if purge_keys:
+            while True:
+                purged = await repository.purge_keys_chunk(cutoff, chunk_size)
+                stats.purged_keys += purged
+                if purged < chunk_size:
+                    break
+    return stats
@@ -0,0 +1,96 @@
+import csv
+import io
+import json
+import logging
+import time
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from app.core.config import settings
+from app.core.utils import as_utc
+from app.db.session import ReadSessionLocal
+from app.repository.wallet_repository import WalletRepository
+
+EXPORT_FORMATS = ("ndjson", "csv")
+EXPORT_COLUMNS = ["id", "walletId", "amount", "type", "reason", "externalOperationId", "traceId", "createdAt"]
+
+
+class ExportStats:
+    """
+    Счётчики выгрузки: количество строк и скорость (строк в секунду).
+    """
+    def __init__(self):
+        self.rows = 0
+        self.started = time.monotonic()
+        self.finished = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def _row_values(row) -> list:
+    return [
+        row.id,
+        row.walletId,
+        row.amount,
+        row.type.value,
+        row.reason,
+        row.externalOperationId,
+        row.traceId,
+        row.createdAt.isoformat(),
+    ]
+
+
+def _format_ndjson(rows) -> str:
+    return "".join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, _row_values(row))), ensure_ascii=False) + "\n" for row in rows
+    )
+
+
+def _format_csv(rows, header: bool) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(_row_values(row) for row in rows)
+    return buffer.getvalue()
+
+
+async def export_operations(
+    export_format: str,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    wallet_id: Optional[str] = None,
+    stats: Optional[ExportStats] = None,
+) -> AsyncIterator[str]:
+    """
+    Выгрузить журнал операций в NDJSON или CSV потоком текстовых чанков
+    (один чанк на пачку серверного курсора). Открывает собственную сессию
+    на реплике (если настроена), поэтому годится и для StreamingResponse, и для CLI.
+    Границы без часового пояса считаются UTC.
+    """
+    stats = stats or ExportStats()
+    async with ReadSessionLocal() as session:
+        repository = WalletRepository(session)
+        header = export_format == "csv"
+        async for rows in repository.stream_operations(
+            settings.LEDGER_EXPORT_BATCH_SIZE, as_utc(created_from), as_utc(created_to), wallet_id
+        ):
+            stats.rows += len(rows)
+            if export_format == "csv":
+                yield _format_csv(rows, header)
+                header = False
+            else:
+                yield _format_ndjson(rows)
+        if header:
+            yield _format_csv([], header)
+    stats.finished = time.monotonic()
+    logging.info(
+        f"Ledger export finished: format={export_format} rows={stats.rows} "
+        f"seconds={stats.elapsed:.2f} rows_per_second={stats.rows_per_second:.0f}"
+    )
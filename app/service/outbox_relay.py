@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from typing import Optional
+
+from app.core.config import settings
+from app.core.metrics import OUTBOX_LAG_SECONDS, OUTBOX_PENDING, OUTBOX_PUBLISHED
+from app.core.redis import redis_client
+from app.core.utils import utc_now
+from app.db.session import SessionLocal
+from app.repository.outbox_repository import OutboxRepository
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxRelay:
+    """
+    Фоновая публикация событий из wallet_outbox в Redis Stream.
+    События пачки публикуются одним pipeline XADD, затем удаляются из outbox
+    в той же транзакции, которая их заблокировала. Падение между публикацией
+    и фиксацией приводит к повторной публикации — доставка at-least-once;
+    потребители упорядочивают и отбрасывают повторы по (walletId, shard, version).
+    События суббалансов шардированного кошелька несут поле shard: их balance и version
+    относятся к суббалансу, а не ко всему кошельку.
+    """
+    def __init__(self, name: str, stream: str, batch_size: int, poll_interval: float, maxlen: int):
+        self.name = name
+        self.stream = stream
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.maxlen = maxlen
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> int:
+        """
+        Опубликовать одну пачку событий.
+        :return: число опубликованных событий
+        """
+        async with SessionLocal() as session:
+            repository = OutboxRepository(session)
+            events = await repository.fetch_batch(self.batch_size)
+            if events:
+                redis = await redis_client.get_redis()
+                async with redis.pipeline(transaction=False) as pipe:
+                    for event in events:
+                        fields = {
+                            "outboxId": event.id,
+                            "walletId": event.walletId,
+                            "userId": event.userId,
+                            "operationId": event.operationId,
+                            "delta": event.delta,
+                            "balance": event.balance,
+                            "version": event.version,
+                            "traceId": event.traceId,
+                            "createdAt": event.createdAt.isoformat(),
+                        }
+                        if event.shard is not None:
+                            fields["shard"] = event.shard
+                        pipe.xadd(self.stream, fields, maxlen=self.maxlen, approximate=True)
+                    await pipe.execute()
+                await repository.acknowledge(self.name, [event.id for event in events])
+                OUTBOX_PUBLISHED.inc(len(events))
+            pending, oldest = await repository.get_lag()
+            OUTBOX_PENDING.set(pending)
+            OUTBOX_LAG_SECONDS.set((utc_now() - oldest).total_seconds() if oldest else 0)
+            return len(events)
+
+    async def _run(self):
+        while True:
+            try:
+                published = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Outbox relay iteration failed")
+                published = 0
+            # Полная пачка — вероятно, есть ещё: продолжаем без паузы
+            if published < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+outbox_relay = OutboxRelay(
+    name="default",
+    stream=settings.OUTBOX_STREAM,
+    batch_size=settings.OUTBOX_BATCH_SIZE,
+    poll_interval=settings.OUTBOX_POLL_INTERVAL,
+    maxlen=settings.OUTBOX_STREAM_MAXLEN,
+)
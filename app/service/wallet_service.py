@@ -1,11 +1,117 @@
-from app.repository.wallet_repository import WalletRepository
-from app.db.models import WalletOperation, WalletOperationType
+import asyncio
+import base64
+import json
+import math
+import random
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from app.repository.wallet_repository import TRANSFER_KEY_PREFIX, WalletRepository, WalletSnapshot, PendingOperation
+from app.db.models import WalletOperationType
 from app.codes import Codes
-from uuid import uuid4
 
-from app.core.utils import get_timestamp
 from app.core.redis import redis_client
+from app.core.locks import wallet_loads, wallet_locks
+from app.service.group_commit import group_committer
+from app.service.idempotency import idempotency_store
 from app.core.config import settings
+from app.core.utils import as_utc
+from app.core.users import UsersUnavailableError
+from app.core.metrics import (
+    BALANCE_CACHE_DRIFT,
+    BALANCE_CACHE_RECONCILED,
+    BALANCE_CACHE_REQUESTS,
+    BALANCE_CACHE_ROUND_TRIPS,
+    BALANCE_CACHE_WARMED,
+    SVC_USERS_DEGRADED_CHECKS,
+)
+
+
+# Записать баланс, только если его версия новее закешированной.
+# KEYS[1] — баланс, KEYS[2] — версия; ARGV: баланс, версия, TTL для нового ключа.
+# У существующего ключа остаток TTL сохраняется (и переносится на ключ версии).
+SET_BALANCE_IF_NEWER_LUA = """
+local current = redis.call('GET', KEYS[2])
+if current and tonumber(current) >= tonumber(ARGV[2]) then
+    return 0
+end
+local pttl = redis.call('PTTL', KEYS[1])
+if pttl > 0 then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', pttl)
+    redis.call('SET', KEYS[2], ARGV[2], 'PX', pttl)
+else
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+    redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+end
+return 1
+"""
+
+# Досрочное обновление горячего ключа: записать баланс с полным TTL, если его версия
+# не старше закешированной; иначе только продлить TTL (значение в кеше новее).
+# KEYS/ARGV — как в SET_BALANCE_IF_NEWER_LUA.
+REFRESH_BALANCE_LUA = """
+local current = redis.call('GET', KEYS[2])
+if current and tonumber(current) > tonumber(ARGV[2]) then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    redis.call('EXPIRE', KEYS[2], ARGV[3])
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+# Тип записи перевода в хранилище идемпотентности (у операций журнала — WalletOperationType)
+TRANSFER_KIND = "TRANSFER"
+
+
+def _should_refresh_early(ttl_ms: int) -> bool:
+    """
+    Вероятностное досрочное обновление (XFetch): вероятность exp(-ttl / окно)
+    растёт к истечению ключа, поэтому горячий ключ обновляет один из запросов
+    до того, как все одновременно получат промах.
+    """
+    window = settings.REDIS_BALANCE_EARLY_REFRESH
+    if window <= 0 or ttl_ms < 0:
+        return False
+    return ttl_ms / 1000 <= -window * math.log(1.0 - random.random())
+
+
+def _encode_cursor(created_at: datetime, operation_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), operation_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """
+    :raises ValueError: курсор повреждён
+    """
+    padded = cursor + "=" * (-len(cursor) % 4)
+    created_at, operation_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    return as_utc(datetime.fromisoformat(created_at)), str(UUID(str(operation_id)))
+
+
+def _is_valid_operation(amount: int, external_id: str) -> bool:
+    """
+    Сумма положительна, а externalOperationId не занимает зарезервированное за переводами
+    пространство ключей: иначе клиентская операция сделала бы перевод вечным дублем.
+    """
+    return amount > 0 and not external_id.startswith(TRANSFER_KEY_PREFIX)
+
+
+def _operation_to_dict(operation) -> dict:
+    return {
+        "id": operation.id,
+        "amount": operation.amount,
+        "type": operation.type.value,
+        "reason": operation.reason,
+        "externalOperationId": operation.externalOperationId,
+        "traceId": operation.traceId,
+        "createdAt": operation.createdAt.isoformat(),
+    }
 
 
 class WalletService:
@@ -24,31 +130,153 @@ class WalletService:
     async def _get_balance_cache_key(self, user_id: str) -> str:
         return f"wallet_balance:{user_id}"
 
-    async def _get_balance_from_cache(self, user_id: str):
+    async def _get_balance_version_key(self, user_id: str) -> str:
+        return f"wallet_balance_version:{user_id}"
+
+    async def _get_balance_and_ttl_from_cache(self, user_id: str) -> Tuple[Optional[int], int]:
+        """
+        Баланс и оставшийся TTL ключа (мс) за один round trip.
+        """
         redis = await redis_client.get_redis()
         key = await self._get_balance_cache_key(user_id)
-        value = await redis.get(key)
-        return int(value) if value is not None else None
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.get(key)
+            pipe.pttl(key)
+            value, ttl = await pipe.execute()
+        BALANCE_CACHE_ROUND_TRIPS.labels("get").inc()
+        BALANCE_CACHE_REQUESTS.labels("hit" if value is not None else "miss").inc()
+        return (int(value) if value is not None else None), ttl
+
+    async def _refresh_balance_cache(self, user_id: str, balance: int, version: int):
+        script = await redis_client.get_script(REFRESH_BALANCE_LUA)
+        keys = [await self._get_balance_cache_key(user_id), await self._get_balance_version_key(user_id)]
+        await script(keys=keys, args=[balance, version, settings.REDIS_BALANCE_TTL])
+        BALANCE_CACHE_ROUND_TRIPS.labels("refresh").inc()
+
+    async def _load_wallet(self, user_id: str) -> Optional[WalletSnapshot]:
+        """
+        Прочитать кошелёк; одновременные чтения одного пользователя в процессе
+        выполняются одним запросом к БД (WALLET_READ_SINGLE_FLIGHT).
+        Результат — снимок, а не экземпляр Wallet: его получают запросы с чужими сессиями.
+        """
+        async def load():
+            wallet = await self.repository.get_wallet_by_user_id(user_id)
+            return WalletSnapshot.of(wallet) if wallet is not None else None
+
+        if not settings.WALLET_READ_SINGLE_FLIGHT:
+            return await load()
+        return await wallet_loads.do(user_id, load)
 
-    async def _set_balance_cache(self, user_id: str, balance: int, ttl: int = None):
+    async def _set_balance_cache(self, user_id: str, balance: int, version: int, ttl: int = None):
+        """
+        Записать баланс в кеш, если его версия новее закешированной (атомарно, Lua).
+        TTL существующего ключа сохраняется, новый ключ получает ttl.
+        """
+        script = await redis_client.get_script(SET_BALANCE_IF_NEWER_LUA)
+        if ttl is None:
+            ttl = settings.REDIS_BALANCE_TTL
+        keys = [await self._get_balance_cache_key(user_id), await self._get_balance_version_key(user_id)]
+        await script(keys=keys, args=[balance, version, ttl])
+        BALANCE_CACHE_ROUND_TRIPS.labels("set").inc()
+
+    async def _get_balances_from_cache(self, user_ids: List[str]) -> List:
+        if not user_ids:
+            return []
         redis = await redis_client.get_redis()
-        key = await self._get_balance_cache_key(user_id)
+        keys = [await self._get_balance_cache_key(user_id) for user_id in user_ids]
+        values = await redis.mget(keys)
+        BALANCE_CACHE_ROUND_TRIPS.labels("mget").inc()
+        hits = sum(1 for value in values if value is not None)
+        BALANCE_CACHE_REQUESTS.labels("hit").inc(hits)
+        BALANCE_CACHE_REQUESTS.labels("miss").inc(len(values) - hits)
+        return [int(value) if value is not None else None for value in values]
+
+    async def _set_balances_cache(self, balances: dict, ttl: int = None):
+        """
+        Записать несколько балансов одним pipeline.
+        :param balances: user_id -> (balance, version)
+        """
+        if not balances:
+            return
+        redis = await redis_client.get_redis()
+        script = await redis_client.get_script(SET_BALANCE_IF_NEWER_LUA)
         if ttl is None:
             ttl = settings.REDIS_BALANCE_TTL
-        await redis.set(key, balance, ex=ttl)
+        async with redis.pipeline(transaction=False) as pipe:
+            for user_id, (balance, version) in balances.items():
+                keys = [await self._get_balance_cache_key(user_id), await self._get_balance_version_key(user_id)]
+                await script(keys=keys, args=[balance, version, ttl], client=pipe)
+            await pipe.execute()
+        BALANCE_CACHE_ROUND_TRIPS.labels("pipeline").inc()
 
-    async def _incr_balance_cache(self, user_id: str, amount: int):
+    async def _delete_balance_cache(self, user_id: str):
         redis = await redis_client.get_redis()
-        key = await self._get_balance_cache_key(user_id)
-        # Get current TTL
-        ttl = await redis.ttl(key)
-        # If key exists, increment and preserve TTL
-        if ttl > 0:
-            await redis.incrby(key, amount)
-            await redis.expire(key, ttl)
-        else:
-            # If not exists, do not set TTL here (should be set on full recalculation)
-            pass
+        await redis.delete(await self._get_balance_cache_key(user_id), await self._get_balance_version_key(user_id))
+        BALANCE_CACHE_ROUND_TRIPS.labels("delete").inc()
+
+    async def _verify_user(self, user_id: str, degraded: bool = False) -> bool:
+        """
+        Проверить пользователя через verify_user_exists. Если svc-users недоступен,
+        а операция допускает degraded-режим (чтения и пополнения) и он включён
+        (SVC_USERS_DEGRADED_MODE), пользователь с существующим кошельком считается
+        подтверждённым: кошелёк создаётся только после успешной проверки.
+        :raises UsersUnavailableError: svc-users недоступен и запрос нельзя пропустить
+        """
+        try:
+            return await self.verify_user_exists(user_id)
+        except UsersUnavailableError as exc:
+            if not degraded:
+                raise
+            await self._degraded_wallet(user_id, exc)
+            return True
+
+    async def _degraded_wallet(self, user_id: str, error: UsersUnavailableError) -> WalletSnapshot:
+        """
+        Кошелёк пользователя, которого svc-users не смог проверить, — подтверждение в degraded-режиме.
+        :raises UsersUnavailableError: degraded-режим выключен или кошелька нет
+        """
+        wallet = await self._load_wallet(user_id) if settings.SVC_USERS_DEGRADED_MODE else None
+        if wallet is None:
+            raise error
+        SVC_USERS_DEGRADED_CHECKS.inc()
+        return wallet
+
+    async def _verify_users(self, user_ids: List[str]) -> List[str]:
+        """
+        Проверить многих пользователей, как _verify_user в degraded-режиме. Запросы к svc-users
+        идут параллельно; кошельки пользователей, которых svc-users не подтвердил из-за
+        недоступности, читаются затем одним запросом (AsyncSession не допускает параллельных запросов).
+        :return: подтверждённые пользователи в исходном порядке
+        :raises UsersUnavailableError: svc-users недоступен и запрос нельзя пропустить
+        """
+        checks = await asyncio.gather(*(self.verify_user_exists(user_id) for user_id in user_ids), return_exceptions=True)
+        unavailable = None
+        for check in checks:
+            if isinstance(check, UsersUnavailableError):
+                unavailable = unavailable or check
+            elif isinstance(check, BaseException):
+                raise check
+        if unavailable is None:
+            return [user_id for user_id, found in zip(user_ids, checks) if found]
+        unverified = [user_id for user_id, check in zip(user_ids, checks) if isinstance(check, UsersUnavailableError)]
+        if not settings.SVC_USERS_DEGRADED_MODE:
+            raise unavailable
+        with_wallet = {wallet.userId for wallet in await self.repository.get_wallets_by_user_ids(unverified)}
+        if len(with_wallet) < len(unverified):
+            raise unavailable
+        SVC_USERS_DEGRADED_CHECKS.inc(len(unverified))
+        return [user_id for user_id, check in zip(user_ids, checks) if user_id in with_wallet or check is True]
+
+    def _write_lock(self, user_id: str):
+        """
+        Локальная очередь записей по кошельку (WALLET_LOCAL_LOCKS_ENABLED).
+        Корректность обеспечивает блокировка строки кошелька в apply_operation;
+        локальная блокировка лишь не даёт запросам одного воркера ждать друг друга в БД
+        с занятым соединением из пула.
+        """
+        if settings.WALLET_LOCAL_LOCKS_ENABLED:
+            return wallet_locks.hold(user_id)
+        return nullcontext()
 
     async def create_wallet(self, user_id: str):
         """
@@ -61,91 +289,358 @@ class WalletService:
         if existing:
             return None, Codes.WALLET_ALREADY_EXISTS
         wallet = await self.repository.create_wallet(user_id)
-        balance = await self.repository.get_balance(wallet.id)
-        return {"id": wallet.id, "userId": wallet.userId, "balance": balance}, Codes.WALLET_CREATED
+        return {"id": wallet.id, "userId": wallet.userId, "balance": wallet.balance}, Codes.WALLET_CREATED
 
     async def get_wallet(self, user_id: str):
         """
         Получить кошелёк пользователя, если он и кошелёк существуют.
         :return: данные кошелька и код результата
         """
-        if not await self.verify_user_exists(user_id):
-            return None, Codes.USER_NOT_FOUND
-        wallet = await self.repository.get_wallet_by_user_id(user_id)
+        try:
+            if not await self.verify_user_exists(user_id):
+                return None, Codes.USER_NOT_FOUND
+            wallet = await self._load_wallet(user_id)
+        except UsersUnavailableError as exc:
+            # Кошелёк, подтвердивший пользователя в degraded-режиме, повторно не читается
+            wallet = await self._degraded_wallet(user_id, exc)
         if not wallet:
             return None, Codes.WALLET_NOT_FOUND
-        # Пробуем получить баланс из кеша
-        balance = await self._get_balance_from_cache(user_id)
+        if wallet.shards > 1:
+            # Шардированный кошелёк не кешируется: записи не обновляют общий ключ баланса
+            balance = await self.repository.get_balance(wallet.id)
+            return {"id": wallet.id, "userId": wallet.userId, "balance": balance}, Codes.WALLET_FETCHED_OK
+        # Пробуем получить баланс из кеша; ключ, близкий к истечению, иногда обновляем заранее
+        balance, ttl = await self._get_balance_and_ttl_from_cache(user_id)
         if balance is not None:
+            if _should_refresh_early(ttl):
+                await self._refresh_balance_cache(user_id, wallet.balance, wallet.version)
             return {"id": wallet.id, "userId": wallet.userId, "balance": balance}, Codes.WALLET_FETCHED_OK
-        # Если нет в кеше — пересчитываем, возвращаем и кладём в кеш
-        balance = await self.repository.get_balance(wallet.id)
-        await self._set_balance_cache(user_id, balance)
+        # Если нет в кеше — берём сохранённый баланс (промах не стоит дополнительного запроса к БД),
+        # возвращаем и кладём в кеш
+        balance = wallet.balance
+        await self._set_balance_cache(user_id, balance, wallet.version)
         return {"id": wallet.id, "userId": wallet.userId, "balance": balance}, Codes.WALLET_FETCHED_OK
 
+    async def get_wallets(self, user_ids: List[str]):
+        """
+        Получить кошельки многих пользователей за фиксированное число обращений:
+        один MGET по ключам баланса и один запрос WHERE userId IN (...) выполняются
+        параллельно; промахи кеша берут сохранённый баланс из того же запроса
+        и записываются обратно в Redis одним pipeline. Балансы шардированных
+        кошельков собираются одним дополнительным запросом и не кешируются.
+        :return: список данных кошельков с кодом по каждому пользователю и код результата
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids or len(user_ids) > settings.WALLET_BULK_READ_MAX_SIZE:
+            return None, Codes.INVALID_REQUEST
+        known = await self._verify_users(user_ids)
+        cached, wallets = await asyncio.gather(
+            self._get_balances_from_cache(known),
+            self.repository.get_wallets_by_user_ids(known),
+        )
+        cached = dict(zip(known, cached))
+        wallets = {wallet.userId: wallet for wallet in wallets}
+        sharded = await self.repository.get_balances([wallet.id for wallet in wallets.values() if wallet.shards > 1])
+
+        results, misses = [], {}
+        for user_id in user_ids:
+            wallet = wallets.get(user_id)
+            if user_id not in cached:
+                results.append({"id": None, "userId": user_id, "balance": None, "code": Codes.USER_NOT_FOUND.value})
+                continue
+            if wallet is None:
+                results.append({"id": None, "userId": user_id, "balance": None, "code": Codes.WALLET_NOT_FOUND.value})
+                continue
+            balance = cached[user_id]
+            if wallet.shards > 1:
+                balance = sharded.get(wallet.id, wallet.balance)
+            elif balance is None:
+                balance = wallet.balance
+                misses[user_id] = (balance, wallet.version)
+            results.append({"id": wallet.id, "userId": user_id, "balance": balance, "code": Codes.WALLET_FETCHED_OK.value})
+        await self._set_balances_cache(misses)
+        return results, Codes.WALLET_FETCHED_OK
+
+    async def get_balances_at(self, user_ids: List[str], at: datetime):
+        """
+        Получить балансы кошельков пользователей на момент at по истории операций
+        (контрольная точка + операции после неё, см. WalletRepository.get_balances_at).
+        Время без часового пояса считается UTC. Кошелёк, созданный после at, имеет баланс 0.
+        :return: список {"id", "userId", "balance", "at", "code"} по каждому пользователю и код результата
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids or len(user_ids) > settings.WALLET_BALANCE_AT_MAX_SIZE:
+            return None, Codes.INVALID_REQUEST
+        if at.tzinfo is None:
+            at = at.replace(tzinfo=timezone.utc)
+        known = set(await self._verify_users(user_ids))
+        wallets = await self.repository.get_wallets_by_user_ids(list(known))
+        wallets = {wallet.userId: wallet for wallet in wallets}
+        balances = await self.repository.get_balances_at([wallet.id for wallet in wallets.values()], at)
+
+        results = []
+        for user_id in user_ids:
+            wallet = wallets.get(user_id)
+            if user_id not in known:
+                code = Codes.USER_NOT_FOUND
+            elif wallet is None:
+                code = Codes.WALLET_NOT_FOUND
+            else:
+                results.append({
+                    "id": wallet.id, "userId": user_id, "balance": balances.get(wallet.id, 0),
+                    "at": at.isoformat(), "code": Codes.WALLET_FETCHED_OK.value,
+                })
+                continue
+            results.append({"id": None, "userId": user_id, "balance": None, "at": at.isoformat(), "code": code.value})
+        return results, Codes.WALLET_FETCHED_OK
+
+    async def get_balance_at(self, user_id: str, at: datetime):
+        """
+        Получить баланс кошелька пользователя на момент at (см. get_balances_at).
+        :return: {"id", "userId", "balance", "at"} и код результата
+        """
+        results, code = await self.get_balances_at([user_id], at)
+        if code != Codes.WALLET_FETCHED_OK:
+            return None, code
+        result = results[0]
+        code = Codes(result.pop("code"))
+        if code != Codes.WALLET_FETCHED_OK:
+            return None, code
+        return result, code
+
+    async def get_operations(
+        self,
+        user_id: str,
+        limit: int,
+        cursor: Optional[str] = None,
+        operation_type: Optional[WalletOperationType] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ):
+        """
+        Получить страницу истории операций кошелька пользователя (от новых к старым).
+        Границы from/to без часового пояса считаются UTC.
+        :param cursor: nextCursor из предыдущей страницы
+        :return: {"items": [...], "nextCursor": str | None} и код результата
+        """
+        if limit <= 0 or limit > settings.OPERATIONS_PAGE_MAX_SIZE:
+            return None, Codes.INVALID_REQUEST
+        after = None
+        if cursor:
+            try:
+                after = _decode_cursor(cursor)
+            except (ValueError, TypeError):
+                return None, Codes.INVALID_REQUEST
+        if not await self._verify_user(user_id, degraded=True):
+            return None, Codes.USER_NOT_FOUND
+        wallet = await self.repository.get_wallet_by_user_id(user_id)
+        if not wallet:
+            return None, Codes.WALLET_NOT_FOUND
+        operations = await self.repository.list_operations(
+            wallet.id, limit + 1, after, operation_type, as_utc(created_from), as_utc(created_to)
+        )
+        next_cursor = None
+        if len(operations) > limit:
+            operations = operations[:limit]
+            last = operations[-1]
+            next_cursor = _encode_cursor(last.createdAt, last.id)
+        return {
+            "items": [_operation_to_dict(operation) for operation in operations],
+            "nextCursor": next_cursor,
+        }, Codes.WALLET_OPERATIONS_FETCHED_OK
+
+    async def _apply(self, operation: PendingOperation):
+        """
+        Провести одну операцию: через групповую фиксацию (GROUP_COMMIT_ENABLED)
+        или отдельным statement. Для пополнения отсутствующий кошелёк создаётся.
+        :return: OperationOutcome
+        """
+        if settings.GROUP_COMMIT_ENABLED:
+            return await group_committer.submit(operation)
+        async with self._write_lock(operation.user_id):
+            outcome = await self.repository.apply_operation(*operation)
+            if operation.amount > 0 and not outcome.applied and not outcome.duplicate and outcome.wallet_id is None:
+                await self.repository.ensure_wallet(operation.user_id)
+                outcome = await self.repository.apply_operation(*operation)
+        return outcome
+
+    async def _replay(self, user_id: str, kind: str, external_id: str):
+        """
+        Ответ на повтор операции из хранилища идемпотентности (без svc-users и БД).
+        :param kind: тип операции (WalletOperationType.value или TRANSFER_KIND)
+        :return: (data, code) или None, если запись не найдена
+        """
+        if not settings.IDEMPOTENCY_STORE_ENABLED:
+            return None
+        record = await idempotency_store.get(external_id)
+        if record is None:
+            return None
+        if (
+            settings.IDEMPOTENCY_REPLAY_ORIGINAL
+            and record["userId"] == user_id
+            and record["type"] == kind
+        ):
+            return record["data"], Codes(record["code"])
+        return None, Codes.WALLET_OPERATION_DUPLICATE
+
+    async def _remember(self, user_id: str, kind: str, external_id: str, data: dict, code: Codes):
+        if settings.IDEMPOTENCY_STORE_ENABLED:
+            await idempotency_store.put(
+                external_id, {"userId": user_id, "type": kind, "data": data, "code": code.value}
+            )
+
     async def deposit(self, user_id: str, amount: int, external_id: str, reason: str, trace_id: str):
         """
         Пополнить баланс кошелька пользователя. Создаёт кошелёк при необходимости.
         Проверяет дублирование операции и корректность суммы.
         :return: новые данные кошелька и код результата
         """
-        if amount <= 0:
+        if not _is_valid_operation(amount, external_id):
             return None, Codes.INVALID_REQUEST
-        if not await self.verify_user_exists(user_id):
+        replayed = await self._replay(user_id, WalletOperationType.DEPOSIT.value, external_id)
+        if replayed is not None:
+            return replayed
+        if not await self._verify_user(user_id, degraded=True):
             return None, Codes.USER_NOT_FOUND
-        wallet = await self.repository.get_wallet_by_user_id(user_id)
-        if not wallet:
-            wallet = await self.repository.create_wallet(user_id)
-        if await self.repository.get_operation_by_external_id(external_id):
-            return None, Codes.WALLET_OPERATION_DUPLICATE
-        operation = WalletOperation(
-            id=str(uuid4()),
-            walletId=wallet.id,
-            amount=amount,
-            type=WalletOperationType.DEPOSIT.value,
-            reason=reason,
-            externalOperationId=external_id,
-            traceId=trace_id or "",
-            createdAt=get_timestamp()
+        outcome = await self._apply(
+            PendingOperation(user_id, amount, WalletOperationType.DEPOSIT, external_id, reason, trace_id)
         )
-        await self.repository.add_operation(operation)
-        # Инкрементируем кеш баланса, TTL не сбрасываем
-        await self._incr_balance_cache(user_id, amount)
-        balance = await self.repository.get_balance(wallet.id)
-        return {"id": wallet.id, "userId": wallet.userId, "balance": balance}, Codes.WALLET_DEPOSIT_OK
+        if not outcome.applied:
+            if outcome.duplicate:
+                return None, Codes.WALLET_OPERATION_DUPLICATE
+            return None, Codes.WALLET_NOT_FOUND
+        # Обновляем кеш баланса значением из записи, TTL не сбрасываем
+        if not outcome.sharded:
+            await self._set_balance_cache(user_id, outcome.balance, outcome.version)
+        data = {"id": outcome.wallet_id, "userId": user_id, "balance": outcome.balance}
+        await self._remember(user_id, WalletOperationType.DEPOSIT.value, external_id, data, Codes.WALLET_DEPOSIT_OK)
+        return data, Codes.WALLET_DEPOSIT_OK
 
     async def withdraw(self, user_id: str, amount: int, external_id: str, reason: str, trace_id: str):
         """
         Списать средства с кошелька пользователя. Проверяет баланс, дублирование операции и корректность суммы.
         :return: новые данные кошелька и код результата
         """
-        if amount <= 0:
+        if not _is_valid_operation(amount, external_id):
             return None, Codes.INVALID_REQUEST
+        replayed = await self._replay(user_id, WalletOperationType.WITHDRAW.value, external_id)
+        if replayed is not None:
+            return replayed
         if not await self.verify_user_exists(user_id):
             return None, Codes.USER_NOT_FOUND
-        wallet = await self.repository.get_wallet_by_user_id(user_id)
-        if not wallet:
-            return None, Codes.WALLET_NOT_FOUND
-        if await self.repository.get_operation_by_external_id(external_id):
-            return None, Codes.WALLET_OPERATION_DUPLICATE
-        balance = await self.repository.get_balance(wallet.id)
-        if balance < amount:
-            return None, Codes.WALLET_INSUFFICIENT_FUNDS
-        operation = WalletOperation(
-            id=str(uuid4()),
-            walletId=wallet.id,
-            amount=-amount,
-            type=WalletOperationType.WITHDRAW.value,
-            reason=reason,
-            externalOperationId=external_id,
-            traceId=trace_id or "",
-            createdAt=get_timestamp()
+        outcome = await self._apply(
+            PendingOperation(user_id, -amount, WalletOperationType.WITHDRAW, external_id, reason, trace_id)
         )
-        await self.repository.add_operation(operation)
-        # Декрементируем кеш баланса, TTL не сбрасываем
-        await self._incr_balance_cache(user_id, -amount)
-        balance = await self.repository.get_balance(wallet.id)
-        return {"id": wallet.id, "userId": wallet.userId, "balance": balance}, Codes.WALLET_WITHDRAW_OK
+        if not outcome.applied:
+            if outcome.duplicate:
+                return None, Codes.WALLET_OPERATION_DUPLICATE
+            if outcome.wallet_id is None:
+                return None, Codes.WALLET_NOT_FOUND
+            return None, Codes.WALLET_INSUFFICIENT_FUNDS
+        # Обновляем кеш баланса значением из записи, TTL не сбрасываем
+        if not outcome.sharded:
+            await self._set_balance_cache(user_id, outcome.balance, outcome.version)
+        data = {"id": outcome.wallet_id, "userId": user_id, "balance": outcome.balance}
+        await self._remember(user_id, WalletOperationType.WITHDRAW.value, external_id, data, Codes.WALLET_WITHDRAW_OK)
+        return data, Codes.WALLET_WITHDRAW_OK
+
+    async def transfer(self, from_user_id: str, to_user_id: str, amount: int, transfer_id: str, reason: str, trace_id: str):
+        """
+        Перевести средства между кошельками пользователей одной транзакцией
+        (см. WalletRepository.transfer). Кошелёк получателя создаётся при необходимости,
+        как при пополнении. Балансы обоих кошельков записываются в кеш одним pipeline.
+        :return: данные перевода и код результата; при USER_NOT_FOUND / WALLET_NOT_FOUND
+                 data = {"userId": ...} указывает, какого пользователя или кошелька нет
+        """
+        if amount <= 0 or from_user_id == to_user_id:
+            return None, Codes.INVALID_REQUEST
+        replay_key = f"{TRANSFER_KEY_PREFIX}{transfer_id}"
+        replayed = await self._replay(from_user_id, TRANSFER_KIND, replay_key)
+        if replayed is not None:
+            return replayed
+        exists = await asyncio.gather(self.verify_user_exists(from_user_id), self.verify_user_exists(to_user_id))
+        for user_id, found in zip((from_user_id, to_user_id), exists):
+            if not found:
+                return {"userId": user_id}, Codes.USER_NOT_FOUND
+        outcome = await self.repository.transfer(from_user_id, to_user_id, amount, transfer_id, reason, trace_id)
+        if outcome.debit.wallet_id is not None and outcome.credit.wallet_id is None and not outcome.debit.duplicate:
+            await self.repository.ensure_wallet(to_user_id)
+            outcome = await self.repository.transfer(from_user_id, to_user_id, amount, transfer_id, reason, trace_id)
+        debit, credit = outcome
+        if not debit.applied:
+            if debit.duplicate:
+                return None, Codes.WALLET_OPERATION_DUPLICATE
+            if debit.wallet_id is None:
+                return {"userId": from_user_id}, Codes.WALLET_NOT_FOUND
+            if credit.wallet_id is None:
+                return {"userId": to_user_id}, Codes.WALLET_NOT_FOUND
+            return None, Codes.WALLET_INSUFFICIENT_FUNDS
+        # Шардированные кошельки не кешируются, остальные обновляются по версии, TTL не сбрасываем
+        await self._set_balances_cache({
+            user_id: (side.balance, side.version)
+            for user_id, side in ((from_user_id, debit), (to_user_id, credit))
+            if not side.sharded
+        })
+        data = {
+            "transferId": transfer_id,
+            "amount": amount,
+            "from": {"id": debit.wallet_id, "userId": from_user_id, "balance": debit.balance},
+            "to": {"id": credit.wallet_id, "userId": to_user_id, "balance": credit.balance},
+        }
+        await self._remember(from_user_id, TRANSFER_KIND, replay_key, data, Codes.WALLET_TRANSFER_OK)
+        return data, Codes.WALLET_TRANSFER_OK
+
+    async def apply_batch(self, operations: List[Tuple[str, WalletOperationType, int, str, str]], trace_id: str):
+        """
+        Провести пачку пополнений и списаний по многим пользователям.
+        Каждая операция — (user_id, тип, сумма, external_id, reason).
+        Пачка делится на транзакции по WALLET_BATCH_CHUNK_SIZE операций.
+        :return: список результатов по каждой операции и код результата
+        """
+        if not operations or len(operations) > settings.WALLET_BATCH_MAX_SIZE:
+            return None, Codes.INVALID_REQUEST
+        user_ids = list({user_id for user_id, *_ in operations})
+        exists = await asyncio.gather(*(self.verify_user_exists(user_id) for user_id in user_ids))
+        known_users = {user_id for user_id, found in zip(user_ids, exists) if found}
+
+        results = [None] * len(operations)
+        pending, positions = [], []
+        for index, (user_id, operation_type, amount, external_id, reason) in enumerate(operations):
+            item = {"userId": user_id, "externalOperationId": external_id, "walletId": None, "balance": None}
+            results[index] = item
+            if not _is_valid_operation(amount, external_id):
+                item["code"] = Codes.INVALID_REQUEST.value
+                continue
+            if user_id not in known_users:
+                item["code"] = Codes.USER_NOT_FOUND.value
+                continue
+            signed = amount if operation_type == WalletOperationType.DEPOSIT else -amount
+            pending.append(PendingOperation(user_id, signed, operation_type, external_id, reason))
+            positions.append(index)
+
+        latest = {}
+        chunk_size = settings.WALLET_BATCH_CHUNK_SIZE
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            outcomes = await self.repository.apply_operations_batch(chunk, trace_id)
+            for op, index, outcome in zip(chunk, positions[start:start + chunk_size], outcomes):
+                item = results[index]
+                item["walletId"] = outcome.wallet_id
+                if outcome.applied:
+                    item["balance"] = outcome.balance
+                    item["code"] = (
+                        Codes.WALLET_DEPOSIT_OK if op.amount > 0 else Codes.WALLET_WITHDRAW_OK
+                    ).value
+                    if not outcome.sharded:
+                        latest[op.user_id] = (outcome.balance, outcome.version)
+                elif outcome.duplicate:
+                    item["code"] = Codes.WALLET_OPERATION_DUPLICATE.value
+                elif outcome.wallet_id is None:
+                    item["code"] = Codes.WALLET_NOT_FOUND.value
+                else:
+                    item["code"] = Codes.WALLET_INSUFFICIENT_FUNDS.value
+        await self._set_balances_cache(latest)
+        return results, Codes.WALLET_BATCH_PROCESSED
 
     async def delete_wallet(self, user_id: str):
         """
@@ -157,8 +652,85 @@ class WalletService:
         wallet = await self.repository.get_wallet_by_user_id(user_id)
         if not wallet:
             return None, Codes.WALLET_NOT_FOUND
-        balance = await self.repository.get_balance(wallet.id)
+        balance = wallet.balance if wallet.shards <= 1 else await self.repository.get_balance(wallet.id)
         if balance != 0:
             return None, Codes.WALLET_NOT_EMPTY
         await self.repository.delete_wallet(wallet)
+        await self._delete_balance_cache(user_id)
         return None, Codes.WALLET_DELETED
+
+    async def warm_balance_cache(self, since: datetime, limit: int, batch_size: int) -> int:
+        """
+        Заполнить кеш балансами кошельков, активных после since (после рестарта или
+        failover Redis), пачками по batch_size ключей в одном pipeline.
+        Запись защищена версией, поэтому не затирает более свежие значения.
+        :return: число записанных балансов
+        """
+        wallets = await self.repository.get_recently_active_wallets(since, limit)
+        for start in range(0, len(wallets), batch_size):
+            chunk = wallets[start:start + batch_size]
+            await self._set_balances_cache({user_id: (balance, version) for user_id, balance, version in chunk})
+            BALANCE_CACHE_WARMED.inc(len(chunk))
+        return len(wallets)
+
+    async def reconcile_balance_cache(self, user_ids: List[str]) -> dict:
+        """
+        Сверить закешированные балансы с БД и исправить расхождения:
+        stale — версия в кеше старше сохранённой (например, не прошла запись в кеш после операции
+        или она ещё в пути), записывается защищённым версией скриптом;
+        mismatch — версии совпадают, а балансы нет, значение перезаписывается;
+        orphan — кошелька нет или он шардированный, ключ удаляется.
+        Версия в кеше новее прочитанной из БД (реплика отстаёт) — не расхождение.
+        :return: число исправлений по видам
+        """
+        if not user_ids:
+            return {}
+        redis = await redis_client.get_redis()
+        keys = [await self._get_balance_cache_key(user_id) for user_id in user_ids]
+        keys += [await self._get_balance_version_key(user_id) for user_id in user_ids]
+        values, wallets = await asyncio.gather(
+            redis.mget(keys),
+            self.repository.get_wallets_by_user_ids(user_ids),
+        )
+        BALANCE_CACHE_ROUND_TRIPS.labels("mget").inc()
+        BALANCE_CACHE_RECONCILED.inc(len(user_ids))
+        wallets = {wallet.userId: wallet for wallet in wallets}
+
+        stale, found = {}, {"stale": 0, "mismatch": 0, "orphan": 0}
+        for user_id, balance, version in zip(user_ids, values[:len(user_ids)], values[len(user_ids):]):
+            if balance is None:
+                continue
+            wallet = wallets.get(user_id)
+            if wallet is None or wallet.shards > 1:
+                found["orphan"] += 1
+                await self._delete_balance_cache(user_id)
+            elif version is None or int(version) < wallet.version:
+                found["stale"] += 1
+                stale[user_id] = (wallet.balance, wallet.version)
+            elif int(version) == wallet.version and int(balance) != wallet.balance:
+                found["mismatch"] += 1
+                await self._refresh_balance_cache(user_id, wallet.balance, wallet.version)
+        await self._set_balances_cache(stale)
+        for kind, count in found.items():
+            if count:
+                BALANCE_CACHE_DRIFT.labels(kind).inc(count)
+        return found
+
+    async def set_wallet_shards(self, user_id: str, shards: int):
+        """
+        Служебная операция: разделить баланс «горячего» кошелька на shards суббалансов
+        (1 — вернуть обычный режим). Проверка пользователя в svc-users не выполняется.
+        Ключ баланса в кеше удаляется: шардированный кошелёк не кешируется,
+        а после возврата в обычный режим кеш заполняется заново.
+        :return: данные кошелька и код результата
+        """
+        if shards < 1 or shards > settings.WALLET_MAX_SHARDS:
+            return None, Codes.INVALID_REQUEST
+        wallet = await self.repository.get_wallet_by_user_id(user_id)
+        if not wallet:
+            return None, Codes.WALLET_NOT_FOUND
+        balance = await self.repository.set_wallet_shards(user_id, shards)
+        if balance is None:
+            return None, Codes.WALLET_NOT_FOUND
+        await self._delete_balance_cache(user_id)
+        return {"id": wallet.id, "userId": user_id, "balance": balance, "shards": shards}, Codes.WALLET_FETCHED_OK
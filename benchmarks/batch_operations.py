@@ -0,0 +1,55 @@
+"""
+Пропускная способность пакетных операций против поштучных.
+
+Один и тот же объём пополнений проводится двумя способами: отдельными
+POST /wallets/{userId}/deposit и пакетами POST /wallets/operations:batch.
+Сравнивать стоит items_per_second.
+
+Запуск: ``python -m benchmarks.batch_operations --users <uuid>,<uuid>,... --batch-size 100``
+"""
+import asyncio
+
+from benchmarks.common import (
+    add_users_argument, base_parser, ensure_wallets, make_client, operation_id, parse_users, run_load,
+)
+
+
+async def main(args) -> int:
+    users = parse_users(args.users, 1)
+    async with make_client(args.base_url, args.concurrency) as client:
+        await ensure_wallets(client, users)
+
+        def single(index: int):
+            return client.post(
+                f"/wallets/{users[index % len(users)]}/deposit",
+                json={"amount": 1, "externalOperationId": operation_id(), "reason": "benchmark"},
+            )
+
+        def batch(index: int):
+            operations = [
+                {
+                    "userId": users[(index * args.batch_size + offset) % len(users)],
+                    "type": "DEPOSIT",
+                    "amount": 1,
+                    "externalOperationId": operation_id(),
+                    "reason": "benchmark",
+                }
+                for offset in range(args.batch_size)
+            ]
+            return client.post("/wallets/operations:batch", json={"operations": operations})
+
+        items = args.requests
+        single_result = await run_load("single", single, items, args.concurrency)
+        batch_result = await run_load("batch", batch, max(1, items // args.batch_size), args.concurrency)
+    print(single_result.report())
+    print(batch_result.report(args.batch_size))
+    if single_result.rps:
+        print(f"speedup={batch_result.rps * args.batch_size / single_result.rps:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = base_parser("batch vs single deposit throughput")
+    add_users_argument(parser, 1)
+    parser.add_argument("--batch-size", type=int, default=100, help="операций в одном пакете")
+    raise SystemExit(asyncio.run(main(parser.parse_args())))
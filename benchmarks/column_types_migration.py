@@ -0,0 +1,211 @@
+"""
+Отчёт о переходе на нативные типы (ревизии c9e4f1a7b3d2 и d0a5b8e2c6f4) на сгенерированных данных.
+
+Сценарий поднимает ПУСТУЮ базу из --database-url до ревизии перед переходом, заполняет её
+(--wallets кошельков, --rows операций в текущем месяце), измеряет размеры таблиц и индексов
+и латентность get_balance, затем по очереди применяет обе ревизии с замером времени и
+повторяет измерения. Базу сервиса указывать нельзя: сценарий отказывается работать
+с базой, в которой уже есть таблица wallets (кроме повторного запуска с --skip-generate
+на базе, оставшейся после прогона до ревизии перед переходом).
+
+Запуск: ``python -m benchmarks.column_types_migration --database-url postgresql+psycopg://.../bench --rows 50000000``
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from typing import Dict, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+BEFORE_REVISION = "a6c0e2d84b19"
+EXPAND_REVISION = "c9e4f1a7b3d2"
+SWAP_REVISION = "d0a5b8e2c6f4"
+
+TABLES = ("wallets", "wallet_operations", "wallet_operation_keys")
+
+GENERATE_WALLETS_SQL = '''
+INSERT INTO wallets (id, "userId", balance)
+SELECT gen_random_uuid()::text, gen_random_uuid()::text, 0 FROM generate_series(1, :count)
+'''
+
+NUMBER_WALLETS_SQL = '''
+CREATE UNLOGGED TABLE bench_wallet_numbers AS
+SELECT row_number() OVER () AS n, id FROM wallets
+'''
+
+# Операции и ключи идемпотентности одной пачкой; createdAt — с начала текущего месяца по UTC
+# (границы партиций — полночь UTC) до текущего момента, чтобы попасть в партицию, созданную миграцией
+GENERATE_OPERATIONS_SQL = '''
+WITH generated AS (
+    SELECT gen_random_uuid()::text AS id, 1 + floor(random() * :wallets)::bigint AS n
+    FROM generate_series(1, :count)
+), inserted AS (
+    INSERT INTO wallet_operations (id, "walletId", amount, type, reason, "externalOperationId", "traceId", "createdAt")
+    SELECT generated.id, numbers.id, 1 + floor(random() * 1000)::int, 'DEPOSIT', 'benchmark', generated.id,
+           md5(generated.id), month.start + random() * (now() - month.start)
+    FROM generated JOIN bench_wallet_numbers numbers USING (n)
+    CROSS JOIN (SELECT date_trunc('month', now() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' AS start) month
+    RETURNING id, "externalOperationId", "createdAt"
+)
+INSERT INTO wallet_operation_keys ("externalOperationId", "operationId", "createdAt")
+SELECT "externalOperationId", id, "createdAt" FROM inserted
+'''
+
+MATERIALIZE_BALANCES_SQL = '''
+UPDATE wallets SET balance = totals.total
+FROM (SELECT "walletId", sum(amount) AS total FROM wallet_operations GROUP BY "walletId") totals
+WHERE wallets.id = totals."walletId"
+'''
+
+# Размер партиционированной таблицы — сумма по партициям
+RELATION_SIZE_SQL = '''
+SELECT coalesce(sum(pg_table_size(c.oid)), 0), coalesce(sum(pg_indexes_size(c.oid)), 0)
+FROM pg_class c
+WHERE c.oid = CAST(:name AS regclass)
+   OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = CAST(:name AS regclass))
+'''
+
+SAMPLE_WALLETS_SQL = 'SELECT id::text FROM wallets ORDER BY random() LIMIT :limit'
+
+# До d0a5b8e2c6f4 идентификаторы — varchar, после — uuid: параметр запроса передаётся в типе колонки
+WALLET_ID_TYPE_SQL = '''
+SELECT data_type FROM information_schema.columns
+WHERE table_schema = current_schema() AND table_name = 'wallets' AND column_name = 'id'
+'''
+
+# То же, что WalletRepository.get_balance
+GET_BALANCE_SQL = '''
+SELECT wallets.balance + coalesce(
+    (SELECT sum(wallet_balance_shards.balance) FROM wallet_balance_shards WHERE wallet_balance_shards."walletId" = wallets.id), 0
+)
+FROM wallets WHERE wallets.id = :wallet_id
+'''
+
+# Баланс по истории одного кошелька: сравнение по "walletId" и чтение amount
+HISTORY_SUM_SQL = 'SELECT coalesce(sum(amount), 0) FROM wallet_operations WHERE "walletId" = :wallet_id'
+
+
+def alembic_upgrade(database_url: str, revision: str) -> float:
+    """
+    Применить миграции до revision отдельным процессом (alembic/env.py берёт адрес из DATABASE_URL).
+    :return: длительность в секундах
+    """
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", revision],
+        env={**os.environ, "DATABASE_URL": database_url},
+        check=True,
+    )
+    return time.perf_counter() - started
+
+
+async def execute(engine: AsyncEngine, statement: str, **params) -> float:
+    started = time.perf_counter()
+    async with engine.connect() as connection:
+        await connection.execute(text(statement), params)
+    return time.perf_counter() - started
+
+
+async def has_wallets_table(engine: AsyncEngine) -> bool:
+    async with engine.connect() as connection:
+        return (await connection.execute(text("SELECT to_regclass('wallets') IS NOT NULL"))).scalar()
+
+
+async def generate(engine: AsyncEngine, wallets: int, rows: int, chunk: int):
+    await execute(engine, GENERATE_WALLETS_SQL, count=wallets)
+    await execute(engine, NUMBER_WALLETS_SQL)
+    await execute(engine, "CREATE UNIQUE INDEX ON bench_wallet_numbers (n)")
+    done = 0
+    started = time.perf_counter()
+    while done < rows:
+        count = min(chunk, rows - done)
+        await execute(engine, GENERATE_OPERATIONS_SQL, wallets=wallets, count=count)
+        done += count
+        print(f"generated rows={done} seconds={time.perf_counter() - started:.0f}", file=sys.stderr)
+    await execute(engine, MATERIALIZE_BALANCES_SQL)
+    await execute(engine, "DROP TABLE bench_wallet_numbers")
+
+
+async def measure(engine: AsyncEngine, samples: int) -> Dict[str, object]:
+    await execute(engine, "VACUUM ANALYZE")
+    result: Dict[str, object] = {}
+    async with engine.connect() as connection:
+        for table in TABLES:
+            size = (await connection.execute(text(RELATION_SIZE_SQL), {"name": table})).one()
+            result[table] = (size[0], size[1])
+        wallet_ids = (await connection.execute(text(SAMPLE_WALLETS_SQL), {"limit": samples})).scalars().all()
+        if (await connection.execute(text(WALLET_ID_TYPE_SQL))).scalar() == "uuid":
+            wallet_ids = [uuid.UUID(wallet_id) for wallet_id in wallet_ids]
+        for name, statement in (("get_balance", GET_BALANCE_SQL), ("history_sum", HISTORY_SUM_SQL)):
+            # Прогрев кеша страниц и плана запроса
+            for wallet_id in wallet_ids[:50]:
+                await connection.execute(text(statement), {"wallet_id": wallet_id})
+            latencies: List[float] = []
+            for wallet_id in random.sample(wallet_ids, len(wallet_ids)):
+                started = time.perf_counter()
+                await connection.execute(text(statement), {"wallet_id": wallet_id})
+                latencies.append(time.perf_counter() - started)
+            latencies.sort()
+            result[name] = (latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))])
+    return result
+
+
+def megabytes(value: int) -> str:
+    return f"{value / 1024 / 1024:.0f}MB"
+
+
+def print_report(before: Dict[str, object], after: Dict[str, object], timings: List[Tuple[str, float]]):
+    for table in TABLES:
+        (table_before, index_before), (table_after, index_after) = before[table], after[table]
+        print(
+            f"{table}: table {megabytes(table_before)} -> {megabytes(table_after)}, "
+            f"indexes {megabytes(index_before)} -> {megabytes(index_after)}"
+        )
+    for name in ("get_balance", "history_sum"):
+        (p50_before, p99_before), (p50_after, p99_after) = before[name], after[name]
+        print(
+            f"{name}: p50_ms {p50_before * 1000:.3f} -> {p50_after * 1000:.3f}, "
+            f"p99_ms {p99_before * 1000:.3f} -> {p99_after * 1000:.3f}"
+        )
+    for name, seconds in timings:
+        print(f"{name}: seconds={seconds:.1f}")
+
+
+async def main(args) -> int:
+    engine = create_async_engine(args.database_url, isolation_level="AUTOCOMMIT")
+    try:
+        if not args.skip_generate:
+            if await has_wallets_table(engine):
+                print("database is not empty: use a scratch database or --skip-generate", file=sys.stderr)
+                return 1
+            alembic_upgrade(args.database_url, BEFORE_REVISION)
+            started = time.perf_counter()
+            await generate(engine, args.wallets, args.rows, args.chunk_size)
+            print(f"generate: seconds={time.perf_counter() - started:.0f}", file=sys.stderr)
+        before = await measure(engine, args.samples)
+        timings = [
+            (f"upgrade {EXPAND_REVISION} (online)", alembic_upgrade(args.database_url, EXPAND_REVISION)),
+            (f"upgrade {SWAP_REVISION} (exclusive lock)", alembic_upgrade(args.database_url, SWAP_REVISION)),
+        ]
+        after = await measure(engine, args.samples)
+    finally:
+        await engine.dispose()
+    print_report(before, after, timings)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="native column types migration: sizes, get_balance latency, timings")
+    parser.add_argument("--database-url", required=True, help="пустая база для прогона (postgresql+psycopg://...)")
+    parser.add_argument("--wallets", type=int, default=1_000_000)
+    parser.add_argument("--rows", type=int, default=50_000_000, help="операций в wallet_operations")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000, help="операций в одной пачке генерации")
+    parser.add_argument("--samples", type=int, default=2000, help="запросов для замера латентности")
+    parser.add_argument("--skip-generate", action="store_true", help="данные уже сгенерированы прошлым запуском")
+    raise SystemExit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,135 @@
+"""
+Общие части нагрузочных сценариев: аргументы, прогон с ограниченной конкурентностью
+и отчёт (запросы в секунду, перцентили латентности, распределение статусов).
+
+Сценарии обращаются к запущенному сервису по HTTP; пользователи должны существовать
+в svc-users, их идентификаторы передаются через --users.
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, List
+
+import httpx
+
+
+@dataclass
+class LoadResult:
+    name: str
+    elapsed: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def rps(self) -> float:
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+    def report(self, items_per_request: int = 1) -> str:
+        line = (
+            f"{self.name}: requests={self.requests} seconds={self.elapsed:.2f} rps={self.rps:.0f} "
+            f"p50_ms={self.percentile(0.5) * 1000:.1f} p99_ms={self.percentile(0.99) * 1000:.1f}"
+        )
+        if items_per_request > 1:
+            line += f" items_per_second={self.rps * items_per_request:.0f}"
+        statuses = " ".join(f"{status}={count}" for status, count in sorted(self.statuses.items()))
+        return f"{line} statuses[{statuses}]"
+
+
+def base_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--base-url", default="http://localhost:8000", help="адрес запущенного svc-wallet")
+    parser.add_argument("--concurrency", type=int, default=32, help="одновременных запросов")
+    parser.add_argument("--requests", type=int, default=2000, help="запросов в прогоне")
+    return parser
+
+
+def add_users_argument(parser: argparse.ArgumentParser, minimum: int):
+    parser.add_argument(
+        "--users", required=True,
+        help=f"userId существующих в svc-users пользователей через запятую (не меньше {minimum})",
+    )
+
+
+def parse_users(value: str, minimum: int) -> List[str]:
+    users = [user_id.strip() for user_id in value.split(",") if user_id.strip()]
+    if len(users) < minimum:
+        raise SystemExit(f"--users: нужно не меньше {minimum} пользователей")
+    return users
+
+
+def make_client(base_url: str, concurrency: int) -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    return httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0)
+
+
+def operation_id() -> str:
+    return str(uuid.uuid4())
+
+
+async def run_load(
+    name: str,
+    request: Callable[[int], Awaitable[httpx.Response]],
+    total: int,
+    concurrency: int,
+) -> LoadResult:
+    """
+    Выполнить total запросов, не более concurrency одновременно.
+    :param request: корутина по номеру запроса, возвращающая ответ
+    :return: время прогона, латентности и статусы ответов
+    """
+    result = LoadResult(name)
+    counter = iter(range(total))
+
+    async def worker():
+        for index in counter:
+            started = time.perf_counter()
+            try:
+                response = await request(index)
+                status = str(response.status_code)
+            except httpx.HTTPError as exc:
+                status = type(exc).__name__
+            result.latencies.append(time.perf_counter() - started)
+            result.statuses[status] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+async def ensure_wallets(client: httpx.AsyncClient, users: List[str]):
+    """
+    Создать кошельки пользователей; уже существующие (409) не считаются ошибкой.
+    """
+    for user_id in users:
+        response = await client.post("/wallets", json={"userId": user_id})
+        if response.status_code not in (201, 409):
+            raise SystemExit(f"create wallet {user_id}: {response.status_code} {response.text}")
+
+
+async def deposit(client: httpx.AsyncClient, user_id: str, amount: int):
+    response = await client.post(
+        f"/wallets/{user_id}/deposit",
+        json={"amount": amount, "externalOperationId": operation_id(), "reason": "benchmark"},
+    )
+    if response.status_code != 200:
+        raise SystemExit(f"deposit {user_id}: {response.status_code} {response.text}")
+
+
+async def get_balance(client: httpx.AsyncClient, user_id: str) -> int:
+    response = await client.get(f"/wallets/{user_id}")
+    response.raise_for_status()
+    return response.json()["data"]["balance"]
@@ -0,0 +1,69 @@
+"""
+Встречные переводы между двумя кошельками: POST /wallets/transfers против пары
+withdraw + deposit.
+
+Половина переводов идёт A→B, половина B→A, с --concurrency одновременных запросов.
+Для атомарных переводов проверяется, что ни один не завершился ошибкой сервера
+(взаимная блокировка в БД дала бы 500) и что сумма балансов A и B не изменилась.
+Сравнивать стоит rps: одна «операция» двухшагового варианта — два последовательных запроса.
+
+Запуск: ``python -m benchmarks.crossing_transfers --users <uuid>,<uuid> --concurrency 64``
+"""
+import asyncio
+
+from benchmarks.common import (
+    add_users_argument, base_parser, deposit, ensure_wallets, get_balance, make_client, operation_id,
+    parse_users, run_load,
+)
+
+
+async def main(args) -> int:
+    first, second = parse_users(args.users, 2)[:2]
+    async with make_client(args.base_url, args.concurrency) as client:
+        await ensure_wallets(client, [first, second])
+        for user_id in (first, second):
+            await deposit(client, user_id, args.requests)
+
+        def direction(index: int):
+            return (first, second) if index % 2 == 0 else (second, first)
+
+        def transfer(index: int):
+            source, target = direction(index)
+            return client.post(
+                "/wallets/transfers",
+                json={"transferId": operation_id(), "fromUserId": source, "toUserId": target, "amount": 1, "reason": "benchmark"},
+            )
+
+        async def two_calls(index: int):
+            source, target = direction(index)
+            response = await client.post(
+                f"/wallets/{source}/withdraw",
+                json={"amount": 1, "externalOperationId": operation_id(), "reason": "benchmark"},
+            )
+            if response.status_code != 200:
+                return response
+            return await client.post(
+                f"/wallets/{target}/deposit",
+                json={"amount": 1, "externalOperationId": operation_id(), "reason": "benchmark"},
+            )
+
+        total_before = await get_balance(client, first) + await get_balance(client, second)
+        transfers = await run_load("transfer", transfer, args.requests, args.concurrency)
+        total_after = await get_balance(client, first) + await get_balance(client, second)
+        pairs = await run_load("withdraw+deposit", two_calls, args.requests, args.concurrency)
+    print(transfers.report())
+    print(pairs.report())
+    if pairs.rps:
+        print(f"speedup={transfers.rps / pairs.rps:.2f}x")
+    server_errors = sum(count for status, count in transfers.statuses.items() if not status.startswith(("2", "4")))
+    print(f"total_before={total_before} total_after={total_after} server_errors={server_errors}")
+    if server_errors or total_before != total_after:
+        print("FAILED: transfers lost money or hit server errors")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = base_parser("crossing A->B / B->A transfers vs withdraw+deposit")
+    add_users_argument(parser, 2)
+    raise SystemExit(asyncio.run(main(parser.parse_args())))
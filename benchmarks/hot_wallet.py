@@ -0,0 +1,55 @@
+"""
+Пропускная способность записи в один «горячий» кошелёк в зависимости от числа суббалансов.
+
+Для каждого значения из --shards кошелёк переводится в этот режим (как ``python -m app.cli
+shard-wallet``, поэтому нужен доступ к той же БД, что и у сервиса), затем по нему идёт поток
+пополнений, а доля --withdraw-ratio запросов — списания, проверяющие заимствование между
+суббалансами. После прогона кошелёк возвращается в обычный режим.
+
+Запуск: ``python -m benchmarks.hot_wallet --users <uuid> --shards 1,4,16 --concurrency 64``
+"""
+import asyncio
+
+from app.cli import shard_wallet
+from benchmarks.common import (
+    add_users_argument, base_parser, deposit, ensure_wallets, make_client, operation_id, parse_users, run_load,
+)
+
+
+async def main(args) -> int:
+    user_id = parse_users(args.users, 1)[0]
+    shard_counts = [int(value) for value in args.shards.split(",")]
+    withdraw_every = round(1 / args.withdraw_ratio) if args.withdraw_ratio > 0 else 0
+    results = []
+    async with make_client(args.base_url, args.concurrency) as client:
+        await ensure_wallets(client, [user_id])
+        # Запас средств, чтобы списания не упирались в нулевой баланс
+        await deposit(client, user_id, args.requests * len(shard_counts))
+
+        def write(index: int):
+            kind = "withdraw" if withdraw_every and index % withdraw_every == 0 else "deposit"
+            return client.post(
+                f"/wallets/{user_id}/{kind}",
+                json={"amount": 1, "externalOperationId": operation_id(), "reason": "benchmark"},
+            )
+
+        try:
+            for shards in shard_counts:
+                if await shard_wallet(user_id, shards) != 0:
+                    return 1
+                results.append(await run_load(f"shards={shards}", write, args.requests, args.concurrency))
+        finally:
+            await shard_wallet(user_id, 1)
+    for result in results:
+        print(result.report())
+    if results and results[0].rps:
+        print(" ".join(f"{result.name}:{result.rps / results[0].rps:.2f}x" for result in results))
+    return 0
+
+
+if __name__ == "__main__":
+    parser = base_parser("write throughput of one hot wallet by number of sub-balances")
+    add_users_argument(parser, 1)
+    parser.add_argument("--shards", default="1,4,16", help="числа суббалансов через запятую")
+    parser.add_argument("--withdraw-ratio", type=float, default=0.1, help="доля списаний среди запросов")
+    raise SystemExit(asyncio.run(main(parser.parse_args())))
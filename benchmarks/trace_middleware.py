@@ -0,0 +1,83 @@
+"""
+Накладные расходы трассировки и логирования запроса на /live: до и после перехода
+на чистый ASGI-middleware и неблокирующую запись логов.
+
+«До» — прежний TraceIDMiddleware на BaseHTTPMiddleware с f-строкой и синхронной
+записью корневым логгером в event loop; «после» — текущие TraceIDMiddleware и
+setup_logging (очередь + QueueListener). Оба приложения обслуживают только системные
+эндпоинты и вызываются в процессе через ASGI-транспорт httpx, без сети, поэтому
+разница отражает стоимость middleware и логирования. Логи пишутся во временный файл.
+
+Запуск: ``python -m benchmarks.trace_middleware --requests 20000``
+"""
+import asyncio
+import logging
+import tempfile
+from datetime import datetime
+
+import httpx
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+from app.api.health import router as health_router
+from app.core.log import setup_logging
+from app.core.middleware import TraceIDMiddleware
+from app.core.utils import generate_trace_id
+from benchmarks.common import base_parser, run_load
+
+
+class LegacyTraceIDMiddleware(BaseHTTPMiddleware):
+    """
+    Прежняя реализация трассировки, сохранённая для сравнения.
+    """
+    async def dispatch(self, request: Request, call_next):
+        trace_id = request.headers.get("X-Trace-Id")
+        if not trace_id:
+            trace_id = generate_trace_id()
+        request.state.trace_id = trace_id
+        log_date = datetime.utcnow().isoformat()
+        endpoint = request.url.path
+        logging.info(f"[{log_date}] endpoint={endpoint} trace_id={trace_id} method={request.method}")
+        return await call_next(request)
+
+
+def build_app(middleware) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(middleware)
+    app.include_router(health_router)
+    return app
+
+
+async def measure(name: str, app: FastAPI, args):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Прогрев: импорт ленивых модулей и первые аллокации не должны попасть в замер
+        await run_load(name, lambda index: client.get("/live"), min(200, args.requests), args.concurrency)
+        return await run_load(name, lambda index: client.get("/live"), args.requests, args.concurrency)
+
+
+async def main(args) -> int:
+    root = logging.getLogger()
+    with tempfile.TemporaryFile("w") as sink:
+        output = logging.StreamHandler(sink)
+        root.handlers = [output]
+        root.setLevel(logging.INFO)
+        before = await measure("before", build_app(LegacyTraceIDMiddleware), args)
+
+        listener = setup_logging(sink)
+        root.setLevel(logging.INFO)
+        try:
+            after = await measure("after", build_app(TraceIDMiddleware), args)
+        finally:
+            listener.stop()
+    print(before.report())
+    print(after.report())
+    if before.rps:
+        print(f"speedup={after.rps / before.rps:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = base_parser("trace middleware and logging overhead on /live")
+    raise SystemExit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,51 @@
+"""
+Конкурентные списания с одного кошелька.
+
+Кошелёк пополняется на --funds, затем --requests списаний по --amount идут
+с --concurrency одновременных запросов — заведомо больше, чем позволяет баланс.
+Проверяется, что успешных списаний ровно столько, сколько покрывают средства,
+а итоговый баланс не отрицателен и равен ожидаемому; печатается пропускная способность.
+
+Запуск: ``python -m benchmarks.wallet_contention --users <uuid> --concurrency 64``
+"""
+import asyncio
+
+from benchmarks.common import (
+    add_users_argument, base_parser, deposit, ensure_wallets, get_balance, make_client, operation_id,
+    parse_users, run_load,
+)
+
+
+async def main(args) -> int:
+    user_id = parse_users(args.users, 1)[0]
+    async with make_client(args.base_url, args.concurrency) as client:
+        await ensure_wallets(client, [user_id])
+        await deposit(client, user_id, args.funds)
+        initial = await get_balance(client, user_id)
+
+        def withdraw(index: int):
+            return client.post(
+                f"/wallets/{user_id}/withdraw",
+                json={"amount": args.amount, "externalOperationId": operation_id(), "reason": "benchmark"},
+            )
+
+        result = await run_load("withdraw", withdraw, args.requests, args.concurrency)
+        final = await get_balance(client, user_id)
+    print(result.report())
+    succeeded = result.statuses["200"]
+    expected = initial - succeeded * args.amount
+    print(f"initial={initial} succeeded={succeeded} final={final} expected={expected}")
+    # Отказ при достаточных средствах тоже нарушение: списания должны ждать блокировку, а не падать
+    if final < 0 or final != expected or (final >= args.amount and succeeded < args.requests):
+        print("FAILED: balance invariant violated")
+        return 1
+    print("OK: balance never went negative")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = base_parser("concurrent withdrawals from a single wallet")
+    add_users_argument(parser, 1)
+    parser.add_argument("--funds", type=int, default=1000, help="сумма пополнения перед прогоном")
+    parser.add_argument("--amount", type=int, default=1, help="сумма одного списания")
+    raise SystemExit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,61 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from app.service import balance_reconciler as module
+from app.service.balance_reconciler import RECONCILER_LOCK_KEY, BalanceReconciler
+from app.service.wallet_service import WalletService
+
+
+class FakeRedis:
+    """
+    Строки и SCAN по отсортированным ключам; курсор — позиция в списке ключей.
+    """
+    def __init__(self, keys):
+        self.values = {key: "1" for key in keys}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = str(value)
+        return True
+
+    async def scan(self, cursor, match, count):
+        prefix = match.rstrip("*")
+        keys = sorted(key for key in self.values if key.startswith(prefix))
+        batch = keys[cursor:cursor + count]
+        following = cursor + count
+        return (following if following < len(keys) else 0), batch
+
+
+def test_reconciler_processes_share_scan_position(monkeypatch):
+    user_ids = [f"user-{index:02d}" for index in range(10)]
+    redis = FakeRedis([f"wallet_balance:{user_id}" for user_id in user_ids])
+    reconciled = []
+
+    async def get_redis():
+        return redis
+
+    @asynccontextmanager
+    async def session():
+        yield None
+
+    async def reconcile(self, batch):
+        reconciled.extend(batch)
+        return {}
+
+    monkeypatch.setattr(module.redis_client, "get_redis", get_redis)
+    monkeypatch.setattr(module, "ReadSessionLocal", session)
+    monkeypatch.setattr(WalletService, "reconcile_balance_cache", reconcile)
+
+    async def run():
+        processes = [BalanceReconciler(batch_size=3, interval=1), BalanceReconciler(batch_size=3, interval=1)]
+        for step in range(4):
+            # Блокировка шага истекла — следующий шаг берёт другой процесс
+            redis.values.pop(RECONCILER_LOCK_KEY, None)
+            await processes[step % 2].run_once()
+
+    asyncio.run(run())
+    assert reconciled == user_ids
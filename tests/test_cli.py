@@ -0,0 +1,9 @@
+import pytest
+
+from app import cli
+
+
+@pytest.mark.parametrize("user_id", ["42", "not-a-uuid", "6F9619FF-8B86-D011-B42D-00CF4FC964FF"])
+def test_shard_wallet_rejects_invalid_user_id(capsys, user_id):
+    assert cli.main(["shard-wallet", user_id, "--shards", "4"]) == 1
+    assert "error=user_id must be a canonical uuid" in capsys.readouterr().err
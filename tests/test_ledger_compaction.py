@@ -0,0 +1,24 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.core.utils import utc_now
+from app.service.ledger_compaction import latest_safe_cutoff, write_checkpoints
+
+
+def test_cutoff_inside_safety_margin_is_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT", 30.0)
+    monkeypatch.setattr(settings, "LEDGER_CHECKPOINT_SAFETY_MARGIN", 600.0)
+    assert latest_safe_cutoff() <= utc_now() - timedelta(seconds=600)
+    with pytest.raises(ValueError):
+        asyncio.run(write_checkpoints(utc_now() - timedelta(seconds=60), 100))
+
+
+@pytest.mark.parametrize("statement_timeout", [0.0, 600.0, 900.0])
+def test_margin_must_exceed_statement_timeout(monkeypatch, statement_timeout):
+    monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT", statement_timeout)
+    monkeypatch.setattr(settings, "LEDGER_CHECKPOINT_SAFETY_MARGIN", 600.0)
+    with pytest.raises(ValueError):
+        latest_safe_cutoff()
@@ -0,0 +1,15 @@
+from datetime import date
+
+from app.db.partitions import create_partition_sql
+
+
+def test_partition_bounds_are_utc():
+    sql = create_partition_sql(date(2026, 12, 1))
+    assert "wallet_operations_y2026m12 PARTITION OF wallet_operations" in sql
+    assert "FROM ('2026-12-01 00:00:00+00') TO ('2027-01-01 00:00:00+00')" in sql
+
+
+def test_shadow_partition_name_and_parent():
+    sql = create_partition_sql(date(2026, 3, 1), parent="wallet_operations_v2", suffix="_v2")
+    assert "wallet_operations_y2026m03_v2 PARTITION OF wallet_operations_v2" in sql
+    assert "FROM ('2026-03-01 00:00:00+00') TO ('2026-04-01 00:00:00+00')" in sql
@@ -0,0 +1,28 @@
+from datetime import datetime, timezone
+
+from app.core.utils import as_utc, is_uuid
+
+CANONICAL = "0b6f5d4e-3c2a-4f1e-9d8c-7b6a5f4e3d2c"
+
+
+def test_is_uuid_accepts_canonical_form():
+    assert is_uuid(CANONICAL)
+
+
+def test_is_uuid_rejects_non_canonical_forms():
+    for value in (
+        CANONICAL.upper(),
+        CANONICAL.replace("-", ""),
+        "{" + CANONICAL + "}",
+        "urn:uuid:" + CANONICAL,
+        " " + CANONICAL,
+        "not-a-uuid",
+        "",
+        None,
+    ):
+        assert not is_uuid(value), value
+
+
+def test_as_utc_treats_naive_as_utc():
+    assert as_utc(datetime(2026, 1, 1)) == datetime(2026, 1, 1, tzinfo=timezone.utc)
+    assert as_utc(None) is None
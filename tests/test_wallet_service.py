@@ -0,0 +1,246 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.api.wallets import verify_user_exists
+from app.codes import Codes
+from app.core.circuit_breaker import OPEN, CircuitBreaker
+from app.core.config import settings
+from app.core.users import UsersUnavailableError, users_client
+from app.db.models import WalletOperationType
+from app.repository.wallet_repository import transfer_external_ids
+from app.service.wallet_service import WalletService
+
+USER_ID = "0b6f5d4e-3c2a-4f1e-9d8c-7b6a5f4e3d2c"
+WALLET = SimpleNamespace(id="5e7c1a2b-8d9f-4e3a-b6c1-2d4f8a9e0b13", userId=USER_ID, balance=100, version=3, shards=1)
+
+
+class CountingRepository:
+    """
+    Репозиторий одного запроса; загрузки считаются общим счётчиком всех запросов.
+    """
+    def __init__(self, loads: list):
+        self.loads = loads
+
+    async def get_wallet_by_user_id(self, user_id: str):
+        self.loads.append(user_id)
+        # Загрузка длится, пока остальные запросы успевают прийти
+        await asyncio.sleep(0.01)
+        return WALLET
+
+
+async def user_exists(user_id: str) -> bool:
+    return True
+
+
+@pytest.fixture
+def cache_miss(monkeypatch):
+    async def get_balance_and_ttl(self, user_id):
+        return None, -2
+
+    async def set_balance(self, user_id, balance, version, ttl=None):
+        return None
+
+    monkeypatch.setattr(WalletService, "_get_balance_and_ttl_from_cache", get_balance_and_ttl)
+    monkeypatch.setattr(WalletService, "_set_balance_cache", set_balance)
+
+
+async def _get_wallet_concurrently(requests: int):
+    loads = []
+    results = await asyncio.gather(*(
+        WalletService(CountingRepository(loads), user_exists).get_wallet(USER_ID) for _ in range(requests)
+    ))
+    return loads, results
+
+
+def test_concurrent_cache_misses_load_wallet_once(cache_miss, monkeypatch):
+    monkeypatch.setattr(settings, "WALLET_READ_SINGLE_FLIGHT", True)
+    loads, results = asyncio.run(_get_wallet_concurrently(50))
+    assert loads == [USER_ID]
+    assert all(code == Codes.WALLET_FETCHED_OK and data["balance"] == 100 for data, code in results)
+
+
+def test_without_single_flight_every_miss_loads(cache_miss, monkeypatch):
+    monkeypatch.setattr(settings, "WALLET_READ_SINGLE_FLIGHT", False)
+    loads, _ = asyncio.run(_get_wallet_concurrently(50))
+    assert len(loads) == 50
+
+
+class ExpiringWallet:
+    """
+    Как экземпляр Wallet после rollback сессии-владельца: атрибуты больше не читаются.
+    """
+    def __init__(self):
+        self.expired = False
+
+    def __getattr__(self, name):
+        if self.expired:
+            raise AssertionError(f"expired instance attribute {name} read")
+        return getattr(WALLET, name)
+
+
+class RollingBackRepository(CountingRepository):
+    async def get_wallet_by_user_id(self, user_id: str):
+        await super().get_wallet_by_user_id(user_id)
+        wallet = ExpiringWallet()
+        # Сессия ведущего запроса откатывается сразу после загрузки
+        asyncio.get_running_loop().call_soon(setattr, wallet, "expired", True)
+        return wallet
+
+
+def test_coalesced_callers_get_a_detached_snapshot(cache_miss, monkeypatch):
+    monkeypatch.setattr(settings, "WALLET_READ_SINGLE_FLIGHT", True)
+    loads = []
+
+    async def run():
+        return await asyncio.gather(*(
+            WalletService(RollingBackRepository(loads), user_exists).get_wallet(USER_ID) for _ in range(20)
+        ))
+
+    results = asyncio.run(run())
+    assert loads == [USER_ID]
+    assert all(code == Codes.WALLET_FETCHED_OK and data["balance"] == 100 for data, code in results)
+
+
+USER_IDS = [
+    "1c8e2f4a-6b3d-4e5f-8a9b-0c1d2e3f4a5b",
+    "2d9f3a5b-7c4e-4f6a-9b0c-1d2e3f4a5b6c",
+    "3e0a4b6c-8d5f-4a7b-8c1d-2e3f4a5b6c7d",
+]
+
+
+class SessionRepository:
+    """
+    Репозиторий поверх одной сессии: как AsyncSession, не допускает параллельных запросов.
+    """
+    def __init__(self, wallets):
+        self.wallets = {wallet.userId: wallet for wallet in wallets}
+        self.queries = 0
+        self._busy = False
+
+    async def _query(self):
+        if self._busy:
+            raise AssertionError("concurrent queries on one session")
+        self._busy = True
+        self.queries += 1
+        await asyncio.sleep(0.001)
+        self._busy = False
+
+    async def get_wallet_by_user_id(self, user_id):
+        await self._query()
+        return self.wallets.get(user_id)
+
+    async def get_wallets_by_user_ids(self, user_ids):
+        await self._query()
+        return [self.wallets[user_id] for user_id in user_ids if user_id in self.wallets]
+
+    async def get_balances(self, wallet_ids):
+        await self._query()
+        return {}
+
+    async def get_balances_at(self, wallet_ids, at):
+        await self._query()
+        return {wallet_id: 7 for wallet_id in wallet_ids}
+
+
+def _wallet(user_id: str):
+    return SimpleNamespace(id=f"wallet-{user_id}", userId=user_id, balance=10, version=1, shards=1)
+
+
+@pytest.fixture
+def breaker_open(monkeypatch):
+    breaker = CircuitBreaker("svc-users-test", failure_threshold=1, reset_timeout=60, latency_budget=1, max_concurrency=10)
+    breaker._record_failure(probe=False)
+    assert breaker.state == OPEN
+
+    async def cache_miss(user_id):
+        return None
+
+    monkeypatch.setattr(users_client, "breaker", breaker)
+    monkeypatch.setattr(users_client, "_client", object())
+    monkeypatch.setattr(users_client.cache, "get", cache_miss)
+    monkeypatch.setattr(settings, "SVC_USERS_DEGRADED_MODE", True)
+
+
+@pytest.fixture
+def bulk_cache_miss(monkeypatch):
+    async def get_balances(self, user_ids):
+        return [None] * len(user_ids)
+
+    async def set_balances(self, balances, ttl=None):
+        return None
+
+    monkeypatch.setattr(WalletService, "_get_balances_from_cache", get_balances)
+    monkeypatch.setattr(WalletService, "_set_balances_cache", set_balances)
+
+
+def test_get_wallets_degraded_reads_wallets_sequentially(breaker_open, bulk_cache_miss):
+    repository = SessionRepository([_wallet(user_id) for user_id in USER_IDS])
+    data, code = asyncio.run(WalletService(repository, verify_user_exists).get_wallets(USER_IDS))
+    assert code == Codes.WALLET_FETCHED_OK
+    assert [item["code"] for item in data] == [Codes.WALLET_FETCHED_OK.value] * len(USER_IDS)
+    assert [item["balance"] for item in data] == [10] * len(USER_IDS)
+    # Кошельки неподтверждённых пользователей — одним запросом, а не по запросу на пользователя;
+    # затем обычные чтения кошельков и балансов шардированных кошельков
+    assert repository.queries == 3
+
+
+def test_get_balances_at_degraded_reads_wallets_sequentially(breaker_open):
+    repository = SessionRepository([_wallet(user_id) for user_id in USER_IDS])
+    at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    data, code = asyncio.run(WalletService(repository, verify_user_exists).get_balances_at(USER_IDS, at))
+    assert code == Codes.WALLET_FETCHED_OK
+    assert [item["balance"] for item in data] == [7] * len(USER_IDS)
+
+
+def test_get_wallets_degraded_rejects_user_without_wallet(breaker_open, bulk_cache_miss):
+    repository = SessionRepository([_wallet(user_id) for user_id in USER_IDS[:2]])
+    with pytest.raises(UsersUnavailableError):
+        asyncio.run(WalletService(repository, verify_user_exists).get_wallets(USER_IDS))
+
+
+def test_get_wallets_without_degraded_mode_fails_fast(breaker_open, bulk_cache_miss, monkeypatch):
+    monkeypatch.setattr(settings, "SVC_USERS_DEGRADED_MODE", False)
+    repository = SessionRepository([_wallet(user_id) for user_id in USER_IDS])
+    with pytest.raises(UsersUnavailableError):
+        asyncio.run(WalletService(repository, verify_user_exists).get_wallets(USER_IDS))
+    assert repository.queries == 0
+
+
+class UntouchedRepository:
+    """
+    Любое обращение к репозиторию — ошибка теста.
+    """
+    def __getattr__(self, name):
+        raise AssertionError(f"repository.{name} must not be called")
+
+
+def test_client_operations_cannot_take_transfer_keys(monkeypatch):
+    monkeypatch.setattr(settings, "IDEMPOTENCY_STORE_ENABLED", True)
+    service = WalletService(UntouchedRepository(), user_exists)
+    debit_id, credit_id = transfer_external_ids("payout-42")
+
+    async def run():
+        return (
+            await service.deposit(USER_ID, 10, debit_id, "collision", "trace"),
+            await service.withdraw(USER_ID, 10, credit_id, "collision", "trace"),
+        )
+
+    assert asyncio.run(run()) == ((None, Codes.INVALID_REQUEST), (None, Codes.INVALID_REQUEST))
+
+
+def test_batch_rejects_transfer_keys_per_item():
+    service = WalletService(UntouchedRepository(), user_exists)
+    debit_id, _ = transfer_external_ids("payout-42")
+    data, code = asyncio.run(service.apply_batch([(USER_ID, WalletOperationType.DEPOSIT, 10, debit_id, "collision")], "trace"))
+    assert code == Codes.WALLET_BATCH_PROCESSED
+    assert data[0]["code"] == Codes.INVALID_REQUEST.value
+
+
+def test_degraded_get_wallet_reads_wallet_once(breaker_open, cache_miss):
+    repository = SessionRepository([_wallet(USER_IDS[0])])
+    data, code = asyncio.run(WalletService(repository, verify_user_exists).get_wallet(USER_IDS[0]))
+    assert code == Codes.WALLET_FETCHED_OK and data["balance"] == 10
+    assert repository.queries == 1